@@ -0,0 +1,696 @@
+"""
+In-process stand-in for the parts of the AWS API that eb-create-environment uses.
+
+`StandInAWS` holds a seeded, in-memory account and counts every API call (each page of a paginated call counts
+once).  `StandInClientPool` exposes it through the same interface as `eb_create_environment.clients.ClientPool`,
+so the real provisioning code runs unchanged against it.  Every call is first validated against botocore's model of
+the operation, as botocore's Stubber does, so a request AWS would reject fails here too.  Resources become ready
+immediately, so waits return on their first poll.
+"""
+import itertools
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+import botocore.session
+from botocore import xform_name
+from botocore.exceptions import ClientError, ParamValidationError
+from botocore.validate import ParamValidator
+
+from eb_create_environment.instrumentation import NullTracer
+
+
+DEFAULT_PAGE_SIZE = 100
+# Storage limits describe_orderable_db_instance_options reports for postgres
+STORAGE_LIMITS = {
+    "gp2": dict(MinStorageSize=20, MaxStorageSize=65536),
+    "gp3": dict(
+        MinStorageSize=20, MaxStorageSize=65536, SupportsIops=True, SupportsStorageThroughput=True,
+        MinIopsPerDbInstance=12000, MaxIopsPerDbInstance=64000, MinIopsPerGib=0.5, MaxIopsPerGib=1000,
+        MinStorageThroughputPerDbInstance=500, MaxStorageThroughputPerDbInstance=4000,
+        MinStorageThroughputPerIops=0.0, MaxStorageThroughputPerIops=0.25,
+    ),
+    "io1": dict(
+        MinStorageSize=100, MaxStorageSize=65536, SupportsIops=True,
+        MinIopsPerDbInstance=1000, MaxIopsPerDbInstance=256000, MinIopsPerGib=1.0, MaxIopsPerGib=50.0,
+    ),
+    "io2": dict(
+        MinStorageSize=100, MaxStorageSize=65536, SupportsIops=True,
+        MinIopsPerDbInstance=1000, MaxIopsPerDbInstance=256000, MinIopsPerGib=1.0, MaxIopsPerGib=500.0,
+    ),
+}
+
+
+def make_error_class(name):
+    return type(name, (ClientError,), {})
+
+
+class StandInExceptions(object):
+    DBInstanceNotFoundFault = make_error_class("DBInstanceNotFoundFault")
+    DBSnapshotNotFoundFault = make_error_class("DBSnapshotNotFoundFault")
+    DBParameterGroupAlreadyExistsFault = make_error_class("DBParameterGroupAlreadyExistsFault")
+    DBProxyNotFoundFault = make_error_class("DBProxyNotFoundFault")
+    DBProxyTargetAlreadyRegisteredFault = make_error_class("DBProxyTargetAlreadyRegisteredFault")
+    EntityAlreadyExistsException = make_error_class("EntityAlreadyExistsException")
+    NoSuchEntityException = make_error_class("NoSuchEntityException")
+    ResourceExistsException = make_error_class("ResourceExistsException")
+    DBSubnetGroupAlreadyExistsFault = make_error_class("DBSubnetGroupAlreadyExistsFault")
+    DBSubnetGroupNotFoundFault = make_error_class("DBSubnetGroupNotFoundFault")
+    InvalidDBSubnetGroupStateFault = make_error_class("InvalidDBSubnetGroupStateFault")
+    InvalidParameterCombination = make_error_class("InvalidParameterCombination")
+    ResourceNotFoundException = make_error_class("ResourceNotFoundException")
+
+
+def raise_error(error_class, code, operation_name, message=""):
+    raise error_class({"Error": {"Code": code, "Message": message}}, operation_name)
+
+
+def matches_filters(item, filters, attributes):
+    for aws_filter in filters or []:
+        attribute = attributes.get(aws_filter["Name"])
+        if attribute is None:
+            continue
+        if str(item.get(attribute)) not in aws_filter["Values"]:
+            return False
+    return True
+
+
+class StandInAWS(object):
+    def __init__(self, region="us-east-1", vpcs=5, subnets_per_vpc=6, route_tables=10, solution_stacks=200,
+                 engine_versions_per_major=20, page_size=DEFAULT_PAGE_SIZE):
+        self.region = region
+        self.page_size = page_size
+        self.calls = Counter()
+        self.ids = itertools.count(1)
+        self.availability_zones = [f"{region}{zone}" for zone in "abcdef"]
+        self.seed_network(vpcs, subnets_per_vpc, route_tables)
+        self.solution_stacks = [
+            f"64bit Amazon Linux 2023 v4.{minor}.{patch} running Python 3.{python}"
+            for minor in range(solution_stacks // 30 + 1, 0, -1)
+            for patch in range(10, 0, -1)
+            for python in (13, 12, 11)
+        ][:solution_stacks]
+        self.engine_versions = [
+            {"Engine": "postgres", "EngineVersion": f"{major}.{minor}", "DBParameterGroupFamily": f"postgres{major}"}
+            for major in range(11, 18)
+            for minor in range(1, engine_versions_per_major + 1)
+        ]
+        self.applications = ["bench-app"]
+        self.environments = {}
+        self.events = []
+        self.launch_templates = {}
+        self.security_groups = {}
+        self.db_subnet_groups = {}
+        self.db_parameter_groups = {}
+        self.db_proxies = {}
+        self.secrets = {}
+        self.roles = {}
+        self.db_instances = {}
+        self.db_snapshots = {}
+
+    def new_id(self, prefix):
+        return f"{prefix}-{next(self.ids):017x}"
+
+    def seed_network(self, vpc_count, subnets_per_vpc, route_table_count):
+        self.vpcs = []
+        self.subnets = []
+        self.route_tables = []
+        for vpc_index in range(vpc_count):
+            vpc_id = self.new_id("vpc")
+            self.vpcs.append({
+                "VpcId": vpc_id,
+                "IsDefault": vpc_index == 0,
+                "Tags": [{"Key": "Name", "Value": f"bench-vpc-{vpc_index}"}],
+            })
+            for subnet_index in range(subnets_per_vpc):
+                self.subnets.append({
+                    "SubnetId": self.new_id("subnet"),
+                    "VpcId": vpc_id,
+                    "AvailabilityZone": self.availability_zones[subnet_index % len(self.availability_zones)],
+                })
+        # Every VPC gets a public main route table; the rest are private tables spread over the VPCs
+        vpc_subnets = {
+            vpc["VpcId"]: [subnet for subnet in self.subnets if subnet["VpcId"] == vpc["VpcId"]] for vpc in self.vpcs
+        }
+        for index in range(max(route_table_count, vpc_count)):
+            vpc_id = self.vpcs[index % vpc_count]["VpcId"]
+            is_main = index < vpc_count
+            route_table = {
+                "RouteTableId": self.new_id("rtb"),
+                "VpcId": vpc_id,
+                "Routes": [{"DestinationCidrBlock": "10.0.0.0/16", "GatewayId": "local"}],
+                "Associations": [],
+            }
+            if is_main:
+                route_table["Routes"].append({"DestinationCidrBlock": "0.0.0.0/0", "GatewayId": "igw-bench"})
+                route_table["Associations"].append({"Main": True})
+            else:
+                # Associate the last subnet of the VPC with a private table
+                subnets = vpc_subnets[vpc_id]
+                if subnets and index // vpc_count == 1:
+                    route_table["Associations"].append({"Main": False, "SubnetId": subnets[-1]["SubnetId"]})
+            self.route_tables.append(route_table)
+
+    def paginate(self, items, key, token_name, kwargs, output_token_name=None):
+        start = int(kwargs.get(token_name) or 0)
+        page_size = kwargs.get("MaxResults") or kwargs.get("MaxRecords") or self.page_size
+        response = {key: items[start:start + page_size]}
+        if start + page_size < len(items):
+            response[output_token_name or token_name] = str(start + page_size)
+        return response
+
+    # EC2
+
+    def ec2_describe_regions(self, **kwargs):
+        return {"Regions": [{"RegionName": region} for region in ["us-east-1", "us-east-2", "us-west-2", self.region]]}
+
+    def ec2_describe_vpcs(self, **kwargs):
+        return self.paginate(self.vpcs, "Vpcs", "NextToken", kwargs)
+
+    def ec2_describe_subnets(self, Filters=None, **kwargs):
+        subnets = [s for s in self.subnets if matches_filters(s, Filters, {"vpc-id": "VpcId"})]
+        return self.paginate(subnets, "Subnets", "NextToken", kwargs)
+
+    def ec2_describe_route_tables(self, Filters=None, **kwargs):
+        route_tables = [r for r in self.route_tables if matches_filters(r, Filters, {"vpc-id": "VpcId"})]
+        return self.paginate(route_tables, "RouteTables", "NextToken", kwargs)
+
+    def ec2_describe_instance_type_offerings(self, Filters=None, **kwargs):
+        offerings = [{"Location": zone} for zone in self.availability_zones[:3]]
+        return self.paginate(offerings, "InstanceTypeOfferings", "NextToken", kwargs)
+
+    def ec2_describe_instance_types(self, InstanceTypes, **kwargs):
+        sizes = {"nano": 2, "micro": 2, "small": 2, "medium": 2, "large": 2, "xlarge": 4}
+        instance_types = []
+        for instance_type in InstanceTypes:
+            size = instance_type.split(".")[-1]
+            vcpus = sizes.get(size) or 4 * int(size[:-len("xlarge")] or 1)
+            instance_types.append({
+                "InstanceType": instance_type,
+                "VCpuInfo": {"DefaultVCpus": vcpus},
+                "MemoryInfo": {"SizeInMiB": vcpus * 2048},
+                "BurstablePerformanceSupported": instance_type.startswith("t"),
+            })
+        return {"InstanceTypes": instance_types}
+
+    def ec2_create_security_group(self, GroupName, VpcId, **kwargs):
+        group_id = self.new_id("sg")
+        self.security_groups[group_id] = {"GroupId": group_id, "GroupName": GroupName, "VpcId": VpcId,
+                                           "IpPermissions": [], "Tags": kwargs.get("TagSpecifications", [{}])[0].get("Tags", [])}
+        return {"GroupId": group_id}
+
+    def ec2_authorize_security_group_ingress(self, GroupId, IpPermissions, **kwargs):
+        self.security_groups[GroupId]["IpPermissions"].extend(IpPermissions)
+        return {}
+
+    def ec2_revoke_security_group_ingress(self, GroupId, IpPermissions, **kwargs):
+        rules = self.security_groups[GroupId]["IpPermissions"]
+        rules[:] = [rule for rule in rules if rule not in IpPermissions]
+        return {"Return": True}
+
+    def ec2_delete_security_group(self, GroupId, **kwargs):
+        if GroupId not in self.security_groups:
+            raise_error(ClientError, "InvalidGroup.NotFound", "DeleteSecurityGroup")
+        referenced = [
+            group["GroupId"] for group in self.security_groups.values()
+            for rule in group["IpPermissions"]
+            for pair in rule.get("UserIdGroupPairs", [])
+            if pair["GroupId"] == GroupId
+        ]
+        if referenced:
+            raise_error(ClientError, "DependencyViolation", "DeleteSecurityGroup")
+        del self.security_groups[GroupId]
+        return {}
+
+    def ec2_describe_launch_template_versions(self, LaunchTemplateId, **kwargs):
+        return {"LaunchTemplateVersions": [
+            {"LaunchTemplateId": LaunchTemplateId, "LaunchTemplateData": self.launch_templates[LaunchTemplateId]}
+        ]}
+
+    def ec2_describe_security_groups(self, GroupIds=None, Filters=None, **kwargs):
+        missing = [group_id for group_id in GroupIds or [] if group_id not in self.security_groups]
+        if missing:
+            raise_error(ClientError, "InvalidGroup.NotFound", "DescribeSecurityGroups")
+        if GroupIds:
+            return {"SecurityGroups": [self.security_groups[group_id] for group_id in GroupIds]}
+        groups = [
+            dict(group, **{f"tag:{tag['Key']}": tag["Value"] for tag in group["Tags"]})
+            for group in self.security_groups.values()
+        ]
+        return {"SecurityGroups": [
+            self.security_groups[group["GroupId"]] for group in groups
+            if matches_filters(group, Filters, {"vpc-id": "VpcId", "group-name": "GroupName", "tag:Name": "tag:Name"})
+        ]}
+
+    # Elastic Beanstalk
+
+    def elasticbeanstalk_describe_applications(self, **kwargs):
+        return {"Applications": [{"ApplicationName": name} for name in self.applications]}
+
+    def elasticbeanstalk_list_available_solution_stacks(self, **kwargs):
+        return {"SolutionStacks": list(self.solution_stacks)}
+
+    def elasticbeanstalk_create_environment(self, EnvironmentName, OptionSettings, **kwargs):
+        environment_id = self.new_id("e")
+        security_group_id = self.ec2_create_security_group(
+            f"awseb-{environment_id}-stack-AWSEBSecurityGroup", "vpc-bench"
+        )["GroupId"]
+        launch_template_id = self.new_id("lt")
+        self.launch_templates[launch_template_id] = {"SecurityGroupIds": [security_group_id]}
+        self.environments[EnvironmentName] = {
+            "EnvironmentId": environment_id,
+            "EnvironmentName": EnvironmentName,
+            "Status": "Ready",
+            "Health": "Green",
+            "OptionSettings": OptionSettings,
+            "SecurityGroupId": security_group_id,
+            "LaunchTemplateId": launch_template_id,
+        }
+        for message in [
+            "createEnvironment is starting.",
+            f"Created EC2 launch template named: {launch_template_id}",
+            f"Successfully launched environment: {EnvironmentName}",
+        ]:
+            self.events.insert(0, {
+                "EventDate": datetime.now(timezone.utc),
+                "EnvironmentName": EnvironmentName,
+                "Severity": "INFO",
+                "Message": message,
+            })
+        return {"EnvironmentId": environment_id, "EnvironmentName": EnvironmentName, "Status": "Launching"}
+
+    def elasticbeanstalk_describe_environments(self, EnvironmentNames=None, EnvironmentIds=None, **kwargs):
+        environments = [
+            environment for environment in self.environments.values()
+            if (EnvironmentNames is None or environment["EnvironmentName"] in EnvironmentNames)
+            and (EnvironmentIds is None or environment["EnvironmentId"] in EnvironmentIds)
+        ]
+        return {"Environments": environments}
+
+    def elasticbeanstalk_describe_environment_resources(self, EnvironmentName, **kwargs):
+        environment = self.environments[EnvironmentName]
+        return {"EnvironmentResources": {
+            "LaunchConfigurations": [],
+            "LaunchTemplates": [{"Id": environment["LaunchTemplateId"]}],
+        }}
+
+    def elasticbeanstalk_describe_events(self, EnvironmentName=None, StartTime=None, **kwargs):
+        events = [
+            event for event in self.events
+            if (EnvironmentName is None or event["EnvironmentName"] == EnvironmentName)
+            and (StartTime is None or event["EventDate"] >= StartTime)
+        ]
+        return self.paginate(events, "Events", "NextToken", kwargs)
+
+    def elasticbeanstalk_update_environment(self, EnvironmentName, OptionSettings, **kwargs):
+        environment = self.environments[EnvironmentName]
+        updated = {(setting["Namespace"], setting["OptionName"]) for setting in OptionSettings}
+        environment["OptionSettings"] = [
+            setting for setting in environment.get("OptionSettings", [])
+            if (setting["Namespace"], setting["OptionName"]) not in updated
+        ] + list(OptionSettings)
+        return {"EnvironmentName": EnvironmentName, "Status": "Updating"}
+
+    def elasticbeanstalk_terminate_environment(self, EnvironmentId, **kwargs):
+        environment = next(
+            environment for environment in self.environments.values() if environment["EnvironmentId"] == EnvironmentId
+        )
+        environment["Status"] = "Terminated"
+        self.security_groups.pop(environment["SecurityGroupId"], None)
+        return {"EnvironmentId": EnvironmentId, "Status": "Terminating"}
+
+    def elasticbeanstalk_describe_configuration_settings(self, ApplicationName, EnvironmentName, **kwargs):
+        environment = self.environments[EnvironmentName]
+        return {"ConfigurationSettings": [{
+            "ApplicationName": ApplicationName,
+            "EnvironmentName": EnvironmentName,
+            "SolutionStackName": environment.get("SolutionStackName"),
+            "OptionSettings": [dict(setting) for setting in environment.get("OptionSettings", [])],
+        }]}
+
+    # RDS
+
+    def rds_describe_db_engine_versions(self, Engine, EngineVersion=None, DefaultOnly=False, **kwargs):
+        versions = [
+            version for version in self.engine_versions
+            if version["Engine"] == Engine
+            and (EngineVersion is None or f"{version['EngineVersion']}.".startswith(f"{EngineVersion}."))
+        ]
+        if DefaultOnly:
+            versions = versions[-1:]
+        return self.paginate(versions, "DBEngineVersions", "Marker", kwargs)
+
+    def rds_describe_db_subnet_groups(self, DBSubnetGroupName=None, **kwargs):
+        if DBSubnetGroupName is not None:
+            if DBSubnetGroupName not in self.db_subnet_groups:
+                raise_error(StandInExceptions.DBSubnetGroupNotFoundFault, "DBSubnetGroupNotFoundFault",
+                            "DescribeDBSubnetGroups")
+            return {"DBSubnetGroups": [self.db_subnet_groups[DBSubnetGroupName]]}
+        return self.paginate(list(self.db_subnet_groups.values()), "DBSubnetGroups", "Marker", kwargs)
+
+    def rds_create_db_subnet_group(self, DBSubnetGroupName, SubnetIds, **kwargs):
+        if DBSubnetGroupName in self.db_subnet_groups:
+            raise_error(StandInExceptions.DBSubnetGroupAlreadyExistsFault, "DBSubnetGroupAlreadyExists",
+                        "CreateDBSubnetGroup")
+        subnets = [subnet for subnet in self.subnets if subnet["SubnetId"] in SubnetIds]
+        vpc_ids = {subnet["VpcId"] for subnet in subnets}
+        self.db_subnet_groups[DBSubnetGroupName] = {
+            "DBSubnetGroupName": DBSubnetGroupName,
+            "VpcId": vpc_ids.pop() if vpc_ids else None,
+            "Subnets": [
+                {"SubnetIdentifier": subnet["SubnetId"], "SubnetAvailabilityZone": {"Name": subnet["AvailabilityZone"]}}
+                for subnet in subnets
+            ],
+        }
+        return {"DBSubnetGroup": self.db_subnet_groups[DBSubnetGroupName]}
+
+    def rds_create_db_parameter_group(self, DBParameterGroupName, DBParameterGroupFamily, **kwargs):
+        if DBParameterGroupName in self.db_parameter_groups:
+            raise_error(StandInExceptions.DBParameterGroupAlreadyExistsFault, "DBParameterGroupAlreadyExists",
+                        "CreateDBParameterGroup")
+        self.db_parameter_groups[DBParameterGroupName] = {}
+        return {"DBParameterGroup": {
+            "DBParameterGroupName": DBParameterGroupName, "DBParameterGroupFamily": DBParameterGroupFamily,
+        }}
+
+    def rds_describe_db_parameters(self, DBParameterGroupName, Source=None, **kwargs):
+        parameters = [
+            {"ParameterName": name, "ParameterValue": value, "Source": "user"}
+            for name, value in self.db_parameter_groups[DBParameterGroupName].items()
+        ]
+        return self.paginate(parameters, "Parameters", "Marker", kwargs)
+
+    def rds_modify_db_parameter_group(self, DBParameterGroupName, Parameters, **kwargs):
+        if len(Parameters) > 20:
+            raise ValueError("modify_db_parameter_group accepts at most 20 parameters")
+        for parameter in Parameters:
+            self.db_parameter_groups[DBParameterGroupName][parameter["ParameterName"]] = parameter["ParameterValue"]
+        return {"DBParameterGroupName": DBParameterGroupName}
+
+    def rds_create_db_instance(self, DBInstanceIdentifier, **kwargs):
+        subnet_group = self.db_subnet_groups.get(kwargs.get("DBSubnetGroupName"))
+        if kwargs.get("AvailabilityZone") and subnet_group and kwargs["AvailabilityZone"] not in {
+            subnet["SubnetAvailabilityZone"]["Name"] for subnet in subnet_group["Subnets"]
+        }:
+            raise_error(StandInExceptions.InvalidParameterCombination, "InvalidParameterCombination",
+                        "CreateDBInstance", "No subnets in the DB subnet group are in the availability zone")
+        self.db_instances[DBInstanceIdentifier] = dict(
+            kwargs,
+            DBInstanceIdentifier=DBInstanceIdentifier,
+            DBInstanceStatus="available",
+            Endpoint={"Address": f"{DBInstanceIdentifier}.bench.rds.amazonaws.com", "Port": kwargs.get("Port")},
+            DBSubnetGroup={"DBSubnetGroupName": kwargs.get("DBSubnetGroupName"), "VpcId": (subnet_group or {}).get("VpcId")},
+            ReadReplicaDBInstanceIdentifiers=[],
+        )
+        return {"DBInstance": self.db_instances[DBInstanceIdentifier]}
+
+    def rds_describe_db_instances(self, DBInstanceIdentifier=None, **kwargs):
+        if DBInstanceIdentifier is not None:
+            if DBInstanceIdentifier not in self.db_instances:
+                raise_error(StandInExceptions.DBInstanceNotFoundFault, "DBInstanceNotFound", "DescribeDBInstances")
+            return {"DBInstances": [self.db_instances[DBInstanceIdentifier]]}
+        return self.paginate(list(self.db_instances.values()), "DBInstances", "Marker", kwargs)
+
+    def rds_delete_db_instance(self, DBInstanceIdentifier, SkipFinalSnapshot=False, FinalDBSnapshotIdentifier=None,
+                               **kwargs):
+        db_instance = self.db_instances.pop(DBInstanceIdentifier)
+        source = self.db_instances.get(db_instance.get("ReadReplicaSourceDBInstanceIdentifier"))
+        if source:
+            source["ReadReplicaDBInstanceIdentifiers"].remove(DBInstanceIdentifier)
+        if not SkipFinalSnapshot:
+            self.db_snapshots[FinalDBSnapshotIdentifier] = {
+                "DBSnapshotIdentifier": FinalDBSnapshotIdentifier,
+                "DBInstanceIdentifier": DBInstanceIdentifier,
+                "SnapshotType": "manual",
+                "Status": "available",
+                "SnapshotCreateTime": datetime.now(timezone.utc),
+                "MasterUsername": db_instance.get("MasterUsername"),
+                "EngineVersion": db_instance.get("EngineVersion"),
+                "AllocatedStorage": db_instance.get("AllocatedStorage"),
+                # Not reported by DescribeDBSnapshots; kept so that restores get the source's database
+                "SourceDBName": db_instance.get("DBName"),
+            }
+        return {"DBInstance": dict(db_instance, DBInstanceStatus="deleting")}
+
+    def rds_delete_db_subnet_group(self, DBSubnetGroupName, **kwargs):
+        if DBSubnetGroupName not in self.db_subnet_groups:
+            raise_error(StandInExceptions.DBSubnetGroupNotFoundFault, "DBSubnetGroupNotFoundFault",
+                        "DeleteDBSubnetGroup")
+        if any(db_instance["DBSubnetGroup"]["DBSubnetGroupName"] == DBSubnetGroupName
+               for db_instance in self.db_instances.values()):
+            raise_error(StandInExceptions.InvalidDBSubnetGroupStateFault, "InvalidDBSubnetGroupStateFault",
+                        "DeleteDBSubnetGroup")
+        del self.db_subnet_groups[DBSubnetGroupName]
+        return {}
+
+    def rds_describe_db_snapshots(self, DBSnapshotIdentifier=None, DBInstanceIdentifier=None, SnapshotType=None,
+                                  **kwargs):
+        if DBSnapshotIdentifier is not None:
+            if DBSnapshotIdentifier not in self.db_snapshots:
+                raise_error(StandInExceptions.DBSnapshotNotFoundFault, "DBSnapshotNotFound", "DescribeDBSnapshots")
+            return {"DBSnapshots": [self.db_snapshots[DBSnapshotIdentifier]]}
+        snapshots = [
+            snapshot for snapshot in self.db_snapshots.values()
+            if DBInstanceIdentifier in (None, snapshot["DBInstanceIdentifier"])
+            and SnapshotType in (None, snapshot["SnapshotType"])
+        ]
+        return self.paginate(snapshots, "DBSnapshots", "Marker", kwargs)
+
+    def rds_restore_db_instance_from_db_snapshot(self, DBInstanceIdentifier, DBSnapshotIdentifier, **kwargs):
+        snapshot = self.db_snapshots[DBSnapshotIdentifier]
+        return self.rds_create_db_instance(
+            DBInstanceIdentifier, MasterUsername=snapshot["MasterUsername"], EngineVersion=snapshot["EngineVersion"],
+            DBName=snapshot.get("SourceDBName"), **kwargs
+        )
+
+    def rds_restore_db_instance_to_point_in_time(self, SourceDBInstanceIdentifier, TargetDBInstanceIdentifier,
+                                                 RestoreTime=None, UseLatestRestorableTime=False, **kwargs):
+        source = self.db_instances[SourceDBInstanceIdentifier]
+        return self.rds_create_db_instance(
+            TargetDBInstanceIdentifier, MasterUsername=source["MasterUsername"], EngineVersion=source["EngineVersion"],
+            DBName=source.get("DBName"), **kwargs
+        )
+
+    def rds_create_db_instance_read_replica(self, DBInstanceIdentifier, SourceDBInstanceIdentifier, **kwargs):
+        source = self.db_instances[SourceDBInstanceIdentifier]
+        response = self.rds_create_db_instance(
+            DBInstanceIdentifier,
+            **dict(kwargs, ReadReplicaSourceDBInstanceIdentifier=SourceDBInstanceIdentifier,
+                   DBSubnetGroupName=source["DBSubnetGroup"]["DBSubnetGroupName"],
+                   MasterUsername=source.get("MasterUsername"), EngineVersion=source.get("EngineVersion")),
+        )
+        source["ReadReplicaDBInstanceIdentifiers"].append(DBInstanceIdentifier)
+        return response
+
+    def rds_modify_db_instance(self, DBInstanceIdentifier, **kwargs):
+        self.db_instances[DBInstanceIdentifier].update(kwargs)
+        return {"DBInstance": self.db_instances[DBInstanceIdentifier]}
+
+    def rds_describe_orderable_db_instance_options(self, Engine, DBInstanceClass=None, **kwargs):
+        # Every class is offered in all zones but the last, so placement has to avoid one
+        options = [
+            {
+                "Engine": Engine,
+                "DBInstanceClass": DBInstanceClass,
+                "StorageType": storage_type,
+                "AvailabilityZones": [{"Name": zone} for zone in self.availability_zones[:-1]],
+                "SupportsPerformanceInsights": not DBInstanceClass.endswith((".micro", ".small")),
+                "SupportsEnhancedMonitoring": True,
+                **limits,
+            }
+            for storage_type, limits in STORAGE_LIMITS.items()
+        ]
+        return self.paginate(options, "OrderableDBInstanceOptions", "Marker", kwargs)
+
+    def rds_create_db_proxy(self, DBProxyName, **kwargs):
+        self.db_proxies[DBProxyName] = dict(
+            kwargs,
+            DBProxyName=DBProxyName,
+            Status="available",
+            Endpoint=f"{DBProxyName}.proxy-bench.rds.amazonaws.com",
+            Targets=[],
+        )
+        return {"DBProxy": self.db_proxies[DBProxyName]}
+
+    def rds_describe_db_proxies(self, DBProxyName=None, **kwargs):
+        if DBProxyName is not None:
+            if DBProxyName not in self.db_proxies:
+                raise_error(StandInExceptions.DBProxyNotFoundFault, "DBProxyNotFoundFault", "DescribeDBProxies")
+            return {"DBProxies": [self.db_proxies[DBProxyName]]}
+        return self.paginate(list(self.db_proxies.values()), "DBProxies", "Marker", kwargs)
+
+    def rds_delete_db_proxy(self, DBProxyName, **kwargs):
+        return {"DBProxy": dict(self.db_proxies.pop(DBProxyName), Status="deleting")}
+
+    def rds_register_db_proxy_targets(self, DBProxyName, DBInstanceIdentifiers, **kwargs):
+        targets = self.db_proxies[DBProxyName]["Targets"]
+        if set(targets) & set(DBInstanceIdentifiers):
+            raise_error(StandInExceptions.DBProxyTargetAlreadyRegisteredFault, "DBProxyTargetAlreadyRegisteredFault",
+                        "RegisterDBProxyTargets")
+        targets.extend(DBInstanceIdentifiers)
+        return {"DBProxyTargets": [{"RdsResourceId": identifier} for identifier in DBInstanceIdentifiers]}
+
+    def rds_modify_db_proxy_target_group(self, DBProxyName, TargetGroupName, **kwargs):
+        self.db_proxies[DBProxyName]["ConnectionPoolConfig"] = kwargs.get("ConnectionPoolConfig")
+        return {"DBProxyTargetGroup": {"DBProxyName": DBProxyName, "TargetGroupName": TargetGroupName}}
+
+    # Secrets Manager
+
+    def secretsmanager_create_secret(self, Name, SecretString, **kwargs):
+        if Name in self.secrets:
+            raise_error(StandInExceptions.ResourceExistsException, "ResourceExistsException", "CreateSecret")
+        self.secrets[Name] = {"ARN": f"arn:aws:secretsmanager:{self.region}:000000000000:secret:{Name}",
+                              "SecretString": SecretString}
+        return {"ARN": self.secrets[Name]["ARN"], "Name": Name}
+
+    def secretsmanager_put_secret_value(self, SecretId, SecretString, **kwargs):
+        self.secrets[SecretId]["SecretString"] = SecretString
+        return {"ARN": self.secrets[SecretId]["ARN"], "Name": SecretId}
+
+    def secretsmanager_delete_secret(self, SecretId, **kwargs):
+        if SecretId not in self.secrets:
+            raise_error(StandInExceptions.ResourceNotFoundException, "ResourceNotFoundException", "DeleteSecret")
+        secret = self.secrets.pop(SecretId)
+        return {"ARN": secret["ARN"], "Name": SecretId}
+
+    # IAM
+
+    def iam_create_role(self, RoleName, **kwargs):
+        if RoleName in self.roles:
+            raise_error(StandInExceptions.EntityAlreadyExistsException, "EntityAlreadyExists", "CreateRole")
+        self.roles[RoleName] = {"RoleName": RoleName, "Arn": f"arn:aws:iam::000000000000:role/{RoleName}",
+                                "Policies": {}}
+        return {"Role": self.roles[RoleName]}
+
+    def iam_get_role(self, RoleName, **kwargs):
+        if RoleName not in self.roles:
+            raise_error(StandInExceptions.NoSuchEntityException, "NoSuchEntity", "GetRole")
+        return {"Role": self.roles[RoleName]}
+
+    def iam_attach_role_policy(self, RoleName, PolicyArn, **kwargs):
+        self.roles[RoleName].setdefault("AttachedPolicies", []).append(PolicyArn)
+        return {}
+
+    def iam_put_role_policy(self, RoleName, PolicyName, PolicyDocument, **kwargs):
+        self.roles[RoleName]["Policies"][PolicyName] = PolicyDocument
+        return {}
+
+    def iam_delete_role_policy(self, RoleName, PolicyName, **kwargs):
+        if PolicyName not in self.roles.get(RoleName, {}).get("Policies", {}):
+            raise_error(StandInExceptions.NoSuchEntityException, "NoSuchEntity", "DeleteRolePolicy")
+        del self.roles[RoleName]["Policies"][PolicyName]
+        return {}
+
+    def iam_delete_role(self, RoleName, **kwargs):
+        if RoleName not in self.roles:
+            raise_error(StandInExceptions.NoSuchEntityException, "NoSuchEntity", "DeleteRole")
+        del self.roles[RoleName]
+        return {}
+
+
+# Input and output pagination tokens per operation, mirroring botocore's paginator definitions
+PAGINATION_TOKENS = {
+    "describe_vpcs": ("NextToken", "NextToken"),
+    "describe_subnets": ("NextToken", "NextToken"),
+    "describe_route_tables": ("NextToken", "NextToken"),
+    "describe_instance_type_offerings": ("NextToken", "NextToken"),
+    "describe_events": ("NextToken", "NextToken"),
+    "describe_db_engine_versions": ("Marker", "Marker"),
+    "describe_db_subnet_groups": ("Marker", "Marker"),
+    "describe_db_instances": ("Marker", "Marker"),
+    "describe_db_snapshots": ("Marker", "Marker"),
+    "describe_db_parameters": ("Marker", "Marker"),
+    "describe_orderable_db_instance_options": ("Marker", "Marker"),
+}
+
+
+class StandInPaginator(object):
+    def __init__(self, client, operation_name):
+        self.client = client
+        self.operation_name = operation_name
+
+    def paginate(self, **kwargs):
+        input_token, output_token = PAGINATION_TOKENS[self.operation_name]
+        while True:
+            page = getattr(self.client, self.operation_name)(**kwargs)
+            yield page
+            if not page.get(output_token):
+                return
+            kwargs = dict(kwargs, **{input_token: page[output_token]})
+
+
+class ServiceModels(object):
+    """botocore's service models, loaded once per service and shared by every client."""
+    _session = None
+    _models = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_operation_model(cls, service_name, operation_name):
+        with cls._lock:
+            if service_name not in cls._models:
+                if cls._session is None:
+                    cls._session = botocore.session.get_session()
+                service_model = cls._session.get_service_model(service_name)
+                cls._models[service_name] = (service_model, {
+                    xform_name(name): name for name in service_model.operation_names
+                })
+        service_model, operation_names = cls._models[service_name]
+        if operation_name not in operation_names:
+            raise AttributeError(f"{service_name} has no operation {operation_name}")
+        return service_model.operation_model(operation_names[operation_name])
+
+
+def validate_params(service_name, operation_name, params):
+    """Raise ParamValidationError, as a boto3 client would, if `params` do not fit the operation's input shape."""
+    input_shape = ServiceModels.get_operation_model(service_name, operation_name).input_shape
+    if input_shape is None:
+        return
+    report = ParamValidator().validate(params, input_shape)
+    if report.has_errors():
+        raise ParamValidationError(report=report.generate_report())
+
+
+class StandInClient(object):
+    exceptions = StandInExceptions
+
+    def __init__(self, aws, service_name, region):
+        self.aws = aws
+        self.service_name = service_name
+        self.region = region
+
+    def __getattr__(self, operation_name):
+        handler = getattr(self.aws, f"{self.service_name}_{operation_name}", None)
+        if handler is None:
+            raise AttributeError(f"The stand-in does not implement {self.service_name}.{operation_name}")
+
+        def call(**kwargs):
+            validate_params(self.service_name, operation_name, kwargs)
+            self.aws.calls[f"{self.service_name}.{operation_name}"] += 1
+            return handler(**kwargs)
+        return call
+
+    def get_paginator(self, operation_name):
+        return StandInPaginator(self, operation_name)
+
+
+class StandInClientPool(object):
+    """Drop-in replacement for ClientPool backed by a StandInAWS account."""
+    def __init__(self, aws, tracer=None):
+        self.aws = aws
+        self.tracer = tracer or NullTracer()
+        self.profile_name = None
+        self._clients = {}
+
+    @staticmethod
+    def get_available_profiles():
+        return ["bench"]
+
+    def set_profile(self, profile_name):
+        self.profile_name = profile_name
+
+    def client(self, service_name, region):
+        key = (service_name, region)
+        if key not in self._clients:
+            self._clients[key] = StandInClient(self.aws, service_name, region)
+        return self._clients[key]
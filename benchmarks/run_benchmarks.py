@@ -0,0 +1,434 @@
+"""
+Offline benchmarks for eb-create-environment.
+
+Runs the provisioning code paths against the in-process AWS stand-in in `aws_standin.py`, seeded at several account
+sizes, and reports wall time, API calls per operation and peak Python memory for each.  Every measured path has an
+API call budget that must not grow with the size of the account; the script exits non-zero if any budget is exceeded,
+so it can gate a build:
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scale large --json bench_output.json
+    python benchmarks/run_benchmarks.py --vpcs 50 --route-tables 400 --parallel
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aws_standin import StandInAWS, StandInClientPool  # noqa: E402
+from eb_create_environment.cache import DiskCache  # noqa: E402
+from eb_create_environment.database import DatabaseInitializer, Engine  # noqa: E402
+from eb_create_environment.script import SetupWrapper  # noqa: E402
+from eb_create_environment.state import ProvisioningState  # noqa: E402
+from eb_create_environment.utils import merge_config  # noqa: E402
+from eb_create_environment.vpc import VPCAccessor  # noqa: E402
+
+
+SCALES = {
+    "small": dict(vpcs=5, route_tables=10),
+    "large": dict(vpcs=500, route_tables=2000),
+}
+
+TOTAL = "total"
+REPLICA_COUNT = 2
+
+# Maximum number of API calls (pages count individually) per code path.  None of these may depend on how many
+# VPCs, route tables or databases exist in the account.
+BUDGETS = {
+    "VPCAccessor.get_subnets": {
+        "ec2.describe_subnets": 1,
+        "ec2.describe_route_tables": 1,
+        "ec2.describe_instance_type_offerings": 1,
+        TOTAL: 3,
+    },
+    "DatabaseInitializer.get_host_from_response": {
+        "rds.describe_db_instances": 1,
+        TOTAL: 1,
+    },
+    "SetupWrapper.get_eb_config": {
+        "ec2.describe_regions": 1,
+        "elasticbeanstalk.describe_applications": 1,
+        TOTAL: 2,
+    },
+    "SetupWrapper.setup": {
+        "ec2.describe_route_tables": 1,
+        "elasticbeanstalk.describe_events": 1,
+        "elasticbeanstalk.update_environment": 1,
+        "rds.describe_db_instances": 1,
+        TOTAL: 25,
+    },
+    # DATABASE_URL goes into create_environment, so no second deployment
+    "SetupWrapper.setup --link-at-launch": {
+        "elasticbeanstalk.create_environment": 1,
+        "elasticbeanstalk.update_environment": 0,
+        TOTAL: 35,
+    },
+    # The proxy is waited for with one poll once the database is up; no per-target polling
+    "SetupWrapper.setup RDSProxy": {
+        "rds.create_db_proxy": 1,
+        "rds.register_db_proxy_targets": 1,
+        "rds.describe_db_proxies": 1,
+        TOTAL: 35,
+    },
+    # The settings the restore does not take are applied in a single modify
+    "SetupWrapper.setup RDS.Source": {
+        "rds.restore_db_instance_to_point_in_time": 1,
+        "rds.modify_db_instance": 1,
+        TOTAL: 30,
+    },
+    # Replicas are created together and linked in the same update as DATABASE_URL
+    "SetupWrapper.setup RDS.ReadReplicas": {
+        "rds.create_db_instance_read_replica": REPLICA_COUNT,
+        "elasticbeanstalk.update_environment": 1,
+        TOTAL: 25 + 2 * REPLICA_COUNT,
+    },
+    # Deletions run concurrently, each polled until gone
+    "SetupWrapper.setup --destroy": {
+        "elasticbeanstalk.terminate_environment": 1,
+        "rds.delete_db_instance": 1 + REPLICA_COUNT,
+        "rds.delete_db_proxy": 1,
+        TOTAL: 45,
+    },
+    # Safe to re-run: nothing that is looked up first is deleted again.  (The proxy's secret and role are deleted by
+    # name, which the second time is a not-found no-op.)
+    "SetupWrapper.setup --destroy (again)": {
+        "elasticbeanstalk.terminate_environment": 0,
+        "rds.delete_db_instance": 0,
+        "rds.delete_db_proxy": 0,
+        "rds.delete_db_subnet_group": 0,
+        "ec2.delete_security_group": 0,
+        "ec2.revoke_security_group_ingress": 0,
+        TOTAL: 15,
+    },
+    # Re-applying an unchanged config must not start an update (and the rolling deployment that comes with it)
+    "SetupWrapper.setup --update": {
+        "elasticbeanstalk.describe_configuration_settings": 1,
+        "elasticbeanstalk.update_environment": 0,
+        TOTAL: 5,
+    },
+}
+
+
+class Measurement(object):
+    def __init__(self, name, scale, seconds, calls, peak_memory, failures=None):
+        self.name = name
+        self.scale = scale
+        self.seconds = seconds
+        self.calls = calls
+        self.peak_memory = peak_memory
+        self.violations = [
+            f"{operation}: {calls[operation] if operation != TOTAL else sum(calls.values())} > {budget}"
+            for operation, budget in BUDGETS.get(name, {}).items()
+            if (sum(calls.values()) if operation == TOTAL else calls[operation]) > budget
+        ] + list(failures or [])
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "scale": self.scale,
+            "seconds": self.seconds,
+            "api_calls": sum(self.calls.values()),
+            "calls": dict(self.calls),
+            "peak_memory_bytes": self.peak_memory,
+            "budget_violations": self.violations,
+        }
+
+
+def measure(name, scale, aws, function, check=None):
+    """Run `function` and measure it; `check`, if given, returns what is wrong with the resulting stand-in state."""
+    calls_before = Counter(aws.calls)
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    seconds = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return Measurement(name, scale, seconds, aws.calls - calls_before, peak_memory, check() if check else None)
+
+
+def load_config():
+    config_path = os.path.join(os.path.dirname(sys.modules[SetupWrapper.__module__].__file__), "default_config.yml")
+    import yaml
+    with open(config_path) as config_file:
+        return yaml.safe_load(config_file)
+
+
+def write_config(name, overrides):
+    """Write the default config with `overrides` merged in to the working directory and return its path."""
+    import yaml
+    config_path = os.path.abspath(f"{name}.yml")
+    with open(config_path, "w") as config_file:
+        yaml.safe_dump(merge_config(load_config(), overrides), config_file)
+    return config_path
+
+
+def get_environment_variable(aws, environment_name, variable):
+    for setting in aws.environments.get(environment_name, {}).get("OptionSettings", []):
+        if setting["Namespace"] == "aws:elasticbeanstalk:application:environment" and setting["OptionName"] == variable:
+            return setting["Value"]
+    return None
+
+
+def get_setup_argv(aws, environment_name, parallel, prefetch=True, update=False, link_at_launch=False,
+                   config_path=None, destroy=False):
+    argv = [
+        "-a", aws.applications[0],
+        "-e", environment_name,
+        "-p", "bench",
+        "-r", aws.region,
+        "--cname_prefix", environment_name,
+        "--vpc_id", aws.vpcs[0]["VpcId"],
+    ]
+    if parallel:
+        argv.append("--parallel")
+    if not prefetch:
+        argv.append("--no-prefetch")
+    if update:
+        argv.append("--update")
+    if link_at_launch:
+        argv.append("--link-at-launch")
+    if config_path:
+        argv += ["-c", config_path]
+    if destroy:
+        argv.append("--destroy")
+    return argv
+
+
+def run_scale(scale, seed, parallel):
+    measurements = []
+    config = load_config()
+
+    aws = StandInAWS(**seed)
+    clients = StandInClientPool(aws)
+    vpc_id = aws.vpcs[0]["VpcId"]
+    instance_type = config["ElasticBeanstalk"]["InstanceTypes"]
+    measurements.append(measure(
+        "VPCAccessor.get_subnets", scale, aws,
+        lambda: VPCAccessor(aws.region, clients).get_subnets(vpc_id, True, instance_type=instance_type),
+    ))
+
+    aws = StandInAWS(**seed)
+    clients = StandInClientPool(aws)
+    # Background prefetches would otherwise be counted against whichever path happens to be measured next
+    wrapper = SetupWrapper(
+        get_setup_argv(aws, "bench-env", parallel, prefetch=False), clients=clients, cache=DiskCache(enabled=False)
+    )
+    measurements.append(measure("SetupWrapper.get_eb_config", scale, aws, wrapper.get_eb_config))
+    wrapper = SetupWrapper(get_setup_argv(aws, "bench-env", parallel), clients=clients, cache=DiskCache(enabled=False))
+    measurements.append(measure("SetupWrapper.setup", scale, aws, wrapper.setup))
+    wrapper = SetupWrapper(
+        get_setup_argv(aws, "bench-env", parallel, prefetch=False, update=True), clients=clients,
+        cache=DiskCache(enabled=False),
+    )
+    measurements.append(measure("SetupWrapper.setup --update", scale, aws, wrapper.setup))
+    if not parallel:
+        wrapper = SetupWrapper(
+            get_setup_argv(aws, "bench-env-linked", parallel, link_at_launch=True), clients=clients,
+            cache=DiskCache(enabled=False),
+        )
+        measurements.append(measure("SetupWrapper.setup --link-at-launch", scale, aws, wrapper.setup))
+
+    wrapper = SetupWrapper(
+        get_setup_argv(
+            aws, "bench-env-proxy", parallel, prefetch=False, config_path=write_config("proxy", {"RDSProxy": {"RequireTLS": True}}),
+        ),
+        clients=clients, cache=DiskCache(enabled=False),
+    )
+    measurements.append(measure(
+        "SetupWrapper.setup RDSProxy", scale, aws, wrapper.setup,
+        lambda: check_proxy(aws, "bench-env-proxy"),
+    ))
+    # Restored from bench-env's database; its DBName must win over the configured one
+    restore_config = write_config("restore", {
+        "RDS": {
+            "Source": {"DBInstanceIdentifier": "bench-env-db", "RestoreTime": "latest"},
+            "Postgres": {"DBName": "not-restored"},
+        },
+    })
+    wrapper = SetupWrapper(
+        get_setup_argv(aws, "bench-env-restored", parallel, prefetch=False, config_path=restore_config),
+        clients=clients, cache=DiskCache(enabled=False),
+    )
+    measurements.append(measure(
+        "SetupWrapper.setup RDS.Source", scale, aws, wrapper.setup,
+        lambda: check_restore(aws, "bench-env-restored", "bench-env-db"),
+    ))
+    wrapper = SetupWrapper(
+        get_setup_argv(
+            aws, "bench-env-replicas", parallel, prefetch=False,
+            config_path=write_config("replicas", {"RDS": {"ReadReplicas": {"Count": REPLICA_COUNT}}}),
+        ),
+        clients=clients, cache=DiskCache(enabled=False),
+    )
+    measurements.append(measure(
+        "SetupWrapper.setup RDS.ReadReplicas", scale, aws, wrapper.setup,
+        lambda: check_replicas(aws, "bench-env-replicas", REPLICA_COUNT),
+    ))
+    if not parallel:
+        # Everything --destroy knows how to delete: proxy, replicas, database, security groups, subnet group, state
+        full_config = write_config("full", {
+            "RDS": {"ReadReplicas": {"Count": REPLICA_COUNT}}, "RDSProxy": {"RequireTLS": True},
+        })
+        with contextlib.redirect_stdout(io.StringIO()):
+            SetupWrapper(
+                get_setup_argv(aws, "bench-env-destroyed", parallel, prefetch=False, config_path=full_config),
+                clients=clients, cache=DiskCache(enabled=False),
+            ).setup()
+        # The second run must find nothing left to delete and change nothing
+        for name in ["SetupWrapper.setup --destroy", "SetupWrapper.setup --destroy (again)"]:
+            wrapper = SetupWrapper(
+                get_setup_argv(aws, "bench-env-destroyed", parallel, prefetch=False, destroy=True), clients=clients,
+                cache=DiskCache(enabled=False),
+            )
+            inventory = get_inventory(aws)
+            with mock.patch("builtins.input", return_value="bench-env-destroyed"):
+                measurements.append(measure(
+                    name, scale, aws, wrapper.setup,
+                    lambda: check_destroyed(aws, "bench-env-destroyed") + (
+                        ["the second run changed the account"]
+                        if name.endswith("(again)") and get_inventory(aws) != inventory else []
+                    ),
+                ))
+
+    db_initializer = DatabaseInitializer(
+        aws.region, config, Engine.postgres, vpc_id, "bench-env", None, clients=clients
+    )
+    measurements.append(measure(
+        "DatabaseInitializer.get_host_from_response", scale, aws, db_initializer.get_host_from_response
+    ))
+    return measurements
+
+
+def check_proxy(aws, environment_name):
+    database_url = get_environment_variable(aws, environment_name, "DATABASE_URL") or ""
+    proxy = aws.db_proxies.get(f"{environment_name}-proxy")
+    if not proxy:
+        return ["no proxy created"]
+    if f"@{proxy['Endpoint']}:" not in database_url:
+        return ["DATABASE_URL does not point at the proxy"]
+    return []
+
+
+def check_restore(aws, environment_name, source_db_instance_identifier):
+    source = aws.db_instances[source_db_instance_identifier]
+    database_url = get_environment_variable(aws, environment_name, "DATABASE_URL") or ""
+    expected = f"postgres://{source['MasterUsername']}:"
+    failures = []
+    if not database_url.startswith(expected):
+        failures.append("DATABASE_URL does not use the source's master username")
+    if f"/{source['DBName']}?" not in database_url:
+        failures.append("DATABASE_URL does not use the source's database name")
+    return failures
+
+
+def check_replicas(aws, environment_name, count):
+    replicas = [
+        db_instance for db_instance in aws.db_instances.values()
+        if db_instance.get("ReadReplicaSourceDBInstanceIdentifier") == f"{environment_name}-db"
+    ]
+    read_urls = (get_environment_variable(aws, environment_name, "DATABASE_READ_URLS") or "").split(",")
+    failures = []
+    if len(replicas) != count:
+        failures.append(f"{len(replicas)} replicas created instead of {count}")
+    if sorted(url.split("@")[1].split(":")[0] for url in read_urls if url) != sorted(
+        replica["Endpoint"]["Address"] for replica in replicas
+    ):
+        failures.append("DATABASE_READ_URLS does not list the replicas")
+    if len({replica.get("AvailabilityZone") for replica in replicas}) != len(replicas):
+        failures.append("replicas are not spread over availability zones")
+    return failures
+
+
+def get_inventory(aws):
+    return {
+        "db_instances": sorted(aws.db_instances),
+        "db_proxies": sorted(aws.db_proxies),
+        "db_subnet_groups": sorted(aws.db_subnet_groups),
+        "db_snapshots": sorted(aws.db_snapshots),
+        "secrets": sorted(aws.secrets),
+        "roles": sorted(aws.roles),
+        "security_groups": sorted(aws.security_groups),
+        "environments": sorted((name, environment["Status"]) for name, environment in aws.environments.items()),
+    }
+
+
+def check_destroyed(aws, environment_name):
+    database_names = [f"{environment_name}-db"] + [
+        f"{environment_name}-db-replica-{index + 1}" for index in range(REPLICA_COUNT)
+    ]
+    leftovers = [name for name in database_names if name in aws.db_instances]
+    leftovers += [name for name in [f"{environment_name}-proxy"] if name in aws.db_proxies]
+    leftovers += [name for name in [f"{environment_name}-db-credentials"] if name in aws.secrets]
+    leftovers += [name for name in [f"{environment_name}-db-proxy"] if name in aws.roles]
+    leftovers += [
+        group["GroupName"] for group in aws.security_groups.values()
+        if group.get("GroupName", "").startswith(f"{environment_name}-")
+    ]
+    if aws.environments[environment_name]["Status"] != "Terminated":
+        leftovers.append(environment_name)
+    if os.path.isfile(ProvisioningState.get_path(environment_name)):
+        leftovers.append(ProvisioningState.get_path(environment_name))
+    return [f"left behind: {', '.join(leftovers)}"] if leftovers else []
+
+
+def print_measurements(measurements):
+    print(f"{'Scale':<8} {'Path':<44} {'Time (ms)':>10} {'API calls':>10} {'Peak KiB':>10}  Budget")
+    for measurement in measurements:
+        budget = "FAIL: " + "; ".join(measurement.violations) if measurement.violations else "ok"
+        print(
+            f"{measurement.scale:<8} {measurement.name:<44} {measurement.seconds * 1000:>10.1f} "
+            f"{sum(measurement.calls.values()):>10} {measurement.peak_memory / 1024:>10.0f}  {budget}"
+        )
+        for operation, count in sorted(measurement.calls.items()):
+            print(f"{'':<8}   {operation:<42} {count:>21}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark eb-create-environment against an in-process AWS stand-in")
+    parser.add_argument("--scale", choices=[*SCALES, "all"], default="all", help="Seeded account size")
+    parser.add_argument("--vpcs", type=int, default=None, help="Custom scale: number of VPCs")
+    parser.add_argument("--route-tables", type=int, default=None, help="Custom scale: number of route tables")
+    parser.add_argument("--parallel", action="store_true", help="Benchmark the `--parallel` setup path")
+    parser.add_argument("--json", default=None, help="Also write the results as JSON to this path")
+    args = parser.parse_args()
+
+    if args.vpcs or args.route_tables:
+        scales = {"custom": dict(vpcs=args.vpcs or 5, route_tables=args.route_tables or 10)}
+    elif args.scale == "all":
+        scales = SCALES
+    else:
+        scales = {args.scale: SCALES[args.scale]}
+
+    measurements = []
+    original_directory = os.getcwd()
+    for scale, seed in scales.items():
+        # The setup writes .elasticbeanstalk/ files relative to the working directory
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                measurements += run_scale(scale, seed, args.parallel)
+            finally:
+                os.chdir(original_directory)
+
+    print_measurements(measurements)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump([measurement.to_dict() for measurement in measurements], json_file, indent=2)
+    violations = [measurement for measurement in measurements if measurement.violations]
+    if violations:
+        print(f"\n{len(violations)} API call budget(s) exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from eb_create_environment.utils import merge_config
+from eb_create_environment.vpc import VPCAccessor
+
+
+DEFAULT_MAX_PER_REGION = 4
+
+
+class ManifestEntry(object):
+    def __init__(self, entry, default_region):
+        if "environment_name" not in entry or "vpc_id" not in entry:
+            raise Exception(f"Manifest entries require `environment_name` and `vpc_id`: {entry}")
+        self.environment_name = entry["environment_name"]
+        self.vpc_id = entry["vpc_id"]
+        self.region = entry.get("region") or default_region
+        self.db_only = entry.get("db_only", False)
+        self.no_db = entry.get("no_db", False)
+        self.cname_prefix = None if self.db_only else entry.get("cname_prefix", self.environment_name)
+        self.config_overrides = entry.get("config") or {}
+        if self.db_only and self.no_db:
+            raise Exception(f"{self.environment_name}: db_only cannot be used with no_db")
+
+
+class ManifestResult(object):
+    def __init__(self, entry, elapsed, error=None):
+        self.entry = entry
+        self.elapsed = elapsed
+        self.error = error
+
+
+class ManifestProvisioner(object):
+    """
+    Provision every environment in a manifest, running at most `max_per_region` pipelines at a time in each region.
+    All pipelines share the wrapper's client pool, so adaptive retry throttling is shared per service and region.
+
+    The manifest is a YAML (or JSON) list of entries, or a mapping with an `environments` list:
+
+        environments:
+          - environment_name: staging-feature-x
+            vpc_id: vpc-0123456789abcdef0
+            cname_prefix: staging-feature-x  # defaults to environment_name
+            region: us-east-1  # defaults to the EB config region
+            no_db: false
+            db_only: false
+            config:  # merged over the base config file
+              ElasticBeanstalk:
+                InstanceTypes: "t3.medium"
+    """
+    def __init__(self, setup_wrapper, base_config, manifest_path, max_per_region=DEFAULT_MAX_PER_REGION):
+        self.setup_wrapper = setup_wrapper
+        self.base_config = base_config
+        self.max_per_region = max_per_region
+        self.entries = self.load_manifest(manifest_path)
+        self.vpc_accessors = {}
+        self.lock = threading.Lock()
+
+    def load_manifest(self, manifest_path):
+        import yaml
+        with open(manifest_path) as manifest_file:
+            manifest = yaml.safe_load(manifest_file)
+        if isinstance(manifest, dict):
+            manifest = manifest.get("environments")
+        if not manifest:
+            raise Exception(f"No environments found in manifest {manifest_path}")
+        entries = [ManifestEntry(entry, self.setup_wrapper.region) for entry in manifest]
+        names = [entry.environment_name for entry in entries]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise Exception(f"Duplicate environment names in manifest: {', '.join(duplicates)}")
+        return entries
+
+    def get_vpc_accessor(self, region):
+        with self.lock:
+            if region not in self.vpc_accessors:
+                self.vpc_accessors[region] = VPCAccessor(region, self.setup_wrapper.clients, self.setup_wrapper.cache)
+            return self.vpc_accessors[region]
+
+    def run(self):
+        entries_by_region = {}
+        for entry in self.entries:
+            entries_by_region.setdefault(entry.region, []).append(entry)
+        print(f"Provisioning {len(self.entries)} environment(s) in {len(entries_by_region)} region(s)")
+        executors = [
+            ThreadPoolExecutor(max_workers=self.max_per_region, thread_name_prefix=region)
+            for region in entries_by_region
+        ]
+        try:
+            futures = [
+                executor.submit(self.provision, entry)
+                for executor, region_entries in zip(executors, entries_by_region.values())
+                for entry in region_entries
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            for executor in executors:
+                executor.shutdown()
+        self.print_summary(results)
+        return results
+
+    def provision(self, entry):
+        start = time.monotonic()
+        try:
+            self.setup_wrapper.provision(
+                merge_config(self.base_config, entry.config_overrides),
+                entry.region,
+                entry.environment_name,
+                entry.cname_prefix,
+                entry.vpc_id,
+                entry.db_only,
+                entry.no_db,
+                self.get_vpc_accessor(entry.region),
+            )
+        except Exception as e:
+            traceback.print_exc()
+            return ManifestResult(entry, time.monotonic() - start, error=f"{type(e).__name__}: {e}")
+        return ManifestResult(entry, time.monotonic() - start)
+
+    def print_summary(self, results):
+        name_width = max(len("Environment"), *(len(result.entry.environment_name) for result in results))
+        region_width = max(len("Region"), *(len(result.entry.region) for result in results))
+        print("\nSummary:")
+        print(f"{'Environment':<{name_width}}  {'Region':<{region_width}}  {'Time':>8}  Result")
+        for result in results:
+            status = f"FAILED ({result.error})" if result.error else "OK"
+            print(
+                f"{result.entry.environment_name:<{name_width}}  {result.entry.region:<{region_width}}  "
+                f"{int(result.elapsed):>7}s  {status}"
+            )
+        failures = len([result for result in results if result.error])
+        print(f"{len(results) - failures} succeeded, {failures} failed")
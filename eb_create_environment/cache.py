@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "eb-create-environment",
+)
+DEFAULT_MAX_ENTRIES = 256
+
+# How long each catalog lookup is trusted, in seconds
+REGIONS_TTL = 7 * 24 * 60 * 60
+SOLUTION_STACKS_TTL = 24 * 60 * 60
+ENGINE_VERSIONS_TTL = 24 * 60 * 60
+INSTANCE_TYPE_OFFERINGS_TTL = 7 * 24 * 60 * 60
+INSTANCE_TYPES_TTL = 7 * 24 * 60 * 60
+ORDERABLE_DB_INSTANCE_OPTIONS_TTL = 7 * 24 * 60 * 60
+
+
+class DiskCache(object):
+    """
+    Best-effort JSON cache for slow-changing AWS catalog lookups, keyed by profile, region and query.  Each entry
+    carries its own expiry; once more than `max_entries` files exist the least recently written ones are evicted.
+    With `refresh` set, entries are never read but are still rewritten with fresh values.
+
+    Values are also kept in memory for the rest of the run (even when the disk cache is disabled), and concurrent
+    lookups of the same query wait for a single fetch, so background prefetches are reused rather than repeated.
+    """
+    def __init__(self, profile_name=None, directory=DEFAULT_CACHE_DIRECTORY, max_entries=DEFAULT_MAX_ENTRIES,
+                 refresh=False, enabled=True):
+        self.profile_name = profile_name
+        self.directory = directory
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.enabled = enabled
+        self.memory = {}
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def get_or_fetch(self, region, query, ttl, fetch):
+        """Return the cached value for `query`, or call `fetch()` and cache its (JSON-serializable) result."""
+        key = json.dumps([self.profile_name, region, query])
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self.memory:
+                self.memory[key] = self.read_or_fetch(key, ttl, fetch) if self.enabled else fetch()
+            return self.memory[key]
+
+    def read_or_fetch(self, key, ttl, fetch):
+        path = os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + ".json")
+        if not self.refresh:
+            entry = self.read_entry(path)
+            if entry and entry.get("key") == key and entry.get("expires", 0) > time.time():
+                return entry["value"]
+        value = fetch()
+        self.write_entry(path, {"key": key, "expires": time.time() + ttl, "value": value})
+        return value
+
+    def read_entry(self, path):
+        try:
+            with open(path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return None
+
+    def write_entry(self, path, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as cache_file:
+                json.dump(entry, cache_file)
+            os.replace(temp_path, path)
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        paths = [
+            os.path.join(self.directory, file_name) for file_name in os.listdir(self.directory)
+            if file_name.endswith(".json")
+        ]
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:len(paths) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,66 @@
+import threading
+
+from eb_create_environment.instrumentation import NullTracer
+
+
+DEFAULT_MAX_POOL_CONNECTIONS = 20
+DEFAULT_MAX_ATTEMPTS = 10
+
+
+class ClientPool(object):
+    """
+    Registry of boto3 clients keyed by (service, region).  Each client is built once per profile with a shared
+    botocore config (connection pool size, adaptive retries, TCP keep-alive) and reused for the rest of the run.
+    boto3 clients are thread safe once created; creation itself is guarded by a lock.  boto3 is only imported when
+    the first client or session is needed.
+    """
+    def __init__(self, profile_name=None, max_pool_connections=DEFAULT_MAX_POOL_CONNECTIONS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, tracer=None):
+        self.profile_name = profile_name
+        self.tracer = tracer or NullTracer()
+        self.max_pool_connections = max_pool_connections
+        self.max_attempts = max_attempts
+        self._botocore_config = None
+        self._session = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_available_profiles():
+        import boto3
+        return boto3.session.Session().available_profiles
+
+    def set_profile(self, profile_name):
+        with self._lock:
+            if profile_name != self.profile_name:
+                self.profile_name = profile_name
+                self._session = None
+                self._clients = {}
+
+    def get_session(self):
+        if self._session is None:
+            import boto3
+            self._session = boto3.session.Session(profile_name=self.profile_name)
+        return self._session
+
+    def get_botocore_config(self):
+        if self._botocore_config is None:
+            from botocore.config import Config
+            self._botocore_config = Config(
+                max_pool_connections=self.max_pool_connections,
+                retries={"mode": "adaptive", "max_attempts": self.max_attempts},
+                tcp_keepalive=True,
+            )
+        return self._botocore_config
+
+    def client(self, service_name, region):
+        key = (service_name, region)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.get_session().client(service_name, region, config=self.get_botocore_config())
+                    self.tracer.instrument(client)
+                    self._clients[key] = client
+        return client
@@ -1,13 +1,43 @@
+import json
+import threading
 import time
-import boto3
 import fnmatch
 
-from botocore.exceptions import ParamValidationError
+from botocore.exceptions import ClientError, ParamValidationError
 from choicesenum import ChoicesEnum
-from eb_create_environment.utils import generate_secure_password
+from eb_create_environment.cache import DiskCache, ENGINE_VERSIONS_TTL
+from eb_create_environment.clients import ClientPool
+from eb_create_environment.instance_types import DBInstanceClassCatalog
+from eb_create_environment.proxy import DatabaseProxy, ROLE_PROPAGATION_TIMEOUT
+from eb_create_environment.parameter_groups import DEFAULT_TUNING_PROFILE, ParameterGroupManager
+from eb_create_environment.replicas import ReadReplicaSet
+from eb_create_environment.restore import DatabaseRestore
+from eb_create_environment.state import ProvisioningState
+from eb_create_environment.storage import resolve_storage
+from eb_create_environment.utils import (
+    generate_secure_password, get_static_version_prefix, poll_until, version_sort_key
+)
 from eb_create_environment.vpc import VPCAccessor
 
 
+# EngineVersion value that selects the engine's default version
+DEFAULT_ENGINE_VERSION = "default"
+# The database every Postgres instance has; the one to connect to when an instance was created without DBName
+POSTGRES_DEFAULT_DB_NAME = "postgres"
+# RDS-managed parameter groups, which cannot be modified, are named `default.<family>`
+DEFAULT_PARAMETER_GROUP_PREFIX = "default."
+DEFAULT_DB_WAIT_TIMEOUT = 1800
+DB_EXPECTED_CREATE_SECONDS = 600
+FAILED_DB_STATUSES = [
+    'failed',
+    'incompatible-network',
+    'incompatible-option-group',
+    'incompatible-parameters',
+    'incompatible-restore',
+    'inaccessible-encryption-credentials',
+    'storage-full',
+]
+
 BASE_PARAMS = [
     'AllocatedStorage',
     'DBInstanceClass',
@@ -24,12 +54,32 @@ BASE_PARAMS = [
     'MaxAllocatedStorage',
 ]
 
+# Passed to create_db_instance when present in the RDS config block
+OPTIONAL_PARAMS = [
+    'EnablePerformanceInsights',
+    'PerformanceInsightsRetentionPeriod',
+    'PerformanceInsightsKMSKeyId',
+    'MonitoringRoleArn',
+    'EnableCloudwatchLogsExports',
+    'Iops',
+    'StorageThroughput',
+]
+
+MONITORING_ROLE_NAME = "rds-monitoring-role"
+MONITORING_ROLE_POLICY_ARN = "arn:aws:iam::aws:policy/service-role/AmazonRDSEnhancedMonitoringRole"
+MONITORING_ASSUME_ROLE_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [{
+        "Effect": "Allow",
+        "Principal": {"Service": "monitoring.rds.amazonaws.com"},
+        "Action": "sts:AssumeRole",
+    }],
+}
+
 # Currently not in use
 EXTENDED_PARAMS = dict(
-    AvailabilityZone='string',
     PreferredMaintenanceWindow='string',
     PreferredBackupWindow='string',
-    Iops=0,
     DBClusterIdentifier='string',
     Tags=[
         {
@@ -49,18 +99,11 @@ EXTENDED_PARAMS = dict(
             'Value': 'string'
         },
     ],
-    EnableCloudwatchLogsExports=[
-        'string',
-    ],
-    PerformanceInsightsKMSKeyId='string',
-    PerformanceInsightsRetentionPeriod=7,
     Domain='string',
-    MonitoringRoleArn='string',
     DomainIAMRoleName='string',
     PromotionTier=123,  # aurora
     Timezone='string',  # sqlserver
     EnableIAMDatabaseAuthentication=True | False,
-    EnablePerformanceInsights=True | False,
 )
 
 POSTGRES_PARAMS = [
@@ -96,52 +139,134 @@ ENGINE_NAME_LOOKUP = {
     Engine.postgres: "Postgres",
 }
 
+# CloudWatch Logs export that carries statements logged by log_min_duration_statement
+LOG_EXPORT_BY_ENGINE = {
+    Engine.postgres: "postgresql",
+}
+
 
 class DatabaseInitializer(object):
-    def __init__(self, region, config, engine, vpc_id, environment_name, application_security_group_id):
+    def __init__(self, region, config, engine, vpc_id, environment_name, application_security_group_id,
+                 vpc_accessor=None, clients=None, cache=None, state=None, placement=None):
         self.region = region
+        self.state = state or ProvisioningState()
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+        self.vpc_accessor = vpc_accessor or VPCAccessor(region, self.clients, self.cache)
 
         self.password = generate_secure_password()
         self.engine = engine
         self.config = config
 
-        self.client = boto3.client("rds", self.region)
+        self.client = self.clients.client("rds", self.region)
         self.vpc_id = vpc_id
         self.vpc_subnet = ""  # TODO: this
         self.environment_name = environment_name
         self.db_name = f"{self.environment_name}-db"
         self.application_security_group_id = application_security_group_id
+        self.security_group_id = None
+        self.placement = placement
+        self.resetting_password = False
+        self.monitoring_role_created = False
+        # Set when restoring: the source's master username and database name, and the settings the restore could not
+        # take
+        self.master_username = None
+        self.database_name = None
+        self.pending_modifications = None
+        self._config_params = None
+        self._db_subnet_group = None
+        self.storage = None
+        # Set by `cancel_waits` to make waits on the database, its replicas and its proxy give up
+        self.cancel_event = threading.Event()
+        self.proxy = DatabaseProxy(self, config["RDSProxy"]) if config.get("RDSProxy") else None
+        self.restore = DatabaseRestore(self, config['RDS']['Source']) if config['RDS'].get('Source') else None
+        self.replicas = ReadReplicaSet(self, config['RDS']['ReadReplicas']) if config['RDS'].get('ReadReplicas') else None
 
     def create_db_security_group(self):
-        ec2_client = boto3.client('ec2', self.region)
-        security_group_name = f"{self.environment_name}-db"
-        response = ec2_client.create_security_group(
-            GroupName=security_group_name,
-            Description=f"Database security group for {self.environment_name}",
-            VpcId=self.vpc_id,
-            TagSpecifications=[{
-                "ResourceType": "security-group",
-                "Tags": [{"Key": "Name", "Value": security_group_name}]
-            }]
-        )
-        security_group_id = response['GroupId']
-        port = self.get_config_params()["Port"]
-        ec2_client.authorize_security_group_ingress(
-            GroupId=security_group_id,
-            IpPermissions=[
-                {'IpProtocol': 'tcp',
-                 'FromPort': port,
-                 'ToPort': port,
-                 'UserIdGroupPairs': [{'GroupId': self.application_security_group_id}]},
-            ]
-        )
-        return security_group_id
+        resumed = self.state.get("db_security_group")
+        if resumed and self.security_group_exists(resumed["security_group_id"]):
+            self.security_group_id = resumed["security_group_id"]
+            print(f"Reusing database security group {self.security_group_id}")
+        else:
+            ec2_client = self.clients.client('ec2', self.region)
+            security_group_name = f"{self.environment_name}-db"
+            response = ec2_client.create_security_group(
+                GroupName=security_group_name,
+                Description=f"Database security group for {self.environment_name}",
+                VpcId=self.vpc_id,
+                TagSpecifications=[{
+                    "ResourceType": "security-group",
+                    "Tags": [{"Key": "Name", "Value": security_group_name}]
+                }]
+            )
+            self.security_group_id = response['GroupId']
+            self.state.complete("db_security_group", security_group_id=self.security_group_id, vpc_id=self.vpc_id)
+        if self.application_security_group_id:
+            self.authorize_application_access(self.application_security_group_id)
+        return self.security_group_id
+
+    def security_group_exists(self, security_group_id):
+        ec2_client = self.clients.client('ec2', self.region)
+        try:
+            return bool(ec2_client.describe_security_groups(GroupIds=[security_group_id])["SecurityGroups"])
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "InvalidGroup.NotFound":
+                return False
+            raise
+
+    def authorize_application_access(self, application_security_group_id):
+        """Allow the EB environment's security group to reach the database port (and the proxy, if there is one)."""
+        self.application_security_group_id = application_security_group_id
+        self.authorize_ingress(self.security_group_id, application_security_group_id, self.get_config_params()["Port"])
+        if self.proxy:
+            self.proxy.authorize_application_access(application_security_group_id)
+
+    def authorize_ingress(self, security_group_id, source_security_group_id, port):
+        ec2_client = self.clients.client('ec2', self.region)
+        try:
+            ec2_client.authorize_security_group_ingress(
+                GroupId=security_group_id,
+                IpPermissions=[
+                    {'IpProtocol': 'tcp',
+                     'FromPort': port,
+                     'ToPort': port,
+                     'UserIdGroupPairs': [{'GroupId': source_security_group_id}]},
+                ]
+            )
+        except ClientError as e:
+            # The rule is already there when resuming
+            if e.response["Error"]["Code"] != "InvalidPermission.Duplicate":
+                raise
 
     def create_db(self):
-        vpc_security_groups = [self.create_db_security_group()]
-        db_subnet_group = self.get_db_subnet_group()
-        if not db_subnet_group:
-            db_subnet_group = self.create_db_subnet_group()
+        self.start_db()
+        print("Waiting for Database")
+        return self.wait_for_db()
+
+    def start_db(self):
+        """
+        Create the security group, subnet group and database instance (and the proxy, with an `RDSProxy` block) without
+        waiting for the instance to become available.  If the application security group is not known yet, call
+        `authorize_application_access` once it is.
+        """
+        with self.clients.tracer.span("DB create", environment=self.environment_name):
+            self.check_restore_source()
+            vpc_security_groups = [self.create_db_security_group()]
+            db_subnet_group = self.get_db_subnet_group()
+            if not db_subnet_group:
+                db_subnet_group = self.create_db_subnet_group()
+            self.state.complete("db_subnet_group", db_subnet_group_name=db_subnet_group)
+            if not self.resume_db_instance():
+                self.create_db_instance(vpc_security_groups, db_subnet_group)
+        if self.proxy:
+            self.proxy.start()
+
+    def check_restore_source(self):
+        """With an `RDS.Source` block, raise before anything is created if the source cannot be restored."""
+        if self.restore and not self.state.get("db_instance"):
+            self.restore.check_compatibility(self.get_config_params())
+
+    def create_db_instance(self, vpc_security_groups, db_subnet_group):
         try:
             params = dict(
                 DBInstanceIdentifier=self.db_name,
@@ -151,73 +276,375 @@ class DatabaseInitializer(object):
                 DBSubnetGroupName=db_subnet_group,
                 **self.get_config_params(),
             )
-            self.client.create_db_instance(**params)
+            print(f"Database storage: {self.storage.describe()}")
+            params["DBParameterGroupName"] = self.get_parameter_group_name()
+            params.update(self.get_monitoring_params(params))
+            params = {key: value for key, value in params.items() if value is not None}
+            if self.placement and self.placement.db_availability_zone:
+                params["AvailabilityZone"] = self.placement.db_availability_zone
+            if self.restore:
+                self.restore.restore(params)
+                self.master_username = self.restore.get_source()["MasterUsername"]
+                self.pending_modifications = self.restore.get_modify_params(params)
+            else:
+                self.call_with_new_role(self.client.create_db_instance, **params)
         except ParamValidationError:
             print(self.get_config_params())
             raise
-        print("Waiting for Database")
-        host = self.get_host_from_response()
-        return self.get_db_url(params['MasterUsername'], host, params['Port'])
+        self.state.complete(
+            "db_instance", db_instance_identifier=self.db_name, master_username=self.get_master_username()
+        )
+
+    def call_with_new_role(self, function, **params):
+        """Call `function`, retrying while a just-created IAM role is not yet usable by RDS."""
+        if not self.monitoring_role_created:
+            return function(**params)
+
+        def attempt():
+            try:
+                return function(**params)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in ["InvalidParameterValue", "InvalidParameterCombination"]:
+                    raise
+                if "role" not in str(e).lower():
+                    raise
+                return None
+
+        response = poll_until(attempt, ROLE_PROPAGATION_TIMEOUT, ROLE_PROPAGATION_TIMEOUT)
+        if response is None:
+            raise Exception(f"RDS could not use the new role {MONITORING_ROLE_NAME} after {ROLE_PROPAGATION_TIMEOUT} seconds")
+        return response
+
+    def resume_db_instance(self):
+        """
+        Reuse the database instance from a previous run if it still exists.  Its password was never saved, so the
+        master password is reset to this run's password.
+        """
+        resumed = self.state.get("db_instance")
+        if not resumed:
+            return False
+        db_instance = self.describe_db_instance()
+        if not db_instance or db_instance['DBInstanceStatus'] in ['deleting', 'failed']:
+            self.state.discard("db_instance")
+            return False
+        self.master_username = resumed.get("master_username")
+        if self.restore and not self.state.is_complete("db_instance_modified"):
+            # The follow-up modify after the restore never ran; it sets this run's password along with the rest
+            print(f"Reusing restored database {self.db_name}")
+            params = self.get_config_params()
+            self.pending_modifications = self.restore.get_modify_params(
+                dict(params, MasterUserPassword=self.password, **self.get_monitoring_params(params))
+            )
+            return True
+        print(f"Reusing database {self.db_name}; resetting its master password")
+        self.resetting_password = True
+        self.client.modify_db_instance(
+            DBInstanceIdentifier=self.db_name,
+            MasterUserPassword=self.password,
+            ApplyImmediately=True,
+        )
+        return True
+
+    def wait_for_db(self):
+        params = self.get_config_params()
+        with self.clients.tracer.span("DB wait", environment=self.environment_name):
+            if self.pending_modifications:
+                self.apply_pending_modifications()
+            host = self.get_host_from_response()
+        if self.proxy:
+            return self.get_db_url(self.get_master_username(), self.proxy.finish(), self.proxy.port)
+        return self.get_db_url(self.get_master_username(), host, params['Port'])
+
+    def apply_pending_modifications(self):
+        """Once a restored instance is available, give it the password and settings the restore did not accept."""
+        self.wait_for_db_instance(lambda db: db['DBInstanceStatus'] == 'available')
+        print(f"Applying the master password and monitoring settings to {self.db_name}")
+        params = {key: value for key, value in self.pending_modifications.items() if value is not None}
+        self.call_with_new_role(
+            self.client.modify_db_instance, DBInstanceIdentifier=self.db_name, ApplyImmediately=True, **params
+        )
+        self.pending_modifications = None
+        self.resetting_password = True
+        self.state.complete("db_instance_modified")
+
+    def create_read_replicas(self):
+        """With an `RDS.ReadReplicas` block, create the replicas and return their URLs; call after `wait_for_db`."""
+        if not self.replicas:
+            return []
+        params = self.get_config_params()
+        return [
+            self.get_db_url(self.get_master_username(), host, params['Port']) for host in self.replicas.create()
+        ]
+
+    def get_master_username(self):
+        """The configured master username, or the source's when the database was restored."""
+        return self.master_username or self.get_config_params()['MasterUsername']
 
     def get_config_params(self):
+        if self._config_params is None:
+            self._config_params = self.resolve_config_params()
+        return self._config_params
+
+    def resolve_config_params(self):
         config_engine_name = ENGINE_NAME_LOOKUP[self.engine]
         base_params = {
             param: self.config['RDS'][param] for param in BASE_PARAMS
         }
+        base_params.update({
+            param: self.config['RDS'][param] for param in OPTIONAL_PARAMS if param in self.config['RDS']
+        })
         engine_params = {
             param: self.config['RDS'][config_engine_name][param] for param in PARAMS_BY_ENGINE[self.engine]
         }
         engine_version = engine_params.get("EngineVersion")
-        if "*" in engine_version:
+        if "*" in engine_version or engine_version == DEFAULT_ENGINE_VERSION:
             engine_params["EngineVersion"] = self.get_engine_version(engine_version)
-        return {
+        params = {
             **base_params,
             **engine_params,
         }
+        params.update(self.resolve_storage_params(params))
+        return params
+
+    def resolve_storage_params(self, params):
+        """
+        Check the storage settings against the orderable options of the engine version and instance class, and size
+        Iops and StorageThroughput set to "auto" for RDS.StorageWorkload (the ParameterTuning profile by default).
+        """
+        tuning = self.config['RDS'].get('ParameterTuning')
+        workload = self.config['RDS'].get('StorageWorkload') or (
+            tuning.get("Profile", DEFAULT_TUNING_PROFILE) if tuning else DEFAULT_TUNING_PROFILE
+        )
+        orderable_options = DBInstanceClassCatalog(self.region, self.clients, self.cache).get_orderable_options(
+            params["Engine"], params["EngineVersion"], params["DBInstanceClass"]
+        )
+        self.storage = resolve_storage(params, workload, orderable_options)
+        storage_params = {"AllocatedStorage": self.storage.allocated_storage, "Iops": None, "StorageThroughput": None}
+        if self.storage.iops is not None:
+            storage_params["Iops"] = self.storage.iops
+        if self.storage.storage_throughput is not None:
+            storage_params["StorageThroughput"] = self.storage.storage_throughput
+        return storage_params
+
+    def get_parameter_group_name(self, db_instance_class=None):
+        """
+        The configured parameter group, or a custom one when RDS.ParameterTuning or RDS.LogMinDurationStatement is set
+        and the configured group is a default one (which cannot be modified), tuned for `db_instance_class` if it is
+        not the configured one.  A configured custom group is always kept.
+        """
+        params = self.get_config_params()
+        tuning = self.config['RDS'].get('ParameterTuning')
+        log_min_duration_ms = self.config['RDS'].get('LogMinDurationStatement')
+        if not tuning and log_min_duration_ms is None:
+            return params["DBParameterGroupName"]
+        if not params["DBParameterGroupName"].startswith(DEFAULT_PARAMETER_GROUP_PREFIX):
+            print(
+                f"Warning: keeping the configured parameter group {params['DBParameterGroupName']}; ParameterTuning and "
+                f"LogMinDurationStatement are not applied to it"
+            )
+            return params["DBParameterGroupName"]
+        engine_version = self.config['RDS'][ENGINE_NAME_LOOKUP[self.engine]]['EngineVersion']
+        family = self.resolve_engine_version(engine_version)["DBParameterGroupFamily"]
+        return ParameterGroupManager(self.region, self.clients, self.cache).ensure_parameter_group(
+            family,
+            db_instance_class or params["DBInstanceClass"],
+            tuning.get("Profile", DEFAULT_TUNING_PROFILE) if tuning else None,
+            params["StorageType"],
+            log_min_duration_ms,
+        )
+
+    def get_monitoring_params(self, params):
+        """
+        Performance Insights, Enhanced Monitoring and log export settings for `create_db_instance`.  Features the
+        instance class does not support are dropped with a warning, and the Enhanced Monitoring role is created if no
+        MonitoringRoleArn is configured.
+        """
+        catalog = DBInstanceClassCatalog(self.region, self.clients, self.cache)
+        engine_args = (params["Engine"], params["EngineVersion"], params["DBInstanceClass"])
+        monitoring_params = {}
+        if params.get("EnablePerformanceInsights"):
+            if catalog.supports(*engine_args, "SupportsPerformanceInsights"):
+                monitoring_params["EnablePerformanceInsights"] = True
+            else:
+                print(f"Warning: {params['DBInstanceClass']} does not support Performance Insights; leaving it disabled")
+                monitoring_params["EnablePerformanceInsights"] = False
+                monitoring_params["PerformanceInsightsRetentionPeriod"] = None
+                monitoring_params["PerformanceInsightsKMSKeyId"] = None
+        if params["MonitoringInterval"]:
+            if not catalog.supports(*engine_args, "SupportsEnhancedMonitoring"):
+                print(f"Warning: {params['DBInstanceClass']} does not support Enhanced Monitoring; leaving it disabled")
+                monitoring_params["MonitoringInterval"] = 0
+                monitoring_params["MonitoringRoleArn"] = None
+            elif not params.get("MonitoringRoleArn"):
+                monitoring_params["MonitoringRoleArn"] = self.get_monitoring_role_arn()
+        if self.config['RDS'].get('LogMinDurationStatement') is not None:
+            log_exports = list(params.get("EnableCloudwatchLogsExports") or [])
+            if LOG_EXPORT_BY_ENGINE[self.engine] not in log_exports:
+                log_exports.append(LOG_EXPORT_BY_ENGINE[self.engine])
+            monitoring_params["EnableCloudwatchLogsExports"] = log_exports
+        return monitoring_params
+
+    def get_monitoring_role_arn(self):
+        """Find or create the IAM role that lets RDS publish Enhanced Monitoring metrics."""
+        iam_client = self.clients.client("iam", self.region)
+        try:
+            return iam_client.get_role(RoleName=MONITORING_ROLE_NAME)["Role"]["Arn"]
+        except iam_client.exceptions.NoSuchEntityException:
+            pass
+        print(f"Creating Enhanced Monitoring role {MONITORING_ROLE_NAME}")
+        try:
+            role_arn = iam_client.create_role(
+                RoleName=MONITORING_ROLE_NAME,
+                AssumeRolePolicyDocument=json.dumps(MONITORING_ASSUME_ROLE_POLICY),
+                Description="Lets RDS publish Enhanced Monitoring metrics to CloudWatch Logs",
+            )["Role"]["Arn"]
+        except iam_client.exceptions.EntityAlreadyExistsException:
+            # Created concurrently by another environment
+            return iam_client.get_role(RoleName=MONITORING_ROLE_NAME)["Role"]["Arn"]
+        iam_client.attach_role_policy(RoleName=MONITORING_ROLE_NAME, PolicyArn=MONITORING_ROLE_POLICY_ARN)
+        self.monitoring_role_created = True
+        return role_arn
 
     def get_engine_version(self, version_string):
-        ret = self.client.describe_db_engine_versions(Engine="postgres")
-        engine_versions = [i["EngineVersion"] for i in ret["DBEngineVersions"]]
-        engine_versions = fnmatch.filter(engine_versions, version_string)
-        return max(engine_versions)
+        return self.resolve_engine_version(version_string)["EngineVersion"]
+
+    def resolve_engine_version(self, version_string):
+        """
+        Resolve an fnmatch pattern such as "17.*" (or "default") to the newest matching engine version, returned with
+        its parameter group family.
+        """
+        engine_name = self.config['RDS'][ENGINE_NAME_LOOKUP[self.engine]]['Engine']
+        return self.cache.get_or_fetch(
+            self.region,
+            f"rds:describe_db_engine_versions:{engine_name}:{version_string}",
+            ENGINE_VERSIONS_TTL,
+            lambda: self.fetch_engine_version(engine_name, version_string),
+        )
+
+    def fetch_engine_version(self, engine_name, version_string):
+        default_only = version_string == DEFAULT_ENGINE_VERSION
+        params = dict(Engine=engine_name, DefaultOnly=default_only, IncludeAll=False)
+        prefix = "" if default_only else get_static_version_prefix(version_string)
+        best = None
+        if prefix:
+            # Narrow the query server-side to the major version; fall back to the full list if that finds nothing
+            best = self.find_best_engine_version(dict(params, EngineVersion=prefix), version_string, default_only)
+        if best is None:
+            best = self.find_best_engine_version(params, version_string, default_only)
+        if best is None:
+            raise Exception(f"No {engine_name} engine versions match `{version_string}`")
+        return {
+            "EngineVersion": best["EngineVersion"],
+            "DBParameterGroupFamily": best.get("DBParameterGroupFamily"),
+        }
+
+    def find_best_engine_version(self, params, version_string, default_only):
+        best = None
+        for page in self.client.get_paginator("describe_db_engine_versions").paginate(**params):
+            for engine_version in page["DBEngineVersions"]:
+                if default_only:
+                    return engine_version
+                if not fnmatch.fnmatch(engine_version["EngineVersion"], version_string):
+                    continue
+                if best is None or version_sort_key(engine_version["EngineVersion"]) > version_sort_key(best["EngineVersion"]):
+                    best = engine_version
+        return best
 
     def get_db_url(self, user, host, port):
-        postgres_db_name = self.config["RDS"]["Postgres"]["DBName"]
+        postgres_db_name = self.database_name or self.config["RDS"]["Postgres"]["DBName"]
         if self.engine == Engine.postgres:
             return f"postgres://{user}:{self.password}@{host}:{port}/{postgres_db_name}?sslmode=require"
         else:
             return ""
 
     def get_host_from_response(self):
-        host = None
-        for _ in range(100):
-            response = self.client.describe_db_instances()
-            for db in response['DBInstances']:
-                if db['DBInstanceIdentifier'] == self.db_name:
-                    host = db.get('Endpoint', {}).get('Address')
-            if host:
-                return host
-            time.sleep(10)
-        raise Exception(f"Database not ready after 15 minutes")
+        if self.resetting_password:
+            # The endpoint already exists; wait for the new password to be applied
+            db_instance = self.wait_for_db_instance(lambda db: db['DBInstanceStatus'] == 'available')
+        else:
+            db_instance = self.wait_for_db_instance(lambda db: db.get('Endpoint', {}).get('Address'))
+        if self.restore:
+            # Postgres restores keep the source's database and ignore DBName
+            self.database_name = db_instance.get('DBName') or POSTGRES_DEFAULT_DB_NAME
+        return db_instance['Endpoint']['Address']
 
-    def get_db_subnet_group(self):
-        response = self.client.describe_db_subnet_groups()
-        if 'DBSubnetGroups' in response:
+    def describe_db_instance(self, db_instance_identifier=None):
+        try:
+            return self.client.describe_db_instances(
+                DBInstanceIdentifier=db_instance_identifier or self.db_name
+            )['DBInstances'][0]
+        except self.client.exceptions.DBInstanceNotFoundFault:
+            return None
+
+    def wait_for_db_instance(self, is_ready, expected_duration=DB_EXPECTED_CREATE_SECONDS, db_instance_identifier=None):
+        """
+        Poll this database (or one of its replicas) only, printing status transitions, until `is_ready(db_instance)` is
+        truthy.
+        """
+        db_instance_identifier = db_instance_identifier or self.db_name
+        timeout = self.config['RDS'].get('WaitTimeout', DEFAULT_DB_WAIT_TIMEOUT)
+        start = time.monotonic()
+        last_status = None
+
+        def check():
+            nonlocal last_status
+            db_instance = self.describe_db_instance(db_instance_identifier)
+            status = db_instance['DBInstanceStatus'] if db_instance else None
+            if status != last_status:
+                print(f"[{int(time.monotonic() - start)}s] Database {db_instance_identifier} status: {status}")
+                last_status = status
+            if status in FAILED_DB_STATUSES:
+                raise Exception(f"Database {db_instance_identifier} entered status {status}")
+            if db_instance and is_ready(db_instance):
+                return db_instance
+            return None
+
+        db_instance = poll_until(check, timeout, expected_duration, cancel=self.cancel_event)
+        if db_instance is None:
+            if self.cancel_event.is_set():
+                raise Exception(f"Stopped waiting for database {db_instance_identifier}")
+            raise Exception(f"Database not ready after {timeout} seconds")
+        return db_instance
+
+    def cancel_waits(self):
+        """Make any wait on the database, its replicas or its proxy, in whichever thread, give up at its next poll."""
+        self.cancel_event.set()
+
+    def find_db_subnet_group(self):
+        """The VPC's first existing DB subnet group, which the database is created in, or None."""
+        if self._db_subnet_group is None:
+            response = self.client.describe_db_subnet_groups()
             vpc_subnet_groups = [
-                subnet_group['DBSubnetGroupName'] for subnet_group in response['DBSubnetGroups']
+                subnet_group for subnet_group in response.get('DBSubnetGroups', [])
                 if subnet_group['VpcId'] == self.vpc_id
             ]
-            if vpc_subnet_groups:
-                return vpc_subnet_groups[0]
-        return None
+            self._db_subnet_group = vpc_subnet_groups[0] if vpc_subnet_groups else False
+        return self._db_subnet_group or None
+
+    def get_db_subnet_group(self):
+        subnet_group = self.find_db_subnet_group()
+        return subnet_group['DBSubnetGroupName'] if subnet_group else None
+
+    def get_db_subnet_group_zones(self):
+        """
+        The availability zones of the subnet group the database goes in: the existing one `get_db_subnet_group`
+        finds, or else the VPC's public subnets, which `create_db_subnet_group` uses.
+        """
+        subnet_group = self.find_db_subnet_group()
+        if subnet_group:
+            return sorted({subnet['SubnetAvailabilityZone']['Name'] for subnet in subnet_group['Subnets']})
+        return sorted(set(self.vpc_accessor.get_subnets(self.vpc_id).values()))
     
     def create_db_subnet_group(self):
-        vpc = VPCAccessor(self.region)
-        subnet_ids = list(vpc.get_subnets(self.vpc_id))
+        subnet_ids = list(self.vpc_accessor.get_subnets(self.vpc_id))
         subnet_group_name = f"default-{self.vpc_id}"
-        self.client.create_db_subnet_group(
-            DBSubnetGroupName=subnet_group_name,
-            DBSubnetGroupDescription=f"All subnets for {self.vpc_id}",
-            SubnetIds=subnet_ids,
-        )
+        try:
+            self.client.create_db_subnet_group(
+                DBSubnetGroupName=subnet_group_name,
+                DBSubnetGroupDescription=f"All subnets for {self.vpc_id}",
+                SubnetIds=subnet_ids,
+            )
+        except self.client.exceptions.DBSubnetGroupAlreadyExistsFault:
+            # Another environment in the same VPC created it concurrently
+            pass
         return subnet_group_name
@@ -1,8 +1,44 @@
-import boto3
 import fnmatch
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from choicesenum import ChoicesEnum
+from eb_create_environment.cache import DiskCache, SOLUTION_STACKS_TTL
+from eb_create_environment.clients import ClientPool
+from eb_create_environment.instance_types import AUTO, InstanceTypeCatalog, get_worker_counts
+from eb_create_environment.placement import PlacementPlanner
+from eb_create_environment.scaling import get_scaling_options
+from eb_create_environment.state import ProvisioningState
+from eb_create_environment.utils import poll_until
 from eb_create_environment.vpc import VPCAccessor
-from botocore.exceptions import ParamValidationError
+from botocore.exceptions import ClientError, ParamValidationError
+
+
+DEFAULT_EB_WAIT_TIMEOUT = 1800
+EB_EXPECTED_CREATE_SECONDS = 300
+FAILED_ENVIRONMENT_STATUSES = ["Terminating", "Terminated"]
+FAILED_EVENT_SEVERITIES = ["FATAL"]
+FAILED_EVENT_MESSAGES = ["Failed to launch environment"]
+# Events that mean the instances' launch template or configuration (and so their security group) now exists
+LAUNCH_RESOURCE_EVENT_MESSAGES = ["launch template", "launch configuration"]
+ENVIRONMENT_VARIABLES_NAMESPACE = "aws:elasticbeanstalk:application:environment"
+# Options fixed at creation (or, like the health check, expected to be changed by hand afterwards); updates leave
+# them alone
+CREATION_ONLY_OPTIONS = [
+    ("aws:ec2:vpc", "VPCId"),
+    ("aws:ec2:vpc", "Subnets"),
+    ("aws:ec2:vpc", "ELBSubnets"),
+    ("aws:ec2:vpc", "ELBScheme"),
+    ("aws:elasticbeanstalk:environment", "EnvironmentType"),
+    ("aws:elasticbeanstalk:environment", "LoadBalancerType"),
+    ("aws:elb:healthcheck", "Target"),
+]
+# Comma separated options whose order does not matter when comparing
+UNORDERED_LIST_OPTIONS = [
+    ("aws:ec2:instances", "InstanceTypes"),
+]
+# Allowance for the local clock running ahead of AWS when choosing where the event stream starts
+EVENT_CLOCK_SKEW = timedelta(seconds=60)
 
 
 class ServerTier(ChoicesEnum):
@@ -10,20 +46,71 @@ class ServerTier(ChoicesEnum):
     worker = "worker"
 
 
+class EnvironmentEventStream(object):
+    """
+    Incrementally reads an environment's events.  Each poll asks only for events at or after the newest one already
+    seen, so its cost does not grow with the length of the launch.
+    """
+    def __init__(self, eb_client, application_name, environment_name, since):
+        self.eb_client = eb_client
+        self.application_name = application_name
+        self.environment_name = environment_name
+        self.cursor = since - EVENT_CLOCK_SKEW
+        # StartTime is inclusive, so remember the events already returned at the cursor's timestamp
+        self.seen_at_cursor = set()
+    
+    def poll(self):
+        """Return the events that have not been returned yet, oldest first."""
+        paginator = self.eb_client.get_paginator("describe_events")
+        events = [
+            event
+            for page in paginator.paginate(
+                ApplicationName=self.application_name,
+                EnvironmentName=self.environment_name,
+                StartTime=self.cursor,
+            )
+            for event in page["Events"]
+        ]
+        events.sort(key=lambda event: event["EventDate"])
+        new_events = [
+            event for event in events
+            if event["EventDate"] > self.cursor or (event["Message"] not in self.seen_at_cursor)
+        ]
+        if events:
+            newest = events[-1]["EventDate"]
+            if newest > self.cursor:
+                self.cursor = newest
+                self.seen_at_cursor = set()
+            self.seen_at_cursor.update(event["Message"] for event in events if event["EventDate"] == newest)
+        return new_events
+
+
 class EBInitializer(object):
     
-    def __init__(self, region, config, application_name, environment_name, cname_prefix, vpc_id, server_tier=ServerTier.web):
+    def __init__(self, region, config, application_name, environment_name, cname_prefix, vpc_id, server_tier=ServerTier.web, vpc_accessor=None,
+                 clients=None, cache=None, state=None, placement=None):
         self.region = region
         self.config = config
+        self.state = state or ProvisioningState()
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+        self.vpc_accessor = vpc_accessor or VPCAccessor(self.region, self.clients, self.cache)
         
         self.application_name = application_name
         self.environment_name = environment_name
         self.cname_prefix = cname_prefix
         self.vpc_id = vpc_id
         self.server_tier = server_tier
+        self.placement = placement
+        self.launch_time = None
+        # Set when the environment is launched with a security group created beforehand (see
+        # `create_application_security_group`)
+        self.application_security_group_id = None
+        # Set by `cancel_waits` to make the wait for the environment give up
+        self.cancel_event = threading.Event()
     
     def get_eb_client(self):
-        return boto3.client("elasticbeanstalk", self.region)
+        return self.clients.client("elasticbeanstalk", self.region)
     
     def get_config_param(self, param_name, subname=None):
         try:
@@ -33,54 +120,79 @@ class EBInitializer(object):
         except KeyError:
             return None
     
-    def set_up_environment(self):
-        if self.server_tier == ServerTier.web:
-            tier_config = {
-                "Name": "WebServer",
-                "Type": "Standard",
-            }
-        elif self.server_tier == ServerTier.worker:
-            tier_config = {
-                "Name": "Worker",
-                "Type": "SQS/HTTP",
-            }
-        else:
-            raise Exception(f"invalid server tier: {self.server_tier}")
-        
-        vpc_accessor = VPCAccessor(self.region)
-        instance_subnets = vpc_accessor.get_subnets(self.vpc_id, self.get_config_param("InstancePublicSubnets"), instance_type=self.get_config_param("InstanceTypes"))
-        if not instance_subnets:
-            raise Exception("No valid subnets for instances")
-        print(f"Using the following subnets for instances: {instance_subnets}")
-        
-        if self.get_config_param("LoadBalancer"):
-            load_balancer_subnets = vpc_accessor.get_subnets(self.vpc_id, self.get_config_param("LoadBalancer", "PublicSubnets"))
-            if not load_balancer_subnets:
-                raise Exception("No valid subnets for the load balancer")
-            print(f"Using the following subnets for the load balancer: {load_balancer_subnets}")
-        
-        eb_client = self.get_eb_client()
-        
+    def get_solution_stacks(self):
+        return self.cache.get_or_fetch(
+            self.region,
+            "elasticbeanstalk:list_available_solution_stacks",
+            SOLUTION_STACKS_TTL,
+            lambda: self.get_eb_client().list_available_solution_stacks()["SolutionStacks"],
+        )
+    
+    def get_worker_counts(self):
+        """NumProcesses and NumThreads as configured, sizing any set to `auto` from the instance type."""
+        num_processes = self.get_config_param("NumProcesses")
+        num_threads = self.get_config_param("NumThreads")
+        if AUTO not in (str(num_processes).lower(), str(num_threads).lower()):
+            return num_processes, num_threads
+        instance_type = self.get_config_param("InstanceTypes")
+        instance_type_info = InstanceTypeCatalog(self.region, self.clients, self.cache).get_instance_type(instance_type)
+        processes, threads = get_worker_counts(instance_type_info, self.get_config_param("WorkerSizing"))
+        if str(num_processes).lower() == AUTO:
+            num_processes = processes
+        if str(num_threads).lower() == AUTO:
+            num_threads = threads
+        print(
+            f"Using {num_processes} processes with {num_threads} threads each for {instance_type} "
+            f"({instance_type_info['VCpus']} vCPUs, {instance_type_info['MemoryMiB']} MiB)"
+        )
+        return num_processes, num_threads
+    
+    def get_scaling_options(self):
+        instance_type = self.get_config_param("InstanceTypes")
+        return get_scaling_options(
+            self.get_config_param("Scaling"),
+            instance_type,
+            InstanceTypeCatalog(self.region, self.clients, self.cache).get_instance_type(instance_type),
+            self.get_config_param("LoadBalancer", "MinSize"),
+            self.get_config_param("LoadBalancer", "MaxSize"),
+        )
+    
+    def get_solution_stack_name(self):
         solution_stack_name = self.get_config_param("SolutionStackName")
         if "*" in solution_stack_name:
-            resp = eb_client.list_available_solution_stacks()
-            available_stacks = fnmatch.filter(resp["SolutionStacks"], solution_stack_name)
+            with self.clients.tracer.span("solution stack lookup", environment=self.environment_name):
+                available_stacks = fnmatch.filter(self.get_solution_stacks(), solution_stack_name)
             if not available_stacks:
                 raise Exception(f"No solution stacks match the provided pattern `{solution_stack_name}`")
             # Take the newest; according to Boto3 docks, solution stacks are listed with newest first
             solution_stack_name = available_stacks[0]
             print(f"Using solution stack: {solution_stack_name}")
-        
+        return solution_stack_name
+    
+    def build_option_settings(self, placement=None):
+        """
+        Render the config as EB option settings {(namespace, option_name): value}.  Without a placement plan the
+        subnet options are left out.
+        """
+        num_processes, num_threads = self.get_worker_counts()
         options = {
-            ("aws:elasticbeanstalk:container:python", "NumProcesses"): str(self.get_config_param("NumProcesses")),
+            ("aws:elasticbeanstalk:container:python", "NumProcesses"): str(num_processes),
             ("aws:ec2:instances", "InstanceTypes"): self.get_config_param("InstanceTypes"),
             ("aws:autoscaling:launchconfiguration", "IamInstanceProfile"): self.get_config_param("IamInstanceProfile"),
             ("aws:elasticbeanstalk:environment:proxy", "ProxyServer"): self.get_config_param("ProxyServer"),
             ("aws:ec2:vpc", "VPCId"): self.vpc_id,
-            ("aws:ec2:vpc", "ELBSubnets"): ",".join(load_balancer_subnets),
-            ("aws:ec2:vpc", "Subnets"): ",".join(instance_subnets),
             ("aws:ec2:vpc", "AssociatePublicIpAddress"): "true" if self.get_config_param("AssociatePublicIpAddress") else "false",
         }
+        if placement is not None:
+            options[("aws:ec2:vpc", "ELBSubnets")] = ",".join(placement.load_balancer_subnets or {})
+            options[("aws:ec2:vpc", "Subnets")] = ",".join(placement.instance_subnets)
+        
+        if num_threads is not None:
+            options[("aws:elasticbeanstalk:container:python", "NumThreads")] = str(num_threads)
+        
+        if self.application_security_group_id:
+            # Added to the security group EB creates for the instances
+            options[("aws:autoscaling:launchconfiguration", "SecurityGroups")] = self.application_security_group_id
         
         if self.get_config_param("LoadBalancer"):
             options[("aws:elasticbeanstalk:environment", "EnvironmentType")] = "LoadBalanced"
@@ -91,8 +203,12 @@ class EBInitializer(object):
             options[("aws:ec2:vpc", "ELBScheme")] = self.get_config_param("LoadBalancer", "ELBScheme")
             # Health check should get modified after initial deploy
             options[("aws:elb:healthcheck", "Target")] = "/"
+            if self.get_config_param("Scaling"):
+                options.update(self.get_scaling_options())
         else:
             options[("aws:elasticbeanstalk:environment", "EnvironmentType")] = "SingleInstance"
+            if self.get_config_param("Scaling"):
+                print("Ignoring the Scaling block: single-instance environments do not scale")
         
         if self.get_config_param("ManagedUpdates"):
             options[("aws:elasticbeanstalk:managedactions", "ManagedActionsEnabled")] = "true"
@@ -106,51 +222,279 @@ class EBInitializer(object):
             options[("aws:elb:loadbalancer", "LoadBalancerHTTPSPort")] = "443"
             options[("aws:elb:loadbalancer", "SSLCertificateId")] = self.get_config_param("LoadBalancer", "SSLCertificateId")
         
+        for variable, value in (self.get_config_param("EnvironmentVariables") or {}).items():
+            options[(ENVIRONMENT_VARIABLES_NAMESPACE, variable)] = str(value)
+        return options
+    
+    def get_resumable_environment_id(self):
+        """The environment created by a previous run, if it was recorded and has not been terminated."""
+        resumed = self.state.get("eb_environment")
+        if not resumed:
+            return None
+        environments = self.get_eb_client().describe_environments(
+            ApplicationName=self.application_name,
+            EnvironmentIds=[resumed["environment_id"]],
+            IncludeDeleted=False,
+        )["Environments"]
+        if not environments or environments[0]["Status"] in ["Terminating", "Terminated"]:
+            self.state.discard("eb_environment")
+            return None
+        return resumed["environment_id"]
+    
+    def create_application_security_group(self):
+        """
+        Create (or, when resuming, reuse) a security group for the instances before the environment exists, so that
+        the database can admit it ahead of launch.
+        """
+        ec2_client = self.clients.client("ec2", self.region)
+        resumed = self.state.get("app_security_group")
+        if resumed:
+            try:
+                if ec2_client.describe_security_groups(GroupIds=[resumed["security_group_id"]])["SecurityGroups"]:
+                    self.application_security_group_id = resumed["security_group_id"]
+                    return self.application_security_group_id
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "InvalidGroup.NotFound":
+                    raise
+        security_group_name = f"{self.environment_name}-app"
+        self.application_security_group_id = ec2_client.create_security_group(
+            GroupName=security_group_name,
+            Description=f"Application security group for {self.environment_name}",
+            VpcId=self.vpc_id,
+            TagSpecifications=[{
+                "ResourceType": "security-group",
+                "Tags": [{"Key": "Name", "Value": security_group_name}]
+            }]
+        )["GroupId"]
+        self.state.complete(
+            "app_security_group", security_group_id=self.application_security_group_id, vpc_id=self.vpc_id
+        )
+        return self.application_security_group_id
+    
+    def set_up_environment(self, environment_variables=None):
+        """
+        Launch the environment, with `environment_variables` set from the start.  Returns False if an environment from
+        a previous run was reused instead (and `environment_variables` not applied).
+        """
+        environment_id = self.get_resumable_environment_id()
+        if environment_id:
+            print(f"Reusing EB environment {self.environment_name} ({environment_id})")
+            return False
+        
+        if self.server_tier == ServerTier.web:
+            tier_config = {
+                "Name": "WebServer",
+                "Type": "Standard",
+            }
+        elif self.server_tier == ServerTier.worker:
+            tier_config = {
+                "Name": "Worker",
+                "Type": "SQS/HTTP",
+            }
+        else:
+            raise Exception(f"invalid server tier: {self.server_tier}")
+        
+        tracer = self.clients.tracer
+        placement = self.placement
+        if placement is None:
+            with tracer.span("VPC discovery", environment=self.environment_name):
+                planner = PlacementPlanner(self.region, self.vpc_accessor, self.clients, self.cache)
+                placement = planner.plan(self.vpc_id, self.config["ElasticBeanstalk"])
+            placement.print_layout()
+        
+        eb_client = self.get_eb_client()
+        solution_stack_name = self.get_solution_stack_name()
+        options = self.build_option_settings(placement)
+        for variable, value in (environment_variables or {}).items():
+            options[(ENVIRONMENT_VARIABLES_NAMESPACE, variable)] = value
+        
         # Note that we don't pass VersionLabel to intentionally deploy the sample app
         option_settings = [{"Namespace": key[0], "OptionName": key[1], "Value": value} for key, value in options.items()]
+        self.launch_time = datetime.now(timezone.utc)
         try:
-            eb_client.create_environment(
-                ApplicationName=self.application_name,
-                EnvironmentName=self.environment_name,
-                CNAMEPrefix=self.cname_prefix,
-                Tier=tier_config,
-                SolutionStackName=solution_stack_name,
-                OptionSettings=option_settings,
-            )
+            with tracer.span("EB create", environment=self.environment_name):
+                response = eb_client.create_environment(
+                    ApplicationName=self.application_name,
+                    EnvironmentName=self.environment_name,
+                    CNAMEPrefix=self.cname_prefix,
+                    Tier=tier_config,
+                    SolutionStackName=solution_stack_name,
+                    OptionSettings=option_settings,
+                )
         except ParamValidationError:
             for i, setting in enumerate(option_settings):
+                if setting["Namespace"] == ENVIRONMENT_VARIABLES_NAMESPACE:
+                    # Environment variables may hold credentials, DATABASE_URL among them
+                    setting = dict(setting, Value="<hidden>")
                 print(i, setting)
             raise
+        self.state.complete("eb_environment", environment_id=response["EnvironmentId"])
+        return True
     
-    def wait_for_environment(self):
-        eb_client = self.get_eb_client()
-        waiter = eb_client.get_waiter('environment_exists')
-        waiter.wait(
+    def describe_environment(self):
+        environments = self.get_eb_client().describe_environments(
             ApplicationName=self.application_name,
             EnvironmentNames=[self.environment_name],
             IncludeDeleted=False,
-            WaiterConfig={
-                'Delay': 10,
-                'MaxAttempts': 100
-            }
+        )["Environments"]
+        return environments[0] if environments else None
+    
+    def get_security_group_id(self):
+        """The instances' security group, read from the environment's launch template or launch configuration."""
+        resources = self.get_eb_client().describe_environment_resources(
+            EnvironmentName=self.environment_name
+        )["EnvironmentResources"]
+        if resources.get("LaunchTemplates"):
+            ec2_client = self.clients.client("ec2", self.region)
+            launch_template_versions = ec2_client.describe_launch_template_versions(
+                LaunchTemplateId=resources["LaunchTemplates"][0]["Id"],
+                Versions=["$Latest"],
+            )["LaunchTemplateVersions"]
+            template_data = launch_template_versions[0]["LaunchTemplateData"]
+            security_group_ids = template_data.get("SecurityGroupIds") or [
+                group_id
+                for network_interface in template_data.get("NetworkInterfaces", [])
+                for group_id in network_interface.get("Groups", [])
+            ]
+            return security_group_ids[0] if security_group_ids else None
+        if resources.get("LaunchConfigurations"):
+            autoscaling_client = self.clients.client("autoscaling", self.region)
+            launch_configurations = autoscaling_client.describe_launch_configurations(
+                LaunchConfigurationNames=[resources["LaunchConfigurations"][0]["Name"]]
+            )["LaunchConfigurations"]
+            return launch_configurations[0]["SecurityGroups"][0] if launch_configurations else None
+        return None
+    
+    def wait_for_environment(self, on_security_group=None):
+        """
+        Print the environment's events as they arrive until it is ready, failing as soon as a fatal event or a
+        terminating status shows up.  Returns the instances' security group, which is also passed to
+        `on_security_group` as soon as it is known, before the environment finishes launching.
+        """
+        timeout = self.get_config_param("WaitTimeout") or DEFAULT_EB_WAIT_TIMEOUT
+        start = time.monotonic()
+        event_stream = EnvironmentEventStream(
+            self.get_eb_client(), self.application_name, self.environment_name,
+            self.launch_time or datetime.now(timezone.utc),
         )
-        env_resources = eb_client.describe_environment_resources(EnvironmentName=self.environment_name)
-        launch_configuration_name = env_resources["EnvironmentResources"]["LaunchConfigurations"][0]["Name"]
-        autoscaling_client = boto3.client("autoscaling", self.region)
-        launch_configurations = autoscaling_client.describe_launch_configurations(LaunchConfigurationNames=[launch_configuration_name])
-        return launch_configurations["LaunchConfigurations"][0]["SecurityGroups"][0]
+        security_group_id = None
+        launch_resources_created = False
+        last_status = None
+        
+        def check():
+            nonlocal security_group_id, launch_resources_created, last_status
+            for event in event_stream.poll():
+                print(f"[{int(time.monotonic() - start)}s] {self.environment_name} {event['Severity']}: {event['Message']}")
+                if event["Severity"] in FAILED_EVENT_SEVERITIES or any(
+                    message in event["Message"] for message in FAILED_EVENT_MESSAGES
+                ):
+                    raise Exception(f"EB environment {self.environment_name} failed: {event['Message']}")
+                if any(message in event["Message"].lower() for message in LAUNCH_RESOURCE_EVENT_MESSAGES):
+                    launch_resources_created = True
+            environment = self.describe_environment()
+            if environment is None:
+                raise Exception(f"EB environment {self.environment_name} does not exist")
+            status = environment["Status"]
+            if status != last_status:
+                print(f"[{int(time.monotonic() - start)}s] EB environment {self.environment_name} status: {status}")
+                last_status = status
+            if status in FAILED_ENVIRONMENT_STATUSES:
+                raise Exception(f"EB environment {self.environment_name} entered status {status}")
+            if security_group_id is None and (launch_resources_created or status == "Ready"):
+                security_group_id = self.get_security_group_id()
+                if security_group_id and on_security_group:
+                    on_security_group(security_group_id)
+            if status == "Ready":
+                if security_group_id is None:
+                    raise Exception(f"Could not find the security group of EB environment {self.environment_name}")
+                return security_group_id
+            return None
+        
+        with self.clients.tracer.span("EB wait", environment=self.environment_name):
+            security_group_id = poll_until(check, timeout, EB_EXPECTED_CREATE_SECONDS, cancel=self.cancel_event)
+        if security_group_id is None:
+            if self.cancel_event.is_set():
+                raise Exception(f"Stopped waiting for EB environment {self.environment_name}")
+            raise Exception(f"EB environment not ready after {timeout} seconds")
+        return security_group_id
 
+    def cancel_waits(self):
+        """Make a wait for the environment, in whichever thread, give up at its next poll."""
+        self.cancel_event.set()
+
+    def update_configuration(self):
+        """Bring an existing environment in line with the config, in at most one `update_environment` call."""
+        with self.clients.tracer.span("EB update", environment=self.environment_name):
+            return self.apply_option_settings(self.build_option_settings())
+    
     def update_environment_variables(self, environment_variable_mapping):
-        option_settings = [
-            {
-                "Namespace": "aws:elasticbeanstalk:application:environment",
-                "OptionName": variable,
-                "Value": value,
-            }
+        options = {
+            (ENVIRONMENT_VARIABLES_NAMESPACE, variable): value
             for variable, value in environment_variable_mapping.items()
-        ]
+        }
+        with self.clients.tracer.span("env var update", environment=self.environment_name):
+            return self.apply_option_settings(options)
+    
+    def get_current_option_settings(self):
+        configuration_settings = self.get_eb_client().describe_configuration_settings(
+            ApplicationName=self.application_name,
+            EnvironmentName=self.environment_name,
+        )["ConfigurationSettings"]
+        return {
+            (setting["Namespace"], setting["OptionName"]): setting.get("Value")
+            for setting in configuration_settings[0]["OptionSettings"]
+        }
+    
+    def get_environment_subnets(self):
+        """{subnet_id: availability_zone} of the existing environment's instance subnets in the VPC."""
+        subnet_ids = self.get_current_option_settings().get(("aws:ec2:vpc", "Subnets")) or ""
+        availability_zones = self.vpc_accessor.get_topology(self.vpc_id).availability_zones
+        return {
+            subnet_id: availability_zones[subnet_id]
+            for subnet_id in (subnet_id.strip() for subnet_id in subnet_ids.split(","))
+            if subnet_id in availability_zones
+        }
+    
+    def get_option_changes(self, options, current_options):
+        """
+        The subset of `options` that differs from the environment's current settings.  Creation-only options and
+        options the environment does not report (such as classic load balancer settings on an application load balancer)
+        are left out; environment variables are always compared.
+        """
+        def normalize(key, value):
+            if value is not None and key in UNORDERED_LIST_OPTIONS:
+                return sorted(item.strip() for item in value.split(","))
+            return None if value is None else str(value)
+        
+        changes = {}
+        for key, value in options.items():
+            if value is None or key in CREATION_ONLY_OPTIONS:
+                continue
+            if key not in current_options and key[0] != ENVIRONMENT_VARIABLES_NAMESPACE:
+                continue
+            if normalize(key, current_options.get(key)) != normalize(key, value):
+                changes[key] = value
+        return changes
+    
+    def apply_option_settings(self, options):
+        """Send only the changed `options` in a single update, or nothing at all if none changed."""
+        current_options = self.get_current_option_settings()
+        changes = self.get_option_changes(options, current_options)
+        if not changes:
+            print(f"No configuration changes for {self.environment_name}; skipping update")
+            return None
+        print(f"Updating {len(changes)} option(s) on {self.environment_name}:")
+        for (namespace, option_name), value in changes.items():
+            if namespace == ENVIRONMENT_VARIABLES_NAMESPACE:
+                # Environment variables may hold credentials
+                print(f"  {namespace}:{option_name}: {'changed' if (namespace, option_name) in current_options else 'added'}")
+            else:
+                print(f"  {namespace}:{option_name}: {current_options.get((namespace, option_name))} -> {value}")
         return self.get_eb_client().update_environment(
             ApplicationName=self.application_name,
             EnvironmentName=self.environment_name,
-            OptionSettings=option_settings
+            OptionSettings=[
+                {"Namespace": namespace, "OptionName": option_name, "Value": value}
+                for (namespace, option_name), value in changes.items()
+            ],
         )
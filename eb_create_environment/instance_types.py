@@ -0,0 +1,117 @@
+from eb_create_environment.cache import DiskCache, INSTANCE_TYPES_TTL, ORDERABLE_DB_INSTANCE_OPTIONS_TTL
+from eb_create_environment.clients import ClientPool
+
+
+AUTO = "auto"
+
+# Defaults for the ElasticBeanstalk.WorkerSizing block
+DEFAULT_PROCESSES_PER_VCPU = 1
+DEFAULT_MEMORY_PER_PROCESS_MIB = 512
+DEFAULT_THREADS_PER_VCPU = 4
+
+
+class InstanceTypeCatalog(object):
+    """Cached vCPU, memory and burstable performance figures for EC2 instance types."""
+    def __init__(self, region, clients=None, cache=None):
+        self.region = region
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+
+    def get_instance_type(self, instance_type):
+        """Return {"VCpus": ..., "MemoryMiB": ..., "BurstablePerformance": ...} for `instance_type`."""
+        return self.cache.get_or_fetch(
+            self.region,
+            f"ec2:describe_instance_types:{instance_type}",
+            INSTANCE_TYPES_TTL,
+            lambda: self.fetch_instance_type(instance_type),
+        )
+
+    def fetch_instance_type(self, instance_type):
+        ec2_client = self.clients.client("ec2", self.region)
+        instance_types = ec2_client.describe_instance_types(InstanceTypes=[instance_type])["InstanceTypes"]
+        if not instance_types:
+            raise Exception(f"Unknown instance type {instance_type}")
+        return {
+            "VCpus": instance_types[0]["VCpuInfo"]["DefaultVCpus"],
+            "MemoryMiB": instance_types[0]["MemoryInfo"]["SizeInMiB"],
+            "BurstablePerformance": instance_types[0].get("BurstablePerformanceSupported", False),
+        }
+
+
+def get_worker_counts(instance_type_info, sizing=None):
+    """
+    Derive (processes, threads per process) for the EB Python container from an instance type's vCPUs and memory.
+    Processes scale with vCPUs but are capped so that each has at least `MemoryPerProcessMiB`; threads are spread so
+    that each instance runs about `ThreadsPerVCPU` threads per vCPU.
+    """
+    sizing = sizing or {}
+    vcpus = instance_type_info["VCpus"]
+    memory_mib = instance_type_info["MemoryMiB"]
+    processes_per_vcpu = sizing.get("ProcessesPerVCPU", DEFAULT_PROCESSES_PER_VCPU)
+    memory_per_process_mib = sizing.get("MemoryPerProcessMiB", DEFAULT_MEMORY_PER_PROCESS_MIB)
+    threads_per_vcpu = sizing.get("ThreadsPerVCPU", DEFAULT_THREADS_PER_VCPU)
+    processes = max(1, min(int(vcpus * processes_per_vcpu), memory_mib // memory_per_process_mib))
+    threads = max(1, round(vcpus * threads_per_vcpu / processes))
+    return processes, threads
+
+
+# Fields kept from each describe_orderable_db_instance_options record
+ORDERABLE_OPTION_FIELDS = [
+    "StorageType",
+    "SupportsPerformanceInsights",
+    "SupportsEnhancedMonitoring",
+    "SupportsIops",
+    "SupportsStorageThroughput",
+    "MinStorageSize",
+    "MaxStorageSize",
+    "MinIopsPerDbInstance",
+    "MaxIopsPerDbInstance",
+    "MinIopsPerGib",
+    "MaxIopsPerGib",
+    "MinStorageThroughputPerDbInstance",
+    "MaxStorageThroughputPerDbInstance",
+    "MinStorageThroughputPerIops",
+    "MaxStorageThroughputPerIops",
+]
+
+
+class DBInstanceClassCatalog(object):
+    """Cached orderable options (zones, storage limits, monitoring support) for an engine version and DB class."""
+    def __init__(self, region, clients=None, cache=None):
+        self.region = region
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+
+    def get_orderable_options(self, engine, engine_version, db_instance_class):
+        """
+        Return one entry per distinct orderable option, each with the ORDERABLE_OPTION_FIELDS it reports and the names
+        of its `AvailabilityZones`.
+        """
+        return self.cache.get_or_fetch(
+            self.region,
+            f"rds:describe_orderable_db_instance_options:{engine}:{engine_version}:{db_instance_class}",
+            ORDERABLE_DB_INSTANCE_OPTIONS_TTL,
+            lambda: self.fetch_orderable_options(engine, engine_version, db_instance_class),
+        )
+
+    def fetch_orderable_options(self, engine, engine_version, db_instance_class):
+        paginator = self.clients.client("rds", self.region).get_paginator("describe_orderable_db_instance_options")
+        pages = paginator.paginate(
+            Engine=engine, EngineVersion=engine_version, DBInstanceClass=db_instance_class, Vpc=True,
+        )
+        options = []
+        for page in pages:
+            for orderable_option in page["OrderableDBInstanceOptions"]:
+                option = {field: orderable_option[field] for field in ORDERABLE_OPTION_FIELDS if field in orderable_option}
+                option["AvailabilityZones"] = sorted(
+                    availability_zone["Name"] for availability_zone in orderable_option.get("AvailabilityZones", [])
+                )
+                if option not in options:
+                    options.append(option)
+        if not options:
+            raise Exception(f"{db_instance_class} is not offered for {engine} {engine_version} in {self.region}")
+        return options
+
+    def supports(self, engine, engine_version, db_instance_class, feature):
+        """Whether any orderable option reports `feature`, e.g. "SupportsPerformanceInsights"."""
+        return any(option.get(feature) for option in self.get_orderable_options(engine, engine_version, db_instance_class))
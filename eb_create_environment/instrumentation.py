@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "RequestThrottled",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "EC2ThrottledException",
+    "ProvisionedThroughputExceededException",
+    "BandwidthLimitExceeded",
+    "SlowDown",
+}
+
+
+class NullTracer(object):
+    """Tracer used when no report was requested; records nothing."""
+    def instrument(self, client):
+        pass
+
+    def span(self, name, **args):
+        return nullcontext()
+
+
+class Tracer(object):
+    """
+    Records every AWS API call made by instrumented clients (service, operation, latency, retries, throttles and
+    response size) through botocore's event hooks, along with timed spans around each provisioning phase.  The report
+    is a Chrome trace (load it in chrome://tracing or Perfetto) whose `otherData` holds a per-operation summary.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.calls = []
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self.start
+
+    def instrument(self, client):
+        # Registered first so that handlers which short-circuit the request (e.g. botocore's Stubber) still get timed
+        client.meta.events.register_first("before-call.*.*", self.on_before_call)
+        client.meta.events.register("needs-retry.*.*", self.on_needs_retry)
+        client.meta.events.register("after-call.*.*", self.on_after_call)
+        client.meta.events.register("after-call-error.*.*", self.on_after_call_error)
+
+    def on_before_call(self, model, context, **kwargs):
+        context["trace_operation"] = (model.service_model.service_name, model.name)
+        context["trace_start"] = self.now()
+        context["trace_throttles"] = 0
+
+    def on_needs_retry(self, request_dict, response=None, **kwargs):
+        if response is None:
+            return
+        error_code = response[1].get("Error", {}).get("Code")
+        context = request_dict.get("context", {})
+        if error_code in THROTTLING_ERROR_CODES and "trace_throttles" in context:
+            context["trace_throttles"] += 1
+
+    def on_after_call(self, http_response, parsed, context, **kwargs):
+        self.record_call(
+            context,
+            status=http_response.status_code,
+            retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+            # Read the size from the headers; touching `content` would consume streaming bodies
+            response_bytes=int(http_response.headers.get("content-length") or 0),
+            error=parsed.get("Error", {}).get("Code"),
+        )
+
+    def on_after_call_error(self, context, exception, **kwargs):
+        self.record_call(context, status=None, retries=0, response_bytes=0, error=type(exception).__name__)
+
+    def record_call(self, context, status, retries, response_bytes, error):
+        if "trace_start" not in context:
+            return
+        end = self.now()
+        service_name, operation_name = context["trace_operation"]
+        call = {
+            "service": service_name,
+            "operation": operation_name,
+            "start": context["trace_start"],
+            "latency": end - context["trace_start"],
+            "status": status,
+            "retries": retries,
+            "throttles": context["trace_throttles"],
+            "response_bytes": response_bytes,
+            "error": error,
+            "thread": threading.get_ident(),
+        }
+        with self.lock:
+            self.calls.append(call)
+
+    @contextmanager
+    def span(self, name, **args):
+        start = self.now()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            span = {
+                "name": name,
+                "start": start,
+                "duration": self.now() - start,
+                "thread": threading.get_ident(),
+                "args": dict(args, error=error) if error else args,
+            }
+            with self.lock:
+                self.spans.append(span)
+
+    def get_summary(self):
+        operations = {}
+        with self.lock:
+            calls = list(self.calls)
+            spans = list(self.spans)
+        for call in calls:
+            key = f"{call['service']}.{call['operation']}"
+            summary = operations.setdefault(
+                key, {"calls": 0, "errors": 0, "retries": 0, "throttles": 0, "total_latency": 0.0, "response_bytes": 0}
+            )
+            summary["calls"] += 1
+            summary["errors"] += 1 if call["error"] else 0
+            summary["retries"] += call["retries"]
+            summary["throttles"] += call["throttles"]
+            summary["total_latency"] += call["latency"]
+            summary["response_bytes"] += call["response_bytes"]
+        return {
+            "total_seconds": self.now(),
+            "api_calls": len(calls),
+            "operations": operations,
+            "phases": [
+                {"name": span["name"], "seconds": span["duration"], **span["args"]}
+                for span in sorted(spans, key=lambda span: span["start"])
+            ],
+        }
+
+    def get_trace_events(self):
+        with self.lock:
+            calls = list(self.calls)
+            spans = list(self.spans)
+        pid = os.getpid()
+        events = [
+            {
+                "name": span["name"], "cat": "phase", "ph": "X", "pid": pid, "tid": span["thread"],
+                "ts": span["start"] * 1e6, "dur": span["duration"] * 1e6, "args": span["args"],
+            }
+            for span in spans
+        ]
+        events += [
+            {
+                "name": f"{call['service']}.{call['operation']}", "cat": "api", "ph": "X", "pid": pid,
+                "tid": call["thread"], "ts": call["start"] * 1e6, "dur": call["latency"] * 1e6,
+                "args": {
+                    key: call[key] for key in ["status", "retries", "throttles", "response_bytes", "error"]
+                },
+            }
+            for call in calls
+        ]
+        return sorted(events, key=lambda event: event["ts"])
+
+    def write_report(self, path):
+        report = {
+            "traceEvents": self.get_trace_events(),
+            "displayTimeUnit": "ms",
+            "otherData": self.get_summary(),
+        }
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        print(f"Wrote trace report to {path}")
@@ -0,0 +1,134 @@
+from eb_create_environment.cache import DiskCache
+from eb_create_environment.clients import ClientPool
+from eb_create_environment.instance_types import InstanceTypeCatalog
+
+
+# Workload profiles for RDS.ParameterTuning.Profile
+TUNING_PROFILES = {
+    # Many short queries: more connections than the RDS default, small per-query memory
+    "oltp": dict(
+        SharedBuffersFraction=0.25, MiBPerConnection=6, WorkMemOperationsPerConnection=4, ParallelWorkersPerVCPU=0.25,
+    ),
+    "mixed": dict(
+        SharedBuffersFraction=0.25, MiBPerConnection=32, WorkMemOperationsPerConnection=2, ParallelWorkersPerVCPU=0.5,
+    ),
+    # Few large queries: fewer connections, large sorts and hashes, wide parallel plans
+    "analytics": dict(
+        SharedBuffersFraction=0.25, MiBPerConnection=128, WorkMemOperationsPerConnection=1, ParallelWorkersPerVCPU=1,
+    ),
+}
+DEFAULT_TUNING_PROFILE = "mixed"
+EFFECTIVE_CACHE_FRACTION = 0.75
+MIN_CONNECTIONS = 20
+MAX_CONNECTIONS = 5000
+# The RDS Postgres default is LEAST({DBInstanceClassMemory/9531392}, 5000); tuning never goes below it
+RDS_DEFAULT_BYTES_PER_CONNECTION = 9531392
+MIN_WORK_MEM_KB = 4096
+SSD_STORAGE_TYPES = ["gp2", "gp3", "io1", "io2"]
+SSD_RANDOM_PAGE_COST = "1.1"
+# Parameters that only take effect after a reboot; new instances pick them up at creation
+STATIC_PARAMETERS = ["shared_buffers", "max_connections"]
+# modify_db_parameter_group accepts at most this many parameters per call
+MAX_PARAMETERS_PER_MODIFY = 20
+
+
+def get_tuned_parameters(instance_type_info, profile_name, storage_type):
+    """Postgres parameters sized to an instance class's memory and vCPUs, in the units RDS expects."""
+    if profile_name not in TUNING_PROFILES:
+        raise Exception(f"Unknown parameter tuning profile `{profile_name}`; expected one of {', '.join(TUNING_PROFILES)}")
+    profile = TUNING_PROFILES[profile_name]
+    memory_mib = instance_type_info["MemoryMiB"]
+    vcpus = instance_type_info["VCpus"]
+    shared_buffers_mib = int(memory_mib * profile["SharedBuffersFraction"])
+    default_connections = min(MAX_CONNECTIONS, memory_mib * 1024 * 1024 // RDS_DEFAULT_BYTES_PER_CONNECTION)
+    max_connections = max(
+        MIN_CONNECTIONS, default_connections, min(MAX_CONNECTIONS, memory_mib // profile["MiBPerConnection"]),
+    )
+    work_mem_kb = max(
+        MIN_WORK_MEM_KB,
+        (memory_mib - shared_buffers_mib) * 1024 // (max_connections * profile["WorkMemOperationsPerConnection"]),
+    )
+    parameters = {
+        # shared_buffers and effective_cache_size are in 8 kB pages, work_mem in kB
+        "shared_buffers": str(shared_buffers_mib * 1024 // 8),
+        "effective_cache_size": str(int(memory_mib * EFFECTIVE_CACHE_FRACTION) * 1024 // 8),
+        "work_mem": str(work_mem_kb),
+        "max_connections": str(max_connections),
+        "max_parallel_workers_per_gather": str(max(1, int(vcpus * profile["ParallelWorkersPerVCPU"]))),
+    }
+    if storage_type in SSD_STORAGE_TYPES:
+        parameters["random_page_cost"] = SSD_RANDOM_PAGE_COST
+    return parameters
+
+
+class ParameterGroupManager(object):
+    """
+    Creates or reuses custom parameter groups: optionally tuned for an instance class and workload profile, and
+    optionally logging slow statements.  Groups are named after everything that determines their values, so they are
+    shared by every database with the same settings, and brought back in line with the computed values when reused.
+    """
+    def __init__(self, region, clients=None, cache=None):
+        self.region = region
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+        self.client = self.clients.client("rds", region)
+
+    def get_parameter_group_name(self, family, db_instance_class=None, profile_name=None, log_min_duration_ms=None):
+        name = f"eb-create-environment-{family}"
+        if profile_name:
+            name += f"-{db_instance_class}-{profile_name}"
+        if log_min_duration_ms is not None:
+            name += f"-log{log_min_duration_ms}ms"
+        return name.replace(".", "-")
+
+    def ensure_parameter_group(self, family, db_instance_class, profile_name=None, storage_type=None,
+                               log_min_duration_ms=None):
+        """Create or update the group for these settings and return its name."""
+        parameters = {}
+        descriptions = []
+        if profile_name:
+            instance_type = db_instance_class.split(".", 1)[1] if db_instance_class.startswith("db.") else db_instance_class
+            instance_type_info = InstanceTypeCatalog(self.region, self.clients, self.cache).get_instance_type(instance_type)
+            parameters.update(get_tuned_parameters(instance_type_info, profile_name, storage_type))
+            descriptions.append(f"{profile_name} profile for {db_instance_class}")
+        if log_min_duration_ms is not None:
+            parameters["log_min_duration_statement"] = str(log_min_duration_ms)
+            descriptions.append(f"statements over {log_min_duration_ms} ms logged")
+        parameter_group_name = self.get_parameter_group_name(
+            family, db_instance_class, profile_name, log_min_duration_ms
+        )
+        try:
+            self.client.create_db_parameter_group(
+                DBParameterGroupName=parameter_group_name,
+                DBParameterGroupFamily=family,
+                Description=f"{', '.join(descriptions).capitalize()}; created by eb-create-environment",
+            )
+            current_parameters = {}
+        except self.client.exceptions.DBParameterGroupAlreadyExistsFault:
+            current_parameters = self.get_user_parameters(parameter_group_name)
+        changed = [name for name, value in parameters.items() if current_parameters.get(name) != value]
+        for start in range(0, len(changed), MAX_PARAMETERS_PER_MODIFY):
+            self.client.modify_db_parameter_group(
+                DBParameterGroupName=parameter_group_name,
+                Parameters=[
+                    {
+                        "ParameterName": name,
+                        "ParameterValue": parameters[name],
+                        "ApplyMethod": "pending-reboot" if name in STATIC_PARAMETERS else "immediate",
+                    }
+                    for name in changed[start:start + MAX_PARAMETERS_PER_MODIFY]
+                ],
+            )
+        print(f"Using parameter group {parameter_group_name}:")
+        for name, value in parameters.items():
+            print(f"  {name} = {value}")
+        return parameter_group_name
+
+    def get_user_parameters(self, parameter_group_name):
+        paginator = self.client.get_paginator("describe_db_parameters")
+        pages = paginator.paginate(DBParameterGroupName=parameter_group_name, Source="user")
+        return {
+            parameter["ParameterName"]: parameter.get("ParameterValue")
+            for page in pages
+            for parameter in page["Parameters"]
+        }
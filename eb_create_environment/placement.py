@@ -0,0 +1,116 @@
+from eb_create_environment.cache import DiskCache
+from eb_create_environment.clients import ClientPool
+from eb_create_environment.instance_types import DBInstanceClassCatalog
+
+
+class PlacementPlan(object):
+    """Where the EB instances, load balancer and database go; subnets are {subnet_id: availability_zone}."""
+    def __init__(self, instance_subnets, load_balancer_subnets=None, db_availability_zone=None, db_multi_az=False,
+                 has_db=False, existing_environment=False):
+        self.instance_subnets = instance_subnets
+        self.load_balancer_subnets = load_balancer_subnets
+        self.db_availability_zone = db_availability_zone
+        self.db_multi_az = db_multi_az
+        self.has_db = has_db
+        self.existing_environment = existing_environment
+
+    def print_layout(self):
+        def describe(subnets):
+            return ", ".join(f"{subnet_id} ({availability_zone})" for subnet_id, availability_zone in subnets.items())
+        print("Placement:")
+        if self.existing_environment:
+            print(f"  Instances:     existing environment {describe(self.instance_subnets)}".rstrip())
+        else:
+            print(f"  Instances:     {describe(self.instance_subnets)}")
+        if self.load_balancer_subnets:
+            print(f"  Load balancer: {describe(self.load_balancer_subnets)}")
+        if self.db_multi_az:
+            print("  Database:      Multi-AZ")
+        elif self.db_availability_zone:
+            print(f"  Database:      {self.db_availability_zone}")
+            if self.load_balancer_subnets:
+                # The Auto Scaling group balances instances across all of its zones
+                print(f"                 (only the instances launched in {self.db_availability_zone} share its zone)")
+        elif self.has_db:
+            print(
+                "  Database:      any availability zone (no zone of the DB subnet group offers the DB class and holds "
+                "instance subnets)"
+            )
+
+
+class PlacementPlanner(object):
+    """
+    Chooses subnets for the EB environment and an availability zone for a single-AZ database so that the database sits
+    next to the application instances.  The database goes in the zone, among those supporting both the EB instance type
+    and the DB instance class, with the most instance subnets.  A single-instance environment is restricted to that
+    zone; a load-balanced one keeps all its subnets, because its Auto Scaling group spreads instances evenly across
+    zones, so only some of its instances share the database's zone.
+    """
+    def __init__(self, region, vpc_accessor, clients=None, cache=None):
+        self.region = region
+        self.vpc_accessor = vpc_accessor
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+
+    def get_db_availability_zones(self, engine, engine_version, db_instance_class):
+        options = DBInstanceClassCatalog(self.region, self.clients, self.cache).get_orderable_options(
+            engine, engine_version, db_instance_class
+        )
+        return sorted({availability_zone for option in options for availability_zone in option["AvailabilityZones"]})
+
+    def plan(self, vpc_id, eb_config, db_params=None, db_subnet_zones=None, environment_subnets=None):
+        """
+        Plan placement from the `ElasticBeanstalk` config block and, unless there is no database, the resolved RDS
+        create parameters and the availability zones of the database's subnet group.  For a database added to an
+        existing environment, pass that environment's `environment_subnets` ({subnet_id: availability_zone}) and only
+        the database is placed.
+        """
+        if environment_subnets is not None:
+            return self.plan_database(
+                vpc_id, environment_subnets, None, db_params, db_subnet_zones, existing_environment=True,
+            )
+        instance_subnets = self.vpc_accessor.get_subnets(
+            vpc_id, eb_config.get("InstancePublicSubnets"), instance_type=eb_config.get("InstanceTypes")
+        )
+        if not instance_subnets:
+            raise Exception("No valid subnets for instances")
+        load_balancer = eb_config.get("LoadBalancer")
+        load_balancer_subnets = None
+        if load_balancer:
+            load_balancer_subnets = self.vpc_accessor.get_subnets(vpc_id, load_balancer.get("PublicSubnets"))
+            if not load_balancer_subnets:
+                raise Exception("No valid subnets for the load balancer")
+        return self.plan_database(vpc_id, instance_subnets, load_balancer_subnets, db_params, db_subnet_zones)
+
+    def plan_database(self, vpc_id, instance_subnets, load_balancer_subnets, db_params, db_subnet_zones,
+                      existing_environment=False):
+        plan_arguments = dict(existing_environment=existing_environment)
+        if not db_params:
+            return PlacementPlan(instance_subnets, load_balancer_subnets, **plan_arguments)
+        if db_params.get("MultiAZ"):
+            return PlacementPlan(instance_subnets, load_balancer_subnets, db_multi_az=True, has_db=True, **plan_arguments)
+
+        # A zone outside the subnet group cannot be pinned
+        if db_subnet_zones is None:
+            db_subnet_zones = self.vpc_accessor.get_subnets(vpc_id).values()
+        db_subnet_zones = set(db_subnet_zones)
+        db_zones = set(self.get_db_availability_zones(
+            db_params["Engine"], db_params["EngineVersion"], db_params["DBInstanceClass"]
+        ))
+        instance_zone_counts = {}
+        for availability_zone in instance_subnets.values():
+            instance_zone_counts[availability_zone] = instance_zone_counts.get(availability_zone, 0) + 1
+        candidates = sorted(
+            (zone for zone in instance_zone_counts if zone in db_zones and zone in db_subnet_zones),
+            key=lambda zone: (-instance_zone_counts[zone], zone),
+        )
+        if not candidates:
+            return PlacementPlan(instance_subnets, load_balancer_subnets, has_db=True, **plan_arguments)
+        db_availability_zone = candidates[0]
+        if not load_balancer_subnets and not existing_environment:
+            instance_subnets = {
+                subnet_id: zone for subnet_id, zone in instance_subnets.items() if zone == db_availability_zone
+            }
+        return PlacementPlan(
+            instance_subnets, load_balancer_subnets, db_availability_zone, has_db=True, **plan_arguments
+        )
@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MAX_PREFETCH_WORKERS = 6
+
+
+class Prefetcher(object):
+    """
+    Speculatively runs AWS lookups in background threads while the user answers prompts.  Lookups whose results are
+    read directly (applications, VPCs, environments) are fetched through `get`, which waits for the background result
+    or runs the lookup inline if it was never scheduled.  Other lookups just warm the shared caches.
+    """
+    def __init__(self, enabled=True, max_workers=DEFAULT_MAX_PREFETCH_WORKERS):
+        self.enabled = enabled
+        self.max_workers = max_workers
+        self.executor = None
+        self.futures = {}
+
+    def schedule(self, name, function, *args):
+        if not self.enabled or name in self.futures:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+        self.futures[name] = self.executor.submit(function, *args)
+
+    def get(self, name, function, *args):
+        future = self.futures.pop(name, None)
+        if future is None:
+            return function(*args)
+        return future.result()
+
+    def shutdown(self):
+        if self.executor is not None:
+            # Executor.shutdown only takes cancel_futures from Python 3.9
+            for future in self.futures.values():
+                future.cancel()
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.futures = {}
@@ -0,0 +1,216 @@
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+from eb_create_environment.utils import poll_until
+
+
+# RDS Proxy listens on the engine's default port, whatever port the instance uses
+PROXY_ENGINE_FAMILIES = {
+    "postgres": ("POSTGRESQL", 5432),
+}
+DEFAULT_PROXY_WAIT_TIMEOUT = 900
+PROXY_EXPECTED_CREATE_SECONDS = 300
+FAILED_PROXY_STATUSES = ["incompatible-network", "insufficient-resource-limits", "deleting"]
+# A newly created IAM role can take a few seconds before RDS is allowed to assume it
+ROLE_PROPAGATION_TIMEOUT = 120
+PROXY_TARGET_GROUP_NAME = "default"
+CONNECTION_POOL_PARAMS = [
+    "MaxConnectionsPercent",
+    "MaxIdleConnectionsPercent",
+    "ConnectionBorrowTimeout",
+]
+PROXY_ASSUME_ROLE_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [{
+        "Effect": "Allow",
+        "Principal": {"Service": "rds.amazonaws.com"},
+        "Action": "sts:AssumeRole",
+    }],
+}
+
+
+class DatabaseProxy(object):
+    """
+    An RDS Proxy in front of a DatabaseInitializer's instance, configured by the top-level `RDSProxy` block.
+
+    `start` creates the Secrets Manager secret holding the master credentials, the IAM role the proxy reads it with,
+    the proxy's security group and the proxy itself; it does not need the instance to be available.  `finish` registers
+    the instance as the proxy's target once it is available and returns the proxy endpoint.  Each step is recorded in
+    the provisioning state so that `--resume` reuses it.
+    """
+    def __init__(self, db_initializer, proxy_config):
+        self.db = db_initializer
+        self.proxy_config = proxy_config
+        self.state = db_initializer.state
+        self.clients = db_initializer.clients
+        self.region = db_initializer.region
+        self.client = db_initializer.client
+        self.environment_name = db_initializer.environment_name
+        self.proxy_name = f"{self.environment_name}-proxy"
+        self.engine_family, self.port = PROXY_ENGINE_FAMILIES[db_initializer.engine.value]
+        self.security_group_id = None
+
+    def start(self):
+        with self.clients.tracer.span("DB proxy create", environment=self.environment_name):
+            secret_arn = self.create_secret()
+            role_arn = self.create_role(secret_arn)
+            self.create_security_group()
+            if self.state.is_complete("db_proxy") and self.describe_proxy():
+                print(f"Reusing database proxy {self.proxy_name}")
+                return
+            print(f"Creating database proxy {self.proxy_name}")
+            self.create_proxy(secret_arn, role_arn)
+            self.state.complete("db_proxy", proxy_name=self.proxy_name)
+
+    def finish(self):
+        """Point the proxy at the (now available) instance and return the proxy's endpoint."""
+        with self.clients.tracer.span("DB proxy wait", environment=self.environment_name):
+            pool_config = {
+                param: self.proxy_config[param] for param in CONNECTION_POOL_PARAMS if param in self.proxy_config
+            }
+            if pool_config:
+                self.client.modify_db_proxy_target_group(
+                    DBProxyName=self.proxy_name,
+                    TargetGroupName=PROXY_TARGET_GROUP_NAME,
+                    ConnectionPoolConfig=pool_config,
+                )
+            if not self.state.is_complete("db_proxy_targets"):
+                try:
+                    self.client.register_db_proxy_targets(
+                        DBProxyName=self.proxy_name,
+                        TargetGroupName=PROXY_TARGET_GROUP_NAME,
+                        DBInstanceIdentifiers=[self.db.db_name],
+                    )
+                except self.client.exceptions.DBProxyTargetAlreadyRegisteredFault:
+                    pass
+                self.state.complete("db_proxy_targets")
+            proxy = self.wait_for_proxy()
+        return proxy["Endpoint"]
+
+    def create_secret(self):
+        secrets_client = self.clients.client("secretsmanager", self.region)
+        secret_name = f"{self.environment_name}-db-credentials"
+        secret_string = json.dumps({"username": self.db.get_master_username(), "password": self.db.password})
+        try:
+            secret_arn = secrets_client.create_secret(
+                Name=secret_name,
+                Description=f"Database credentials for {self.environment_name}, read by its RDS Proxy",
+                SecretString=secret_string,
+            )["ARN"]
+        except secrets_client.exceptions.ResourceExistsException:
+            # Left by a previous run; this run resets the master password, so store the new one
+            secret_arn = secrets_client.put_secret_value(SecretId=secret_name, SecretString=secret_string)["ARN"]
+        self.state.complete("db_proxy_secret", secret_arn=secret_arn)
+        return secret_arn
+
+    def create_role(self, secret_arn):
+        iam_client = self.clients.client("iam", self.region)
+        role_name = f"{self.environment_name}-db-proxy"
+        try:
+            role_arn = iam_client.create_role(
+                RoleName=role_name,
+                AssumeRolePolicyDocument=json.dumps(PROXY_ASSUME_ROLE_POLICY),
+                Description=f"Lets the RDS Proxy for {self.environment_name} read the database credentials",
+            )["Role"]["Arn"]
+        except iam_client.exceptions.EntityAlreadyExistsException:
+            role_arn = iam_client.get_role(RoleName=role_name)["Role"]["Arn"]
+        iam_client.put_role_policy(
+            RoleName=role_name,
+            PolicyName="read-db-credentials",
+            PolicyDocument=json.dumps({
+                "Version": "2012-10-17",
+                "Statement": [{
+                    "Effect": "Allow",
+                    "Action": "secretsmanager:GetSecretValue",
+                    "Resource": secret_arn,
+                }],
+            }),
+        )
+        self.state.complete("db_proxy_role", role_name=role_name, role_arn=role_arn)
+        return role_arn
+
+    def create_security_group(self):
+        resumed = self.state.get("db_proxy_security_group")
+        if resumed and self.db.security_group_exists(resumed["security_group_id"]):
+            self.security_group_id = resumed["security_group_id"]
+        else:
+            ec2_client = self.clients.client("ec2", self.region)
+            security_group_name = f"{self.environment_name}-db-proxy"
+            self.security_group_id = ec2_client.create_security_group(
+                GroupName=security_group_name,
+                Description=f"Database proxy security group for {self.environment_name}",
+                VpcId=self.db.vpc_id,
+                TagSpecifications=[{
+                    "ResourceType": "security-group",
+                    "Tags": [{"Key": "Name", "Value": security_group_name}]
+                }]
+            )["GroupId"]
+            self.state.complete(
+                "db_proxy_security_group", security_group_id=self.security_group_id, vpc_id=self.db.vpc_id
+            )
+        # The proxy connects to the instance on the instance's port
+        self.db.authorize_ingress(self.db.security_group_id, self.security_group_id, self.db.get_config_params()["Port"])
+        if self.db.application_security_group_id:
+            self.authorize_application_access(self.db.application_security_group_id)
+
+    def authorize_application_access(self, application_security_group_id):
+        """Allow the EB environment's security group to reach the proxy."""
+        if self.security_group_id:
+            self.db.authorize_ingress(self.security_group_id, application_security_group_id, self.port)
+
+    def create_proxy(self, secret_arn, role_arn):
+        params = dict(
+            DBProxyName=self.proxy_name,
+            EngineFamily=self.engine_family,
+            Auth=[{"AuthScheme": "SECRETS", "SecretArn": secret_arn, "IAMAuth": "DISABLED"}],
+            RoleArn=role_arn,
+            VpcSubnetIds=list(self.db.vpc_accessor.get_subnets(self.db.vpc_id)),
+            VpcSecurityGroupIds=[self.security_group_id],
+            RequireTLS=self.proxy_config.get("RequireTLS", True),
+        )
+        if self.proxy_config.get("IdleClientTimeout"):
+            params["IdleClientTimeout"] = self.proxy_config["IdleClientTimeout"]
+
+        def attempt():
+            try:
+                return self.client.create_db_proxy(**params)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "InvalidParameterValue" or "role" not in str(e).lower():
+                    raise
+                return None
+
+        if poll_until(attempt, ROLE_PROPAGATION_TIMEOUT, ROLE_PROPAGATION_TIMEOUT) is None:
+            raise Exception(f"RDS could not assume role {role_arn} for database proxy {self.proxy_name}")
+
+    def describe_proxy(self):
+        try:
+            return self.client.describe_db_proxies(DBProxyName=self.proxy_name)["DBProxies"][0]
+        except self.client.exceptions.DBProxyNotFoundFault:
+            return None
+
+    def wait_for_proxy(self):
+        timeout = self.proxy_config.get("WaitTimeout", DEFAULT_PROXY_WAIT_TIMEOUT)
+        start = time.monotonic()
+        last_status = None
+
+        def check():
+            nonlocal last_status
+            proxy = self.describe_proxy()
+            if proxy is None:
+                raise Exception(f"Database proxy {self.proxy_name} does not exist")
+            status = proxy["Status"]
+            if status != last_status:
+                print(f"[{int(time.monotonic() - start)}s] Database proxy {self.proxy_name} status: {status}")
+                last_status = status
+            if status in FAILED_PROXY_STATUSES:
+                raise Exception(f"Database proxy {self.proxy_name} entered status {status}")
+            return proxy if status == "available" else None
+
+        proxy = poll_until(check, timeout, PROXY_EXPECTED_CREATE_SECONDS, cancel=self.db.cancel_event)
+        if proxy is None:
+            if self.db.cancel_event.is_set():
+                raise Exception(f"Stopped waiting for database proxy {self.proxy_name}")
+            raise Exception(f"Database proxy not ready after {timeout} seconds")
+        return proxy
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from eb_create_environment.placement import PlacementPlanner
+
+
+# Primary create parameters that replicas are given as well; the rest (storage size, credentials, backups, subnet
+# group) they inherit from the primary
+REPLICA_PARAMS = [
+    'DBInstanceClass',
+    'Port',
+    'PubliclyAccessible',
+    'AutoMinorVersionUpgrade',
+    'StorageType',
+    'Iops',
+    'StorageThroughput',
+    'CopyTagsToSnapshot',
+    'DeletionProtection',
+    'MaxAllocatedStorage',
+    'MonitoringInterval',
+    'MonitoringRoleArn',
+    'EnablePerformanceInsights',
+    'PerformanceInsightsRetentionPeriod',
+    'PerformanceInsightsKMSKeyId',
+    'EnableCloudwatchLogsExports',
+]
+# ReadReplicas.AvailabilityZones value that spreads replicas over the zones offering their class
+SPREAD_AVAILABILITY_ZONES = "spread"
+
+
+class ReadReplicaSet(object):
+    """
+    Read replicas of a DatabaseInitializer's instance, configured by the `RDS.ReadReplicas` block: `Count` replicas
+    named `{env}-db-replica-{n}`, of `DBInstanceClass` (the primary's by default), placed by `AvailabilityZones`.  With
+    "spread" (the default) replica n goes in the n-th of the zones that offer the class, starting with the zones the
+    primary is not in; a list of zones is used in turn.
+    """
+    def __init__(self, db_initializer, replica_config):
+        self.db = db_initializer
+        self.replica_config = replica_config
+        self.count = int(replica_config.get("Count", 1))
+        if db_initializer.config['RDS'].get('BackupRetentionPeriod', 0) <= 0:
+            raise Exception("RDS.ReadReplicas requires automated backups; set BackupRetentionPeriod above 0")
+
+    def get_replica_name(self, index):
+        return f"{self.db.db_name}-replica-{index + 1}"
+
+    def get_replica_params(self):
+        params = dict(self.db.get_config_params())
+        params["DBInstanceClass"] = self.replica_config.get("DBInstanceClass") or params["DBInstanceClass"]
+        params.update(self.db.get_monitoring_params(params))
+        replica_params = {
+            param: params[param] for param in REPLICA_PARAMS if params.get(param) is not None
+        }
+        replica_params["DBParameterGroupName"] = self.db.get_parameter_group_name(params["DBInstanceClass"])
+        replica_params["VpcSecurityGroupIds"] = [self.db.security_group_id]
+        return replica_params
+
+    def get_availability_zones(self, primary_availability_zone):
+        zones = self.replica_config.get("AvailabilityZones", SPREAD_AVAILABILITY_ZONES)
+        if zones != SPREAD_AVAILABILITY_ZONES:
+            return list(zones)
+        params = self.db.get_config_params()
+        planner = PlacementPlanner(self.db.region, self.db.vpc_accessor, self.db.clients, self.db.cache)
+        offered = set(planner.get_db_availability_zones(
+            params["Engine"], params["EngineVersion"],
+            self.replica_config.get("DBInstanceClass") or params["DBInstanceClass"],
+        ))
+        # Replicas stay in the subnet group of the primary
+        zones = sorted(offered & set(self.db.get_db_subnet_group_zones()))
+        return sorted(zones, key=lambda zone: zone == primary_availability_zone)
+
+    def create(self):
+        """
+        Create the replicas once the primary is available, all at the same time, wait for every one of them and return
+        their endpoint addresses.
+        """
+        if self.count <= 0:
+            return []
+        with self.db.clients.tracer.span("DB replicas", environment=self.db.environment_name):
+            primary = self.db.wait_for_db_instance(lambda db: db['DBInstanceStatus'] == 'available')
+            zones = self.get_availability_zones(primary.get("AvailabilityZone"))
+            params = self.get_replica_params()
+            with ThreadPoolExecutor(max_workers=self.count, thread_name_prefix="replica") as executor:
+                futures = [
+                    executor.submit(self.create_replica, index, params, zones[index % len(zones)] if zones else None)
+                    for index in range(self.count)
+                ]
+                return [future.result() for future in futures]
+
+    def create_replica(self, index, params, availability_zone):
+        replica_name = self.get_replica_name(index)
+        step = f"db_replica_{index + 1}"
+        replica = self.db.describe_db_instance(replica_name) if self.db.state.get(step) else None
+        if replica and replica['DBInstanceStatus'] not in ['deleting', 'failed']:
+            print(f"Reusing read replica {replica_name}")
+        else:
+            print(f"Creating read replica {replica_name}" + (f" in {availability_zone}" if availability_zone else ""))
+            replica_params = dict(params)
+            if availability_zone:
+                replica_params["AvailabilityZone"] = availability_zone
+            self.db.call_with_new_role(
+                self.db.client.create_db_instance_read_replica,
+                DBInstanceIdentifier=replica_name,
+                SourceDBInstanceIdentifier=self.db.db_name,
+                **replica_params,
+            )
+            self.db.state.complete(step, db_instance_identifier=replica_name)
+        replica = self.db.wait_for_db_instance(
+            lambda db: db['DBInstanceStatus'] == 'available', db_instance_identifier=replica_name,
+        )
+        return replica['Endpoint']['Address']
@@ -0,0 +1,147 @@
+import fnmatch
+
+
+# create_db_instance parameters that the restore calls accept as well
+RESTORE_PARAMS = [
+    'DBInstanceClass',
+    'Port',
+    'AvailabilityZone',
+    'DBSubnetGroupName',
+    'VpcSecurityGroupIds',
+    'MultiAZ',
+    'PubliclyAccessible',
+    'AutoMinorVersionUpgrade',
+    'LicenseModel',
+    'Engine',
+    'StorageType',
+    'Iops',
+    'StorageThroughput',
+    'CopyTagsToSnapshot',
+    'DBParameterGroupName',
+    'BackupRetentionPeriod',
+    'DeletionProtection',
+    'EnableCloudwatchLogsExports',
+]
+# create_db_instance parameters that the restore calls do not accept; applied in one modify once the instance is up
+MODIFY_AFTER_RESTORE_PARAMS = [
+    'MasterUserPassword',
+    'MaxAllocatedStorage',
+    'MonitoringInterval',
+    'MonitoringRoleArn',
+    'EnablePerformanceInsights',
+    'PerformanceInsightsRetentionPeriod',
+    'PerformanceInsightsKMSKeyId',
+]
+# RestoreTime value that restores to the source instance's latest restorable time
+LATEST_RESTORE_TIME = "latest"
+
+
+class DatabaseRestore(object):
+    """
+    Restores a DatabaseInitializer's instance from the `RDS.Source` block instead of creating an empty one: a named
+    snapshot (`DBSnapshotIdentifier`), the latest automated snapshot of an instance (`DBInstanceIdentifier`), or an
+    instance as of `RestoreTime` (`DBInstanceIdentifier` and `RestoreTime`, which can be "latest").
+
+    The restored instance keeps the source's master username, engine version and encryption.  The parameters the
+    restore calls do not accept, the master password among them, are left for a single `modify_db_instance` once the
+    instance is available (see `get_modify_params`).
+    """
+    def __init__(self, db_initializer, source_config):
+        self.db = db_initializer
+        self.source_config = source_config
+        self.client = db_initializer.client
+        self.snapshot_identifier = source_config.get("DBSnapshotIdentifier")
+        self.source_instance_identifier = source_config.get("DBInstanceIdentifier")
+        self.restore_time = source_config.get("RestoreTime")
+        if bool(self.snapshot_identifier) == bool(self.source_instance_identifier):
+            raise Exception("RDS.Source needs exactly one of DBSnapshotIdentifier and DBInstanceIdentifier")
+        if self.snapshot_identifier and self.restore_time:
+            raise Exception("RDS.Source.RestoreTime can only be used with DBInstanceIdentifier")
+        self._source = None
+
+    def get_source(self):
+        """Look up the snapshot or instance to restore, returned with a `Description` for messages."""
+        if self._source is None:
+            if self.snapshot_identifier:
+                source = self.describe_snapshot()
+                source["Description"] = f"snapshot {self.snapshot_identifier}"
+            elif self.restore_time:
+                source = self.describe_source_instance()
+                source["Description"] = f"{self.source_instance_identifier} as of {self.restore_time}"
+            else:
+                source = self.find_latest_automated_snapshot()
+                source["Description"] = (
+                    f"snapshot {source['DBSnapshotIdentifier']} (latest of {self.source_instance_identifier})"
+                )
+            self._source = source
+        return self._source
+
+    def describe_snapshot(self):
+        try:
+            snapshot = self.client.describe_db_snapshots(DBSnapshotIdentifier=self.snapshot_identifier)["DBSnapshots"][0]
+        except self.client.exceptions.DBSnapshotNotFoundFault:
+            raise Exception(f"Snapshot {self.snapshot_identifier} does not exist")
+        if snapshot["Status"] != "available":
+            raise Exception(f"Snapshot {self.snapshot_identifier} is {snapshot['Status']}, not available")
+        return snapshot
+
+    def describe_source_instance(self):
+        try:
+            return self.client.describe_db_instances(
+                DBInstanceIdentifier=self.source_instance_identifier
+            )["DBInstances"][0]
+        except self.client.exceptions.DBInstanceNotFoundFault:
+            raise Exception(f"Source database {self.source_instance_identifier} does not exist")
+
+    def find_latest_automated_snapshot(self):
+        paginator = self.client.get_paginator("describe_db_snapshots")
+        pages = paginator.paginate(DBInstanceIdentifier=self.source_instance_identifier, SnapshotType="automated")
+        snapshots = [
+            snapshot
+            for page in pages
+            for snapshot in page["DBSnapshots"]
+            if snapshot["Status"] == "available"
+        ]
+        if not snapshots:
+            raise Exception(f"No available automated snapshots of {self.source_instance_identifier}")
+        return max(snapshots, key=lambda snapshot: snapshot["SnapshotCreateTime"])
+
+    def check_compatibility(self, params):
+        """Raise unless the source runs the configured major engine version, which the parameter group depends on."""
+        source = self.get_source()
+        source_major = source["EngineVersion"].split(".")[0]
+        if not fnmatch.fnmatch(source["EngineVersion"], f"{params['EngineVersion'].split('.')[0]}.*"):
+            raise Exception(
+                f"{source['Description']} runs {source['Engine']} {source['EngineVersion']} but EngineVersion resolves "
+                f"to {params['EngineVersion']}; set EngineVersion to \"{source_major}.*\""
+            )
+        if params.get("StorageEncrypted") and not source.get("Encrypted", source.get("StorageEncrypted")):
+            print(f"Warning: {source['Description']} is not encrypted, so neither is the restored database")
+
+    def get_modify_params(self, params):
+        return {param: params[param] for param in MODIFY_AFTER_RESTORE_PARAMS if param in params}
+
+    def restore(self, params):
+        """Start the restore with the create parameters `params` that it accepts."""
+        source = self.get_source()
+        restore_params = {param: params[param] for param in RESTORE_PARAMS if param in params}
+        # Storage can only grow from the source's
+        if params.get("AllocatedStorage", 0) > source["AllocatedStorage"]:
+            restore_params["AllocatedStorage"] = params["AllocatedStorage"]
+        print(f"Restoring database {self.db.db_name} from {source['Description']}")
+        if "DBSnapshotIdentifier" in source:
+            self.client.restore_db_instance_from_db_snapshot(
+                DBInstanceIdentifier=self.db.db_name,
+                DBSnapshotIdentifier=source["DBSnapshotIdentifier"],
+                **restore_params,
+            )
+        else:
+            if self.restore_time == LATEST_RESTORE_TIME:
+                restore_params["UseLatestRestorableTime"] = True
+            else:
+                restore_params["RestoreTime"] = self.restore_time
+            self.client.restore_db_instance_to_point_in_time(
+                SourceDBInstanceIdentifier=self.source_instance_identifier,
+                TargetDBInstanceIdentifier=self.db.db_name,
+                **restore_params,
+            )
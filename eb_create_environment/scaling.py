@@ -0,0 +1,127 @@
+TRIGGER_NAMESPACE = "aws:autoscaling:trigger"
+ASG_NAMESPACE = "aws:autoscaling:asg"
+ROLLING_UPDATE_NAMESPACE = "aws:autoscaling:updatepolicy:rollingupdate"
+LAUNCH_CONFIGURATION_NAMESPACE = "aws:autoscaling:launchconfiguration"
+# EB's default instance metrics interval; triggers with a shorter Period need "1 minute" (detailed monitoring)
+DEFAULT_MONITORING_INTERVAL = "5 minute"
+DETAILED_MONITORING_INTERVAL = "1 minute"
+
+TRIGGER_OPTIONS = [
+    "MeasureName",
+    "Statistic",
+    "Unit",
+    "Period",
+    "EvaluationPeriods",
+    "BreachDuration",
+    "UpperThreshold",
+    "LowerThreshold",
+    "UpperBreachScaleIncrement",
+    "LowerBreachScaleIncrement",
+]
+ROLLING_UPDATE_OPTIONS = [
+    "RollingUpdateEnabled",
+    "RollingUpdateType",
+    "MaxBatchSize",
+    "MinInstancesInService",
+    "PauseTime",
+]
+
+# Periods and breach durations are in minutes, cooldowns in seconds.  MonitoringInterval is the instance metrics
+# interval of the launch configuration.  MaxBatchFraction sizes MaxBatchSize from
+# MaxSize; KeepMinInService keeps MinSize instances serving during rolling updates.
+SCALING_PROFILES = {
+    # Scale out early and in large steps so that request latency stays flat under bursts
+    "latency-sensitive": dict(
+        MeasureName="CPUUtilization", Statistic="Average", Unit="Percent",
+        Period=1, EvaluationPeriods=2, BreachDuration=2, MonitoringInterval=DETAILED_MONITORING_INTERVAL,
+        UpperThreshold=50, LowerThreshold=20, UpperBreachScaleIncrement=2, LowerBreachScaleIncrement=-1,
+        Cooldown=120,
+        RollingUpdateEnabled=True, RollingUpdateType="Health", MaxBatchFraction=0.25, KeepMinInService=True,
+    ),
+    # Run instances hot but keep headroom for sustained load
+    "throughput": dict(
+        MeasureName="CPUUtilization", Statistic="Average", Unit="Percent",
+        Period=5, EvaluationPeriods=1, BreachDuration=5,
+        UpperThreshold=70, LowerThreshold=30, UpperBreachScaleIncrement=1, LowerBreachScaleIncrement=-1,
+        Cooldown=300,
+        RollingUpdateEnabled=True, RollingUpdateType="Health", MaxBatchFraction=0.34, KeepMinInService=True,
+    ),
+    # Fewest instances: scale out late, scale in readily, update in large batches
+    "cost": dict(
+        MeasureName="CPUUtilization", Statistic="Average", Unit="Percent",
+        Period=5, EvaluationPeriods=2, BreachDuration=10,
+        UpperThreshold=80, LowerThreshold=20, UpperBreachScaleIncrement=1, LowerBreachScaleIncrement=-1,
+        Cooldown=600,
+        RollingUpdateEnabled=True, RollingUpdateType="Health", MaxBatchFraction=0.5, KeepMinInService=False,
+    ),
+}
+# Above this CPU threshold a burstable instance may run out of CPU credits before scaling out
+BURSTABLE_MAX_UPPER_THRESHOLD = 40
+
+
+def get_scaling_options(scaling_config, instance_type, instance_type_info, min_size, max_size):
+    """
+    Expand a `Scaling` config block into EB option settings {(namespace, option_name): value}.  The named profile
+    supplies every value; any of them can be overridden in the block itself.  Raises for settings that cannot work
+    with the group's size, and warns about CPU triggers on burstable instance types.
+    """
+    profile_name = scaling_config.get("Profile")
+    if profile_name not in SCALING_PROFILES:
+        raise Exception(f"Unknown scaling profile `{profile_name}`; expected one of {', '.join(SCALING_PROFILES)}")
+    settings = dict(SCALING_PROFILES[profile_name])
+    settings.update({key: value for key, value in scaling_config.items() if key != "Profile"})
+
+    min_size = int(min_size)
+    max_size = int(max_size)
+    if "MaxBatchSize" not in settings:
+        settings["MaxBatchSize"] = max(1, int(max_size * settings["MaxBatchFraction"]))
+    if "MinInstancesInService" not in settings:
+        settings["MinInstancesInService"] = min(min_size, max_size - 1) if settings["KeepMinInService"] else 0
+
+    if settings["LowerThreshold"] >= settings["UpperThreshold"]:
+        raise Exception(
+            f"Scaling LowerThreshold ({settings['LowerThreshold']}) must be below UpperThreshold "
+            f"({settings['UpperThreshold']})"
+        )
+    if settings["BreachDuration"] < settings["Period"]:
+        raise Exception(
+            f"Scaling BreachDuration ({settings['BreachDuration']}) must be at least Period ({settings['Period']})"
+        )
+    monitoring_interval = settings.get("MonitoringInterval", DEFAULT_MONITORING_INTERVAL)
+    if settings["Period"] < 5 and monitoring_interval != DETAILED_MONITORING_INTERVAL:
+        raise Exception(
+            f"Scaling Period ({settings['Period']}) is shorter than the {monitoring_interval} instance metrics, so the "
+            f"trigger would never have data; set MonitoringInterval to \"{DETAILED_MONITORING_INTERVAL}\" or Period to 5"
+        )
+    if settings["MaxBatchSize"] > max_size:
+        raise Exception(f"Scaling MaxBatchSize ({settings['MaxBatchSize']}) cannot exceed MaxSize ({max_size})")
+    if max_size > 1 and settings["MinInstancesInService"] >= max_size:
+        raise Exception(
+            f"Scaling MinInstancesInService ({settings['MinInstancesInService']}) must be below MaxSize ({max_size})"
+        )
+    if (
+        instance_type_info.get("BurstablePerformance")
+        and settings["MeasureName"] == "CPUUtilization"
+        and settings["UpperThreshold"] > BURSTABLE_MAX_UPPER_THRESHOLD
+    ):
+        print(
+            f"Warning: {instance_type} is burstable; once its CPU credits run out it is throttled to its baseline and "
+            f"may never reach an UpperThreshold of {settings['UpperThreshold']}%. Consider a non-burstable instance "
+            f"type or a lower threshold."
+        )
+
+    options = {(TRIGGER_NAMESPACE, name): str(settings[name]) for name in TRIGGER_OPTIONS}
+    options[(ASG_NAMESPACE, "Cooldown")] = str(settings["Cooldown"])
+    if "MonitoringInterval" in settings:
+        options[(LAUNCH_CONFIGURATION_NAMESPACE, "MonitoringInterval")] = settings["MonitoringInterval"]
+    for name in ROLLING_UPDATE_OPTIONS:
+        if name in settings:
+            value = settings[name]
+            options[(ROLLING_UPDATE_NAMESPACE, name)] = ("true" if value else "false") if isinstance(value, bool) else str(value)
+    print(
+        f"Scaling profile {profile_name}: {settings['MeasureName']} {settings['LowerThreshold']}-"
+        f"{settings['UpperThreshold']} {settings['Unit']} over {settings['BreachDuration']} min, cooldown "
+        f"{settings['Cooldown']} s, rolling updates of {settings['MaxBatchSize']} keeping "
+        f"{settings['MinInstancesInService']} in service"
+    )
+    return options
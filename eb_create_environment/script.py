@@ -1,28 +1,44 @@
 import argparse
-import boto3
 import os
 import sys
-import yaml
 
-import importlib.metadata
-from eb_create_environment.database import DatabaseInitializer, Engine
-from eb_create_environment.eb_setup import EBInitializer
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from eb_create_environment.batch import DEFAULT_MAX_PER_REGION, ManifestProvisioner
+from eb_create_environment.cache import DiskCache, REGIONS_TTL
+from eb_create_environment.clients import ClientPool, DEFAULT_MAX_POOL_CONNECTIONS
+from eb_create_environment.instrumentation import NullTracer, Tracer
+from eb_create_environment.placement import PlacementPlanner
+from eb_create_environment.prefetch import Prefetcher
+from eb_create_environment.state import ProvisioningState
 from eb_create_environment.vpc import VPCAccessor
 
+# boto3, botocore and yaml are imported where they are first needed (the EB and RDS initializers are imported
+# inside SetupWrapper's methods) so that --help, --version, --print-default-config and argument errors stay fast
+
 
 DEFAULT_CONFIG_FILE_PATH = "default_config.yml"
 EB_GLOBAL_CONFIG_DIRECTORY = ".elasticbeanstalk"
 EB_GLOBAL_CONFIG_FILE_PATH = os.path.join(EB_GLOBAL_CONFIG_DIRECTORY, "config.yml")
 
 
-class SetupWrapper(object):
-    def __init__(self):
+class VersionAction(argparse.Action):
+    """Like argparse's "version" action, but only reads the installed package metadata when --version is passed."""
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS,
+                 help="show program's version number and exit"):
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        import importlib.metadata
         version = importlib.metadata.version("eb_create_environment")
+        parser.exit(message=f"{parser.prog} {version}\n")
+
+
+class SetupWrapper(object):
+    def __init__(self, argv=None, clients=None, cache=None):
         parser = argparse.ArgumentParser(description="Set up linked EB and RDS instances")
         parser.add_argument(
             "--version",
-            action="version",
-            version=f"%(prog)s {version}"
+            action=VersionAction,
         )
         parser.add_argument(
             "-c", "--config",
@@ -39,6 +55,16 @@ class SetupWrapper(object):
             default=None,
             help="Elastic Beanstalk environment name",
         )
+        parser.add_argument(
+            "--cname_prefix",
+            default=None,
+            help="Elastic Beanstalk CNAME prefix for the new environment",
+        )
+        parser.add_argument(
+            "--vpc_id",
+            default=None,
+            help="VPC to create the environment and database in",
+        )
         parser.add_argument(
             "-p", "--profile",
             default=None,
@@ -61,43 +87,162 @@ class SetupWrapper(object):
             action="store_true",
             help="Skip setup of the database.  Cannot be used with `--db-only`"
         )
+        parser.add_argument(
+            "--update",
+            default=False,
+            action="store_true",
+            help="Apply the config to an existing environment, changing only the settings that differ.  Cannot be used "
+                 "with `--db-only`"
+        )
+        parser.add_argument(
+            "--destroy",
+            default=False,
+            action="store_true",
+            help="Delete the environment, its database and the resources created with them.  Safe to run again if "
+                 "interrupted"
+        )
+        parser.add_argument(
+            "--final-snapshot",
+            default=False,
+            action="store_true",
+            help="With `--destroy`, take a final snapshot of the database before deleting it"
+        )
+        parser.add_argument(
+            "--parallel",
+            default=False,
+            action="store_true",
+            help="Create the database while the EB environment is launching instead of after it is ready"
+        )
+        parser.add_argument(
+            "--link-at-launch",
+            default=False,
+            action="store_true",
+            help="Create the database first and launch the EB environment with DATABASE_URL already set, so that it "
+                 "is deployed once.  Cannot be used with `--parallel`, `--db-only` or `--no-db`"
+        )
+        parser.add_argument(
+            "--max-pool-connections",
+            default=DEFAULT_MAX_POOL_CONNECTIONS,
+            type=int,
+            help="Maximum number of connections kept open per AWS client"
+        )
+        parser.add_argument(
+            "--refresh-cache",
+            default=False,
+            action="store_true",
+            help="Ignore cached AWS catalog lookups (regions, solution stacks, engine versions) and fetch them again"
+        )
+        parser.add_argument(
+            "--manifest",
+            default=None,
+            help="Provision every environment listed in a YAML/JSON manifest instead of a single environment"
+        )
+        parser.add_argument(
+            "--max-per-region",
+            default=DEFAULT_MAX_PER_REGION,
+            type=int,
+            help="Maximum number of environments provisioned at the same time in each region with `--manifest`"
+        )
+        parser.add_argument(
+            "--trace-out",
+            default=None,
+            help="Write a JSON report (Chrome trace format) of phase timings and AWS API calls to this path"
+        )
+        parser.add_argument(
+            "--resume",
+            default=False,
+            action="store_true",
+            help="Continue a failed run from its first incomplete step, reusing the resources it already created"
+        )
+        parser.add_argument(
+            "--no-prefetch",
+            default=False,
+            action="store_true",
+            help="Do not look up VPCs, solution stacks and engine versions in the background while waiting for input"
+        )
         parser.add_argument(
             "--print-default-config",
             default=False,
             action="store_true",
             help="Print default config and exit"
         )
-        args = parser.parse_args()
+        args = parser.parse_args(argv)
         if args.print_default_config:
             self.print_default_config()
             sys.exit()
         self.profile = args.profile
         self.application_name = args.application_name
         self.environment_name = args.environment_name
+        self.cname_prefix = args.cname_prefix
+        self.vpc_id = args.vpc_id
         self.region = args.region
         self.db_only = args.db_only
         self.no_db = args.no_db
+        self.update = args.update
+        self.destroy = args.destroy
+        self.final_snapshot = args.final_snapshot
+        self.parallel = args.parallel
+        self.link_at_launch = args.link_at_launch
+        self.manifest = args.manifest
+        self.resume = args.resume
+        self.max_per_region = args.max_per_region
+        self.trace_out = args.trace_out
+        self.tracer = Tracer() if self.trace_out else NullTracer()
+        self.clients = clients or ClientPool(max_pool_connections=args.max_pool_connections, tracer=self.tracer)
+        self.cache = cache or DiskCache(refresh=args.refresh_cache)
+        self.prefetcher = Prefetcher(enabled=not args.no_prefetch)
+        self.config = None
+        self.vpc_accessor = None
         if self.db_only and self.no_db:
             raise Exception("--db-only cannot be used with --no-db")
+        if self.update and self.db_only:
+            raise Exception("--update cannot be used with --db-only")
+        if self.destroy and (self.update or self.db_only or self.no_db):
+            raise Exception("--destroy cannot be used with --update, --db-only or --no-db")
+        if self.link_at_launch and (self.parallel or self.db_only or self.no_db or self.update or self.destroy):
+            raise Exception("--link-at-launch cannot be used with --parallel, --db-only, --no-db, --update or --destroy")
+        if self.final_snapshot and not self.destroy:
+            raise Exception("--final-snapshot can only be used with --destroy")
         self.dir_path = os.path.dirname(os.path.realpath(__file__))
         self.config_file_path = args.config or os.path.join(self.dir_path, DEFAULT_CONFIG_FILE_PATH)
         # TODO: add support for application creation
         # self.create_new_application = False
-        self.get_eb_config()
 
     def setup(self):
-        # Read from config file
-        config = self.parse_config_file()
-        boto3.setup_default_session(profile_name=self.profile)
+        try:
+            # Read from config file
+            self.config = self.parse_config_file()
+            with self.tracer.span("config resolution"):
+                self.get_eb_config()
+            self.setup_environments(self.config)
+        finally:
+            self.prefetcher.shutdown()
+            if self.trace_out:
+                self.tracer.write_report(self.trace_out)
+
+    def setup_environments(self, config):
+        if self.manifest:
+            return self.setup_from_manifest(config)
         # TODO: support worker tiers
         if not self.environment_name:
             self.environment_name = input("Input new environment name (lowercase-with-dashes): ")
+        if self.update:
+            return self.provision(config, self.region, self.environment_name, None, None)
+        if self.destroy:
+            self.confirm_destroy([self.environment_name])
+            return self.provision(config, self.region, self.environment_name, None, None)
         if self.db_only:
             cname_prefix = None
         else:
-            cname_prefix = input("Input new CNAME prefix (lowercase-with-dashes): ")
-        vpc_accessor = VPCAccessor(self.region)
-        vpcs = vpc_accessor.get_vpcs()
+            cname_prefix = self.cname_prefix or input("Input new CNAME prefix (lowercase-with-dashes): ")
+        vpc_id = self.vpc_id or self.select_vpc()
+        self.provision(
+            config, self.region, self.environment_name, cname_prefix, vpc_id, self.db_only, self.no_db,
+            self.vpc_accessor,
+        )
+    
+    def select_vpc(self):
+        vpcs = self.prefetcher.get("vpcs", self.vpc_accessor.get_vpcs)
         print("Current VPCS:")
         print(vpcs)
         if not(vpcs):
@@ -107,32 +252,239 @@ class SetupWrapper(object):
             input(f"Using VPC {vpc_id}.  Press [Enter] to confirm ([Ctrl] + [C] to cancel)")
         else:
             vpc_id = input("Input vpc_id: ")
-        eb_initializer = EBInitializer(self.region, config, self.application_name, self.environment_name, cname_prefix, vpc_id)
-        if not self.db_only:
+        return vpc_id
+    
+    def confirm_destroy(self, environment_names):
+        print(
+            f"This deletes {', '.join(environment_names)} along with the databases and other resources created for "
+            f"them, which cannot be undone."
+        )
+        expected = environment_names[0] if len(environment_names) == 1 else str(len(environment_names))
+        what = "the environment name" if len(environment_names) == 1 else "the number of environments"
+        if input(f"Type {what} to confirm: ").strip() != expected:
+            raise Exception("Destroy cancelled")
+    
+    def setup_from_manifest(self, config):
+        provisioner = ManifestProvisioner(self, config, self.manifest, self.max_per_region)
+        if self.destroy:
+            self.confirm_destroy([entry.environment_name for entry in provisioner.entries])
+        results = provisioner.run()
+        if any(result.error for result in results):
+            sys.exit(1)
+    
+    def provision(self, config, region, environment_name, cname_prefix, vpc_id, db_only=False, no_db=False,
+                  vpc_accessor=None):
+        """Run the non-interactive part of the setup for a single environment."""
+        from eb_create_environment.eb_setup import EBInitializer
+        if self.update:
+            return self.update_environment(config, region, environment_name)
+        if self.destroy:
+            return self.destroy_environment(region, environment_name)
+        state = ProvisioningState.load(environment_name, self.resume)
+        if state.is_complete("database_linked"):
+            print(f"Setup of {environment_name} already completed according to {state.path}")
+            return
+        vpc_accessor = vpc_accessor or VPCAccessor(region, self.clients, self.cache)
+        eb_initializer = EBInitializer(
+            region, config, self.application_name, environment_name, cname_prefix, vpc_id,
+            vpc_accessor=vpc_accessor, clients=self.clients, cache=self.cache, state=state,
+        )
+        db_initializer = None if no_db else self.get_db_initializer(config, eb_initializer)
+        if db_initializer:
+            db_initializer.check_restore_source()
+        with self.tracer.span("VPC discovery", environment=environment_name):
+            planner = PlacementPlanner(region, vpc_accessor, self.clients, self.cache)
+            placement = planner.plan(
+                vpc_id, config["ElasticBeanstalk"],
+                db_initializer.get_config_params() if db_initializer else None,
+                db_initializer.get_db_subnet_group_zones() if db_initializer else None,
+                eb_initializer.get_environment_subnets() if db_only else None,
+            )
+        placement.print_layout()
+        eb_initializer.placement = placement
+        if db_initializer:
+            db_initializer.placement = placement
+        if self.link_at_launch and db_initializer and not db_only:
+            return self.provision_linked_at_launch(eb_initializer, db_initializer)
+        if self.parallel and db_initializer:
+            return self.provision_in_parallel(eb_initializer, db_initializer, db_only)
+        if not db_only:
             print("\nLaunching EB environment")
             eb_initializer.set_up_environment()
             print("\nWaiting for EB environment to finish launching")
         application_security_group_id = eb_initializer.wait_for_environment()
         print("\nEB environment ready")
         
-        if self.no_db:
+        if no_db:
             return
         
         # Call rds setup
-        engine = Engine.postgres
         print("Setting up database")
-        db_initializer = DatabaseInitializer(
-            self.region, config, engine, vpc_id, self.environment_name, application_security_group_id
-        )
+        db_initializer.application_security_group_id = application_security_group_id
         database_url = db_initializer.create_db()
+        read_urls = db_initializer.create_read_replicas()
+        self.link_database(eb_initializer, database_url, read_urls)
+    
+    def update_environment(self, config, region, environment_name):
+        """Bring an existing EB environment in line with the config; its database is left as it is."""
+        from eb_create_environment.eb_setup import EBInitializer
+        eb_initializer = EBInitializer(
+            region, config, self.application_name, environment_name, None, None, clients=self.clients, cache=self.cache,
+        )
+        if eb_initializer.update_configuration():
+            print(f"Update started for {environment_name}")
+    
+    def destroy_environment(self, region, environment_name):
+        from eb_create_environment.teardown import EnvironmentTeardown
+        EnvironmentTeardown(
+            region, self.application_name, environment_name, self.final_snapshot, clients=self.clients,
+        ).run()
+    
+    def provision_in_parallel(self, eb_initializer, db_initializer, db_only=False):
+        """
+        Start the EB environment and the database back to back and wait for both at the same time.  The database
+        ingress rule is added as soon as the EB environment's security group is known.  If either wait fails, the
+        other is stopped so that the failure is reported straight away rather than after the other wait's timeout.
+        """
+        if not db_only:
+            print("\nLaunching EB environment")
+            eb_initializer.set_up_environment()
+        print("\nLaunching database")
+        db_initializer.start_db()
+        print("\nWaiting for EB environment and database")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            eb_future = executor.submit(
+                eb_initializer.wait_for_environment, on_security_group=db_initializer.authorize_application_access
+            )
+            db_future = executor.submit(self.wait_for_databases, db_initializer)
+            try:
+                wait([eb_future, db_future], return_when=FIRST_EXCEPTION)
+                for future in [eb_future, db_future]:
+                    if future.done():
+                        future.result()
+            except BaseException:
+                # Leaving the executor waits for both threads, so stop whichever is still polling
+                eb_initializer.cancel_waits()
+                db_initializer.cancel_waits()
+                raise
+        print("\nEB environment and database ready")
+        database_url, read_urls = db_future.result()
+        self.link_database(eb_initializer, database_url, read_urls)
+    
+    def wait_for_databases(self, db_initializer):
+        """Wait for the database, then create its read replicas; returns the database URL and the replicas' URLs."""
+        database_url = db_initializer.wait_for_db()
+        return database_url, db_initializer.create_read_replicas()
+    
+    def provision_linked_at_launch(self, eb_initializer, db_initializer):
+        """
+        Create the database first, admitting a security group made for the instances ahead of time, and launch the EB
+        environment with that security group and DATABASE_URL in its initial configuration.  The environment is
+        deployed once, instead of again when DATABASE_URL is added after launch.
+        """
+        print("\nLaunching database")
+        db_initializer.application_security_group_id = eb_initializer.create_application_security_group()
+        db_initializer.start_db()
+        print("\nWaiting for database endpoint")
+        database_url = db_initializer.wait_for_db()
+        print("\nLaunching EB environment")
+        created = eb_initializer.set_up_environment(environment_variables={"DATABASE_URL": database_url})
+        print("\nWaiting for EB environment to finish launching")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Replicas need the primary to be available, so they only get going while the environment launches
+            replicas_future = executor.submit(db_initializer.create_read_replicas)
+            eb_initializer.wait_for_environment()
+            read_urls = replicas_future.result()
+        if not created or read_urls:
+            # A reused environment has the previous run's DATABASE_URL, whose password has been reset since
+            return self.link_database(eb_initializer, database_url, read_urls)
+        eb_initializer.state.complete("database_linked")
+        print(f"Environment setup complete for {eb_initializer.environment_name}.")
+    
+    def get_db_initializer(self, config, eb_initializer):
+        from eb_create_environment.database import DatabaseInitializer, Engine
+        engine = Engine.postgres
+        return DatabaseInitializer(
+            eb_initializer.region, config, engine, eb_initializer.vpc_id, eb_initializer.environment_name, None,
+            vpc_accessor=eb_initializer.vpc_accessor, clients=self.clients, cache=self.cache,
+            state=eb_initializer.state,
+        )
+    
+    def link_database(self, eb_initializer, database_url, read_urls=None):
         print("Database ready. Linking database to EB environment.")
-        eb_initializer.update_environment_variables({
+        environment_variables = {
             "DATABASE_URL": database_url,
-        })
-        print("Environment setup complete.")
+        }
+        if read_urls:
+            environment_variables["DATABASE_READ_URLS"] = ",".join(read_urls)
+        eb_initializer.update_environment_variables(environment_variables)
+        eb_initializer.state.complete("database_linked")
+        print(f"Environment setup complete for {eb_initializer.environment_name}.")
+    
+    def start_prefetch(self):
+        """
+        Once the profile and region are known, start the lookups that later prompts and steps need so that they run
+        while the user is typing.  The catalog lookups land in the shared cache; the rest are read through
+        `self.prefetcher.get`.
+        """
+        self.prefetcher.schedule("applications", self.get_application_names)
+        if self.manifest or self.config is None or self.destroy:
+            return
+        if self.vpc_id and not self.update:
+            self.prefetcher.schedule("topology", self.vpc_accessor.get_topology, self.vpc_id)
+        elif not self.update:
+            self.prefetcher.schedule("vpcs", self.vpc_accessor.get_vpcs)
+        if not self.db_only:
+            from eb_create_environment.eb_setup import EBInitializer
+            eb_initializer = EBInitializer(
+                self.region, self.config, self.application_name, self.environment_name, None, None,
+                vpc_accessor=self.vpc_accessor, clients=self.clients, cache=self.cache,
+            )
+            if not self.update:
+                self.prefetcher.schedule("solution_stacks", eb_initializer.get_solution_stacks)
+            instance_type = eb_initializer.get_config_param("InstanceTypes")
+            if instance_type:
+                self.prefetcher.schedule(
+                    "instance_type_offerings", self.vpc_accessor.get_subnets_for_instance_type, instance_type
+                )
+                self.prefetcher.schedule("instance_type", self.prefetch_instance_type, eb_initializer)
+        if not self.no_db and not self.update:
+            from eb_create_environment.database import DatabaseInitializer, Engine
+            db_initializer = DatabaseInitializer(
+                self.region, self.config, Engine.postgres, None, self.environment_name, None,
+                vpc_accessor=self.vpc_accessor, clients=self.clients, cache=self.cache,
+            )
+            self.prefetcher.schedule("db_catalog", self.prefetch_db_catalog, db_initializer)
+    
+    def prefetch_db_catalog(self, db_initializer):
+        """Resolve the engine version, then look up which availability zones offer the DB instance class."""
+        params = db_initializer.get_config_params()
+        PlacementPlanner(self.region, self.vpc_accessor, self.clients, self.cache).get_db_availability_zones(
+            params["Engine"], params["EngineVersion"], params["DBInstanceClass"]
+        )
+    
+    def prefetch_instance_type(self, eb_initializer):
+        from eb_create_environment.instance_types import AUTO, InstanceTypeCatalog
+        worker_counts = [eb_initializer.get_config_param(name) for name in ("NumProcesses", "NumThreads")]
+        if AUTO in [str(count).lower() for count in worker_counts] or eb_initializer.get_config_param("Scaling"):
+            InstanceTypeCatalog(self.region, self.clients, self.cache).get_instance_type(
+                eb_initializer.get_config_param("InstanceTypes")
+            )
+    
+    def get_application_names(self):
+        eb_client = self.clients.client("elasticbeanstalk", self.region)
+        return [i["ApplicationName"] for i in eb_client.describe_applications()["Applications"]]
+    
+    def get_environment_names(self):
+        eb_client = self.clients.client("elasticbeanstalk", self.region)
+        return [
+            i["EnvironmentName"]
+            for i in eb_client.describe_environments(ApplicationName=self.application_name)["Environments"]
+        ]
     
     def get_eb_config(self):
         """Parse eb config file if it exists. Otherwise, ask for user input and create file."""
+        import yaml
         if os.path.isfile(EB_GLOBAL_CONFIG_FILE_PATH):
             with open(EB_GLOBAL_CONFIG_FILE_PATH) as config:
                 global_configs = yaml.load(config, Loader=yaml.FullLoader)["global"]
@@ -149,7 +501,7 @@ class SetupWrapper(object):
             if not self.profile:
                 self.profile = global_configs["profile"]
         
-        current_profiles = boto3.session.Session().available_profiles
+        current_profiles = self.clients.get_available_profiles()
         if not self.profile:
             print("Current profiles")
             print(sorted(current_profiles))
@@ -159,9 +511,14 @@ class SetupWrapper(object):
             raise Exception(f"Invalid profile {self.profile}")
         
         # Note that this must come after setting up profile so that we have the appropriate profile
-        boto3.setup_default_session(profile_name=self.profile)
-        ec2_client = boto3.client("ec2", "us-east-1")
-        region_names = [i["RegionName"] for i in ec2_client.describe_regions()["Regions"]]
+        self.clients.set_profile(self.profile)
+        self.cache.profile_name = self.profile
+        region_names = self.cache.get_or_fetch(
+            "us-east-1",
+            "ec2:describe_regions",
+            REGIONS_TTL,
+            lambda: [i["RegionName"] for i in self.clients.client("ec2", "us-east-1").describe_regions()["Regions"]],
+        )
         if not self.region:
             print("AWS regions:")
             print(sorted(region_names))
@@ -169,8 +526,9 @@ class SetupWrapper(object):
         if self.region not in region_names:
             raise Exception(f"Invalid region {self.region}")
         
-        eb_client = boto3.client("elasticbeanstalk", self.region)
-        current_applications = [i["ApplicationName"] for i in eb_client.describe_applications()["Applications"]]
+        self.vpc_accessor = VPCAccessor(self.region, self.clients, self.cache)
+        self.start_prefetch()
+        current_applications = self.prefetcher.get("applications", self.get_application_names)
         if not self.application_name:
             print("Current EB Applications:")
             print(sorted(current_applications))
@@ -187,12 +545,21 @@ class SetupWrapper(object):
         if not os.path.isfile(EB_GLOBAL_CONFIG_FILE_PATH):
             self.create_eb_config_file()
 
-        # Get existing environment for db-only calls
-        if self.db_only:
-            current_environments = [
-                i["EnvironmentName"]
-                for i in eb_client.describe_environments(ApplicationName=self.application_name)["Environments"]
-            ]
+        # Get existing environment for db-only and update calls; one being destroyed may be gone already
+        if self.destroy and not self.manifest and not self.environment_name:
+            print("Existing EB Environments:")
+            print(sorted(self.get_environment_names()))
+            self.environment_name = input("Input environment name: ")
+        if self.update and not self.manifest:
+            current_environments = self.get_environment_names()
+            if not self.environment_name:
+                print("Existing EB Environments:")
+                print(sorted(current_environments))
+                self.environment_name = input("Input environment name: ")
+            if self.environment_name not in current_environments:
+                raise Exception(f"Invalid environment name {self.environment_name}")
+        if self.db_only and not self.manifest:
+            current_environments = self.get_environment_names()
             if not self.environment_name:
                 print("Existing EB Environments:")
                 print(sorted(current_environments))
@@ -207,6 +574,7 @@ class SetupWrapper(object):
                     raise Exception(f"Invalid environment name {self.environment_name}")
     
     def create_eb_config_file(self):
+        import yaml
         config = yaml.dump(
             {
                 "global": {
@@ -222,6 +590,7 @@ class SetupWrapper(object):
             config_file.write(config)
 
     def parse_config_file(self):
+        import yaml
         with open(self.config_file_path) as config_file:
             configs = yaml.load(config_file, Loader=yaml.FullLoader)
         return configs
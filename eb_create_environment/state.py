@@ -0,0 +1,58 @@
+import json
+import os
+import threading
+
+
+STATE_DIRECTORY = ".elasticbeanstalk"
+
+
+class ProvisioningState(object):
+    """
+    Completed provisioning steps for one environment and the IDs of the resources they produced, saved as JSON after
+    every step so that a failed run can be resumed.  A state without a path is kept in memory only.
+    """
+    def __init__(self, path=None, steps=None):
+        self.path = path
+        self.steps = steps or {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def get_path(cls, environment_name):
+        return os.path.join(STATE_DIRECTORY, f"{environment_name}.state.json")
+
+    @classmethod
+    def load(cls, environment_name, resume=False):
+        """Load the saved state when resuming; otherwise start over (the file is replaced on the first save)."""
+        path = cls.get_path(environment_name)
+        steps = None
+        if resume:
+            if not os.path.isfile(path):
+                raise Exception(f"No saved state to resume for {environment_name} ({path})")
+            with open(path) as state_file:
+                steps = json.load(state_file)["steps"]
+        return cls(path, steps)
+
+    def get(self, step):
+        return self.steps.get(step)
+
+    def is_complete(self, step):
+        return step in self.steps
+
+    def complete(self, step, **resources):
+        with self.lock:
+            self.steps[step] = resources
+            self.save()
+
+    def discard(self, step):
+        with self.lock:
+            if self.steps.pop(step, None) is not None:
+                self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump({"steps": self.steps}, state_file, indent=2)
+        os.replace(temp_path, self.path)
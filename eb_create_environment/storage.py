@@ -0,0 +1,160 @@
+from eb_create_environment.instance_types import AUTO
+
+
+# gp3 volumes below this size (GiB, by engine) get a fixed baseline and do not take Iops or StorageThroughput; larger
+# ones are striped over four volumes
+GP3_STRIPING_THRESHOLD_GIB = {
+    "postgres": 400,
+    "mysql": 400,
+    "mariadb": 400,
+    "oracle-ee": 200,
+    "oracle-se2": 200,
+}
+DEFAULT_GP3_STRIPING_THRESHOLD_GIB = 400
+GP3_BASELINE_IOPS = 3000
+GP3_BASELINE_THROUGHPUT = 125
+GP3_STRIPED_BASELINE_IOPS = 12000
+GP3_STRIPED_BASELINE_THROUGHPUT = 500
+# gp2 IOPS are tied to size; volumes whose baseline is below the burst level can burst to it on I/O credits
+GP2_IOPS_PER_GIB = 3
+GP2_MIN_IOPS = 100
+GP2_MAX_IOPS = 16000
+GP2_BURST_IOPS = 3000
+PROVISIONED_IOPS_STORAGE_TYPES = ["io1", "io2"]
+
+# How much I/O "auto" Iops and StorageThroughput provision per GiB and per IOPS (MiB/s) for RDS.StorageWorkload
+STORAGE_WORKLOADS = {
+    # Small random reads and writes
+    "oltp": dict(IopsPerGiB=30, ThroughputPerIops=0.0625),
+    "mixed": dict(IopsPerGiB=15, ThroughputPerIops=0.125),
+    # Large sequential scans
+    "analytics": dict(IopsPerGiB=5, ThroughputPerIops=0.25),
+}
+
+
+class StorageSizing(object):
+    """Resolved storage settings and the baseline performance they give."""
+    def __init__(self, storage_type, allocated_storage, iops=None, storage_throughput=None, baseline_iops=None,
+                 baseline_throughput=None, burst_iops=None):
+        self.storage_type = storage_type
+        self.allocated_storage = allocated_storage
+        self.iops = iops
+        self.storage_throughput = storage_throughput
+        self.baseline_iops = baseline_iops
+        self.baseline_throughput = baseline_throughput
+        self.burst_iops = burst_iops
+
+    def describe(self):
+        description = f"{self.allocated_storage} GiB {self.storage_type}, {self.baseline_iops} IOPS"
+        if self.burst_iops:
+            description += f" (bursting to {self.burst_iops})"
+        if self.baseline_throughput:
+            description += f" and {self.baseline_throughput} MiB/s"
+        provisioned = self.iops is not None or self.storage_throughput is not None
+        return description + (" provisioned" if provisioned else " baseline")
+
+
+def get_range(option, minimum_fields, maximum_fields):
+    """The tightest [low, high] allowed by whichever of the orderable option's limit fields it reports."""
+    low = max([0] + [option[field] * factor for field, factor in minimum_fields if option.get(field) is not None])
+    high = min([float("inf")] + [option[field] * factor for field, factor in maximum_fields if option.get(field) is not None])
+    return low, high
+
+
+def fit(name, value, low, high, explicit, context):
+    """Clamp a derived value into [low, high]; raise if an explicit one is outside it."""
+    if low > high:
+        raise Exception(f"No {name} value is allowed for {context}")
+    if explicit:
+        if not low <= value <= high:
+            raise Exception(f"{name} {value} is outside the allowed {int(low)}-{int(high)} for {context}")
+        return value
+    return int(min(max(value, low), high))
+
+
+def resolve_storage(params, workload_name, orderable_options):
+    """
+    Check StorageType, AllocatedStorage, Iops and StorageThroughput from the RDS create `params` against the orderable
+    options of the engine version and instance class, and size any Iops or StorageThroughput set to "auto" for the
+    workload.  Returns a StorageSizing.
+    """
+    storage_type = params["StorageType"]
+    size = int(params["AllocatedStorage"])
+    iops = params.get("Iops")
+    throughput = params.get("StorageThroughput")
+    context = f"{size} GiB of {storage_type} on {params['DBInstanceClass']} ({params['Engine']} {params['EngineVersion']})"
+    if workload_name not in STORAGE_WORKLOADS:
+        raise Exception(f"Unknown storage workload `{workload_name}`; expected one of {', '.join(STORAGE_WORKLOADS)}")
+    workload = STORAGE_WORKLOADS[workload_name]
+
+    option = next((option for option in orderable_options if option.get("StorageType") == storage_type), None)
+    if option is None:
+        offered = sorted({option["StorageType"] for option in orderable_options if option.get("StorageType")})
+        raise Exception(
+            f"{storage_type} storage is not offered for {params['DBInstanceClass']} ({params['Engine']} "
+            f"{params['EngineVersion']}); expected one of {', '.join(offered)}"
+        )
+    size = fit(
+        "AllocatedStorage", size, *get_range(option, [("MinStorageSize", 1)], [("MaxStorageSize", 1)]), True,
+        f"{storage_type} on {params['DBInstanceClass']}",
+    )
+
+    if storage_type not in ["gp3", *PROVISIONED_IOPS_STORAGE_TYPES]:
+        if iops is not None or throughput is not None:
+            raise Exception("Iops and StorageThroughput only apply to gp3, io1 and io2 storage")
+        baseline_iops = min(GP2_MAX_IOPS, max(GP2_MIN_IOPS, size * GP2_IOPS_PER_GIB))
+        burst_iops = GP2_BURST_IOPS if baseline_iops < GP2_BURST_IOPS else None
+        return StorageSizing(storage_type, size, baseline_iops=baseline_iops, burst_iops=burst_iops)
+
+    if storage_type == "gp3":
+        threshold = GP3_STRIPING_THRESHOLD_GIB.get(params["Engine"], DEFAULT_GP3_STRIPING_THRESHOLD_GIB)
+        if size < threshold:
+            if iops not in [None, AUTO] or throughput not in [None, AUTO]:
+                raise Exception(
+                    f"gp3 volumes under {threshold} GiB have a fixed {GP3_BASELINE_IOPS} IOPS and "
+                    f"{GP3_BASELINE_THROUGHPUT} MiB/s; raise AllocatedStorage to {threshold} or remove Iops and "
+                    f"StorageThroughput"
+                )
+            return StorageSizing(
+                storage_type, size, baseline_iops=GP3_BASELINE_IOPS, baseline_throughput=GP3_BASELINE_THROUGHPUT,
+            )
+    elif throughput is not None:
+        raise Exception(f"StorageThroughput only applies to gp3 storage; {storage_type} throughput follows Iops")
+    elif iops is None:
+        raise Exception(f"{storage_type} storage requires Iops (a number or \"auto\")")
+
+    if iops is not None:
+        explicit = iops != AUTO
+        if not explicit:
+            iops = size * workload["IopsPerGiB"]
+            if storage_type == "gp3":
+                iops = max(iops, GP3_STRIPED_BASELINE_IOPS)
+        iops = fit("Iops", iops, *get_range(
+            option,
+            [("MinIopsPerDbInstance", 1), ("MinIopsPerGib", size)],
+            [("MaxIopsPerDbInstance", 1), ("MaxIopsPerGib", size)],
+        ), explicit, context)
+    if storage_type in PROVISIONED_IOPS_STORAGE_TYPES:
+        return StorageSizing(storage_type, size, iops=iops, baseline_iops=iops)
+
+    if iops is None and throughput is None:
+        return StorageSizing(
+            storage_type, size, baseline_iops=GP3_STRIPED_BASELINE_IOPS,
+            baseline_throughput=GP3_STRIPED_BASELINE_THROUGHPUT,
+        )
+    # gp3 takes Iops and StorageThroughput together; the one left out stays at its baseline
+    iops = iops or GP3_STRIPED_BASELINE_IOPS
+    explicit = throughput not in [None, AUTO]
+    if throughput is None:
+        throughput = GP3_STRIPED_BASELINE_THROUGHPUT
+    elif throughput == AUTO:
+        throughput = max(GP3_STRIPED_BASELINE_THROUGHPUT, iops * workload["ThroughputPerIops"])
+    throughput = fit("StorageThroughput", throughput, *get_range(
+        option,
+        [("MinStorageThroughputPerDbInstance", 1), ("MinStorageThroughputPerIops", iops)],
+        [("MaxStorageThroughputPerDbInstance", 1), ("MaxStorageThroughputPerIops", iops)],
+    ), explicit, context)
+    return StorageSizing(
+        storage_type, size, iops=iops, storage_throughput=throughput, baseline_iops=iops,
+        baseline_throughput=throughput,
+    )
@@ -0,0 +1,336 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+from eb_create_environment.clients import ClientPool
+from eb_create_environment.state import ProvisioningState
+from eb_create_environment.utils import poll_until
+
+
+DEFAULT_TEARDOWN_TIMEOUT = 3600
+EB_EXPECTED_TERMINATE_SECONDS = 300
+DB_EXPECTED_DELETE_SECONDS = 600
+PROXY_EXPECTED_DELETE_SECONDS = 120
+# Network interfaces of a deleted database or proxy keep its security group in use for a few minutes
+SECURITY_GROUP_RELEASE_TIMEOUT = 900
+SECURITY_GROUP_EXPECTED_RELEASE_SECONDS = 120
+# Subnet groups created by DatabaseInitializer.create_db_subnet_group are named `default-{vpc_id}`
+CREATED_SUBNET_GROUP_PREFIX = "default-vpc-"
+
+
+class Task(object):
+    def __init__(self, name, function, depends_on=()):
+        self.name = name
+        self.function = function
+        self.depends_on = list(depends_on)
+
+
+def run_tasks(tasks):
+    """
+    Run `tasks` concurrently, each as soon as every task it depends on has succeeded; a task whose dependency failed is
+    skipped.  Returns {task name: None if it succeeded, otherwise why not}.
+    """
+    results = {}
+    pending = list(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=len(tasks) or 1, thread_name_prefix="teardown") as executor:
+        while pending or running:
+            for task in list(pending):
+                failed = [name for name in task.depends_on if results.get(name)]
+                if failed:
+                    results[task.name] = f"skipped because {', '.join(failed)} failed"
+                    pending.remove(task)
+                elif all(name in results for name in task.depends_on):
+                    running[executor.submit(task.function)] = task
+                    pending.remove(task)
+            if not running:
+                # Only reachable if a dependency names a task that is not in `tasks`
+                for task in pending:
+                    results[task.name] = "skipped because of an unknown dependency"
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    future.result()
+                    results[task.name] = None
+                except Exception as e:
+                    results[task.name] = f"{type(e).__name__}: {e}"
+    return results
+
+
+class EnvironmentTeardown(object):
+    """
+    Deletes what setup created for one environment, found by the names setup gives it: the EB environment and any
+    `{env}-app` security group, the `{env}-db` instance, its `{env}-db-replica-{n}` read replicas and its security
+    group, the RDS Proxy (`{env}-proxy`, with its `{env}-db-proxy` security group and role and its
+    `{env}-db-credentials` secret) and the VPC's `default-{vpc_id}` subnet group if no other database uses it.
+    Security groups are only looked up in the environment's VPC, as recorded in the saved state or reported by the
+    database or the EB environment.  Independent deletions run at the same time and each security group goes once
+    whatever used it is gone.  Resources that no longer exist are skipped, so an interrupted teardown can be run again.
+    Parameter groups and the Enhanced Monitoring role are shared between environments and kept.
+    """
+    def __init__(self, region, application_name, environment_name, final_snapshot=False, clients=None):
+        self.region = region
+        self.application_name = application_name
+        self.environment_name = environment_name
+        self.final_snapshot = final_snapshot
+        self.clients = clients or ClientPool()
+        self.db_name = f"{environment_name}-db"
+        self.proxy_name = f"{environment_name}-proxy"
+        self.db_security_group_names = [f"{environment_name}-db", f"{environment_name}-db-proxy"]
+        # Created ahead of the environment by --link-at-launch
+        self.application_security_group_name = f"{environment_name}-app"
+        self.rds_client = self.clients.client("rds", region)
+        self.ec2_client = self.clients.client("ec2", region)
+        self.state_path = ProvisioningState.get_path(environment_name)
+        self.recorded_steps = self.load_recorded_steps()
+        self.db_subnet_group_name = (self.recorded_steps.get("db_subnet_group") or {}).get("db_subnet_group_name")
+        self.security_groups = []
+
+    def log(self, message):
+        print(f"{self.environment_name}: {message}")
+
+    def load_recorded_steps(self):
+        if not os.path.isfile(self.state_path):
+            return {}
+        return ProvisioningState.load(self.environment_name, resume=True).steps
+
+    def get_tasks(self):
+        return [
+            Task("db ingress rules", self.revoke_ingress),
+            # EB cannot delete the environment's security group while the database's rules refer to it
+            Task("EB environment", self.terminate_environment, ["db ingress rules"]),
+            Task("read replicas", self.delete_read_replicas),
+            # Deleting the primary first would promote the replicas to standalone databases
+            Task("database", self.delete_db_instance, ["read replicas"]),
+            Task("database proxy", self.delete_proxy),
+            Task("proxy secret", self.delete_proxy_secret, ["database proxy"]),
+            Task("proxy role", self.delete_proxy_role, ["database proxy"]),
+            Task(
+                "database security groups",
+                lambda: self.delete_security_groups(self.db_security_group_names),
+                ["db ingress rules", "database", "database proxy"],
+            ),
+            Task(
+                "application security group",
+                lambda: self.delete_security_groups([self.application_security_group_name]),
+                ["db ingress rules", "EB environment"],
+            ),
+            Task("subnet group", self.delete_subnet_group, ["database"]),
+        ]
+
+    def run(self):
+        """Delete everything, raising if anything could not be deleted; the state file goes last."""
+        with self.clients.tracer.span("teardown", environment=self.environment_name):
+            vpc_id = self.find_vpc_id()
+            if vpc_id:
+                self.security_groups = self.find_security_groups(vpc_id)
+            else:
+                self.log("no EB environment, database or saved state to find the VPC; security groups not looked up")
+            results = run_tasks(self.get_tasks())
+        failures = {name: error for name, error in results.items() if error}
+        if failures:
+            for name, error in failures.items():
+                self.log(f"{name} not deleted: {error}")
+            raise Exception(f"Teardown of {self.environment_name} incomplete; run it again to retry")
+        if os.path.isfile(self.state_path):
+            os.remove(self.state_path)
+        self.log("teardown complete")
+
+    def find_vpc_id(self):
+        """The environment's VPC, from the saved state, the database's subnet group or the EB environment's settings."""
+        for step in self.recorded_steps.values():
+            if step.get("vpc_id"):
+                return step["vpc_id"]
+        db_instance = self.describe_db_instance(self.db_name)
+        if db_instance and db_instance.get("DBSubnetGroup"):
+            return db_instance["DBSubnetGroup"]["VpcId"]
+        eb_client = self.clients.client("elasticbeanstalk", self.region)
+        environments = eb_client.describe_environments(
+            ApplicationName=self.application_name, EnvironmentNames=[self.environment_name], IncludeDeleted=False,
+        )["Environments"]
+        if not any(environment["Status"] != "Terminated" for environment in environments):
+            return None
+        settings = eb_client.describe_configuration_settings(
+            ApplicationName=self.application_name, EnvironmentName=self.environment_name,
+        )["ConfigurationSettings"][0]["OptionSettings"]
+        return next(
+            (setting.get("Value") for setting in settings
+             if setting["Namespace"] == "aws:ec2:vpc" and setting["OptionName"] == "VPCId"),
+            None,
+        )
+
+    def find_security_groups(self, vpc_id):
+        names = [*self.db_security_group_names, self.application_security_group_name]
+        return self.ec2_client.describe_security_groups(Filters=[
+            {"Name": "vpc-id", "Values": [vpc_id]},
+            {"Name": "group-name", "Values": names},
+            {"Name": "tag:Name", "Values": names},
+        ])["SecurityGroups"]
+
+    def revoke_ingress(self):
+        for security_group in self.security_groups:
+            if security_group.get("IpPermissions"):
+                self.ec2_client.revoke_security_group_ingress(
+                    GroupId=security_group["GroupId"], IpPermissions=security_group["IpPermissions"],
+                )
+
+    def terminate_environment(self):
+        eb_client = self.clients.client("elasticbeanstalk", self.region)
+        environments = [
+            environment
+            for environment in eb_client.describe_environments(
+                ApplicationName=self.application_name,
+                EnvironmentNames=[self.environment_name],
+                IncludeDeleted=False,
+            )["Environments"]
+            if environment["Status"] != "Terminated"
+        ]
+        if not environments:
+            self.log("no EB environment")
+            return
+        environment_id = environments[0]["EnvironmentId"]
+        if environments[0]["Status"] != "Terminating":
+            self.log(f"terminating EB environment {environment_id}")
+            eb_client.terminate_environment(EnvironmentId=environment_id, TerminateResources=True)
+
+        def check():
+            remaining = eb_client.describe_environments(
+                ApplicationName=self.application_name, EnvironmentIds=[environment_id],
+            )["Environments"]
+            return True if not remaining or remaining[0]["Status"] == "Terminated" else None
+
+        if poll_until(check, DEFAULT_TEARDOWN_TIMEOUT, EB_EXPECTED_TERMINATE_SECONDS) is None:
+            raise Exception(f"EB environment still terminating after {DEFAULT_TEARDOWN_TIMEOUT} seconds")
+        self.log("EB environment terminated")
+
+    def describe_db_instance(self, db_instance_identifier):
+        try:
+            return self.rds_client.describe_db_instances(
+                DBInstanceIdentifier=db_instance_identifier
+            )["DBInstances"][0]
+        except self.rds_client.exceptions.DBInstanceNotFoundFault:
+            return None
+
+    def delete_read_replicas(self):
+        """Delete the primary's `{env}-db-replica-{n}` replicas, all at the same time, without final snapshots."""
+        primary = self.describe_db_instance(self.db_name)
+        replica_names = [
+            replica_name
+            for replica_name in (primary or {}).get("ReadReplicaDBInstanceIdentifiers", [])
+            if replica_name.startswith(f"{self.db_name}-replica-")
+        ]
+        if not replica_names:
+            return
+        with ThreadPoolExecutor(max_workers=len(replica_names), thread_name_prefix="replica") as executor:
+            futures = [
+                executor.submit(self.delete_db_instance, replica_name, final_snapshot=False)
+                for replica_name in replica_names
+            ]
+            for future in futures:
+                future.result()
+
+    def delete_db_instance(self, db_instance_identifier=None, final_snapshot=None):
+        db_instance_identifier = db_instance_identifier or self.db_name
+        final_snapshot = self.final_snapshot if final_snapshot is None else final_snapshot
+        db_instance = self.describe_db_instance(db_instance_identifier)
+        if db_instance is None:
+            self.log(f"no database {db_instance_identifier}")
+            return
+        if db_instance.get("DBSubnetGroup"):
+            self.db_subnet_group_name = db_instance["DBSubnetGroup"]["DBSubnetGroupName"]
+        if db_instance["DBInstanceStatus"] != "deleting":
+            if db_instance.get("DeletionProtection"):
+                raise Exception(f"{db_instance_identifier} has deletion protection enabled; turn it off to delete it")
+            if final_snapshot:
+                snapshot_identifier = f"{db_instance_identifier}-final-{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+                self.log(f"deleting database {db_instance_identifier} after snapshot {snapshot_identifier}")
+                params = dict(FinalDBSnapshotIdentifier=snapshot_identifier)
+            else:
+                self.log(f"deleting database {db_instance_identifier} without a final snapshot")
+                params = dict(SkipFinalSnapshot=True)
+            self.rds_client.delete_db_instance(DBInstanceIdentifier=db_instance_identifier, **params)
+
+        def check():
+            return True if self.describe_db_instance(db_instance_identifier) is None else None
+
+        if poll_until(check, DEFAULT_TEARDOWN_TIMEOUT, DB_EXPECTED_DELETE_SECONDS) is None:
+            raise Exception(f"{db_instance_identifier} still deleting after {DEFAULT_TEARDOWN_TIMEOUT} seconds")
+        self.log(f"database {db_instance_identifier} deleted")
+
+    def describe_proxy(self):
+        try:
+            return self.rds_client.describe_db_proxies(DBProxyName=self.proxy_name)["DBProxies"][0]
+        except self.rds_client.exceptions.DBProxyNotFoundFault:
+            return None
+
+    def delete_proxy(self):
+        proxy = self.describe_proxy()
+        if proxy is None:
+            return
+        if proxy["Status"] != "deleting":
+            self.log(f"deleting database proxy {self.proxy_name}")
+            self.rds_client.delete_db_proxy(DBProxyName=self.proxy_name)
+        if poll_until(lambda: True if self.describe_proxy() is None else None, DEFAULT_TEARDOWN_TIMEOUT,
+                      PROXY_EXPECTED_DELETE_SECONDS) is None:
+            raise Exception(f"{self.proxy_name} still deleting after {DEFAULT_TEARDOWN_TIMEOUT} seconds")
+        self.log(f"database proxy {self.proxy_name} deleted")
+
+    def delete_proxy_secret(self):
+        secrets_client = self.clients.client("secretsmanager", self.region)
+        try:
+            # Without recovery, so that setting the environment up again can reuse the name straight away
+            secrets_client.delete_secret(
+                SecretId=f"{self.environment_name}-db-credentials", ForceDeleteWithoutRecovery=True,
+            )
+        except secrets_client.exceptions.ResourceNotFoundException:
+            pass
+
+    def delete_proxy_role(self):
+        iam_client = self.clients.client("iam", self.region)
+        role_name = f"{self.environment_name}-db-proxy"
+        try:
+            iam_client.delete_role_policy(RoleName=role_name, PolicyName="read-db-credentials")
+        except iam_client.exceptions.NoSuchEntityException:
+            pass
+        try:
+            iam_client.delete_role(RoleName=role_name)
+        except iam_client.exceptions.NoSuchEntityException:
+            pass
+
+    def delete_security_groups(self, names):
+        for security_group in self.security_groups:
+            if security_group["GroupName"] in names:
+                self.delete_security_group(security_group["GroupId"])
+
+    def delete_security_group(self, security_group_id):
+        def attempt():
+            try:
+                self.ec2_client.delete_security_group(GroupId=security_group_id)
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "DependencyViolation":
+                    return None
+                if e.response["Error"]["Code"] != "InvalidGroup.NotFound":
+                    raise
+            return True
+
+        if poll_until(attempt, SECURITY_GROUP_RELEASE_TIMEOUT, SECURITY_GROUP_EXPECTED_RELEASE_SECONDS) is None:
+            raise Exception(f"Security group {security_group_id} still in use after {SECURITY_GROUP_RELEASE_TIMEOUT} seconds")
+        self.log(f"security group {security_group_id} deleted")
+
+    def delete_subnet_group(self):
+        name = self.db_subnet_group_name
+        if not name or not name.startswith(CREATED_SUBNET_GROUP_PREFIX):
+            return
+        # RDS refuses to delete a subnet group that another database still uses
+        try:
+            self.rds_client.delete_db_subnet_group(DBSubnetGroupName=name)
+        except self.rds_client.exceptions.DBSubnetGroupNotFoundFault:
+            return
+        except self.rds_client.exceptions.InvalidDBSubnetGroupStateFault:
+            self.log(f"keeping subnet group {name}, used by another database")
+            return
+        self.log(f"subnet group {name} deleted")
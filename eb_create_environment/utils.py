@@ -1,5 +1,7 @@
 import random
+import re
 import string
+import time
 
 
 def generate_secure_password(length=32):
@@ -21,3 +23,61 @@ def poll_options(options):
         except IndexError:
             pass
     return selected_option
+
+
+def get_poll_interval(elapsed, expected_duration, min_interval=5, max_interval=30):
+    """
+    Poll quickly at first to catch early failures, back off through the slow middle of an operation, and tighten
+    again as the expected completion time approaches or passes.
+    """
+    if elapsed < min(60, expected_duration / 10):
+        return min_interval
+    remaining = expected_duration - elapsed
+    if remaining <= 0:
+        return min(max_interval, min_interval * 2)
+    return max(min_interval, min(max_interval, remaining / 4))
+
+
+def poll_until(check, timeout, expected_duration, min_interval=5, max_interval=30, cancel=None):
+    """
+    Call `check` until it returns something other than None, sleeping an adaptive interval between calls.
+    Returns None if `timeout` seconds pass first, or as soon as the `cancel` threading.Event, if given, is set.
+    """
+    start = time.monotonic()
+    while True:
+        result = check()
+        if result is not None:
+            return result
+        elapsed = time.monotonic() - start
+        remaining = timeout - elapsed
+        if remaining <= 0:
+            return None
+        interval = min(remaining, get_poll_interval(elapsed, expected_duration, min_interval, max_interval))
+        if cancel is None:
+            time.sleep(interval)
+        elif cancel.wait(interval):
+            return None
+
+
+def version_sort_key(version):
+    """Sort key comparing version strings component-wise, so that "17.10" sorts after "17.9"."""
+    return tuple(
+        (0, int(part)) if part.isdigit() else (1, part)
+        for part in re.split(r"[.\-_]", version)
+    )
+
+
+def get_static_version_prefix(version_pattern):
+    """The part of an fnmatch version pattern before its first wildcard, without a trailing separator."""
+    return re.split(r"[*?\[]", version_pattern, maxsplit=1)[0].rstrip(".-_")
+
+
+def merge_config(base, overrides):
+    """Return a copy of `base` with `overrides` applied recursively; nested dicts are merged, other values replaced."""
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
@@ -1,67 +1,124 @@
-import boto3
+import threading
+
+from eb_create_environment.cache import DiskCache, INSTANCE_TYPE_OFFERINGS_TTL
+from eb_create_environment.clients import ClientPool
+
+
+class VPCTopology(object):
+    """
+    Snapshot of a single VPC's subnets and route tables, indexed by subnet, availability zone and public/private
+    status.  Built from a handful of filtered `describe_subnets`/`describe_route_tables` pages instead of walking
+    every route table in the region.
+    """
+    def __init__(self, vpc_id, subnets, route_tables):
+        self.vpc_id = vpc_id
+        self.availability_zones = {subnet["SubnetId"]: subnet["AvailabilityZone"] for subnet in subnets}
+        self.subnets_by_az = {}
+        for subnet_id, availability_zone in self.availability_zones.items():
+            self.subnets_by_az.setdefault(availability_zone, []).append(subnet_id)
+
+        main_route_table_public = False
+        public_subnet_ids = set()
+        private_subnet_ids = set()
+        for route_table in route_tables:
+            is_public = self.is_route_table_public(route_table)
+            for association in route_table.get("Associations", []):
+                if association.get("Main"):
+                    main_route_table_public = is_public
+                if association.get("SubnetId"):
+                    if is_public:
+                        public_subnet_ids.add(association["SubnetId"])
+                    else:
+                        private_subnet_ids.add(association["SubnetId"])
+        # Subnets without an explicit association use the main route table
+        for subnet_id in self.availability_zones:
+            if subnet_id not in public_subnet_ids and subnet_id not in private_subnet_ids:
+                if main_route_table_public:
+                    public_subnet_ids.add(subnet_id)
+                else:
+                    private_subnet_ids.add(subnet_id)
+        self.public_subnet_ids = public_subnet_ids
+        self.private_subnet_ids = private_subnet_ids
+
+    @staticmethod
+    def is_route_table_public(route_table):
+        return any(
+            route.get('DestinationCidrBlock') == '0.0.0.0/0' and route.get('GatewayId') is not None
+            for route in route_table.get("Routes", [])
+        )
+
+    def get_subnets(self, public=True, availability_zones=None):
+        """Return {subnet_id: availability_zone}, optionally restricted to the given availability zones."""
+        subnet_ids = self.public_subnet_ids if public else self.private_subnet_ids
+        return {
+            subnet_id: availability_zone for subnet_id, availability_zone in self.availability_zones.items()
+            if subnet_id in subnet_ids and (availability_zones is None or availability_zone in availability_zones)
+        }
 
 
 class VPCAccessor(object):
-    def __init__(self, region):
+    def __init__(self, region, clients=None, cache=None):
         self.region = region
-    
-    def get_ec2_resources(self):
-        return boto3.resource("ec2", self.region)
-    
+        self.clients = clients or ClientPool()
+        self.cache = cache or DiskCache(enabled=False)
+        self._topologies = {}
+        self._topology_lock = threading.Lock()
+
+    def get_ec2_client(self):
+        return self.clients.client("ec2", self.region)
+
     def get_vpcs(self):
-        ec2_resources = self.get_ec2_resources()
         vpcs = {}
-        for vpc in ec2_resources.vpcs.all():
-            vpcs[vpc.id] = None
-            if vpc.is_default:
-                vpcs[vpc.id] = "Default"
-            if vpc.tags:
-                name_tags = [tag["Value"] for tag in vpc.tags if tag["Key"] == "Name"]
+        for page in self.get_ec2_client().get_paginator("describe_vpcs").paginate():
+            for vpc in page["Vpcs"]:
+                vpcs[vpc["VpcId"]] = None
+                if vpc.get("IsDefault"):
+                    vpcs[vpc["VpcId"]] = "Default"
+                name_tags = [tag["Value"] for tag in vpc.get("Tags", []) if tag["Key"] == "Name"]
                 if name_tags:
-                    vpcs[vpc.id] = name_tags[0]
+                    vpcs[vpc["VpcId"]] = name_tags[0]
         return vpcs
-    
+
+    def get_topology(self, vpc_id):
+        """Fetch (once per accessor) the subnet and route table layout of a VPC."""
+        with self._topology_lock:
+            return self._get_topology(vpc_id)
+
+    def _get_topology(self, vpc_id):
+        if vpc_id not in self._topologies:
+            client = self.get_ec2_client()
+            vpc_filter = [{"Name": "vpc-id", "Values": [vpc_id]}]
+            subnets = [
+                subnet
+                for page in client.get_paginator("describe_subnets").paginate(Filters=vpc_filter)
+                for subnet in page["Subnets"]
+            ]
+            route_tables = [
+                route_table
+                for page in client.get_paginator("describe_route_tables").paginate(Filters=vpc_filter)
+                for route_table in page["RouteTables"]
+            ]
+            self._topologies[vpc_id] = VPCTopology(vpc_id, subnets, route_tables)
+        return self._topologies[vpc_id]
+
     def get_subnets(self, vpc_id, public=True, instance_type=None):
-        ec2_resources = self.get_ec2_resources()
-        vpc = ec2_resources.Vpc(vpc_id)
+        supported_availability_zones = None
         if instance_type:
-            supported_subnets = self.get_subnets_for_instance_type(instance_type)
-        subnets = {}
-        for subnet in vpc.subnets.all():
-            if instance_type and subnet.availability_zone not in supported_subnets:
-                continue
-            subnets[subnet.id] = subnet.availability_zone
-        public_subnets = {}
-        private_subnets = {}
-        
-        route_tables = ec2_resources.route_tables.all()
-        main_route_table_public = False
-        for route_table in route_tables:
-            if route_table.vpc.id != vpc_id:
-                continue
-            is_public = self.is_route_table_public(route_table)
-            for association in route_table.associations:
-                if association.main:
-                    main_route_table_public = is_public
-                if association.subnet:
-                    if is_public:
-                        public_subnets[association.subnet.id] = subnets.pop(association.subnet.id, None)
-                    else:
-                        private_subnets[association.subnet.id] = subnets.pop(association.subnet.id, None)
-        if main_route_table_public:
-            public_subnets.update(subnets)
-        else:
-            private_subnets.update(subnets)
-    
-        if public:
-            return public_subnets
-        else:
-            return private_subnets
-    
-    def is_route_table_public(self, route_table):
-        return any(ra.get('DestinationCidrBlock') == '0.0.0.0/0' and ra.get('GatewayId') is not None for ra in route_table.routes_attribute)
-    
+            supported_availability_zones = self.get_subnets_for_instance_type(instance_type)
+        return self.get_topology(vpc_id).get_subnets(public, supported_availability_zones)
+
     def get_subnets_for_instance_type(self, instance_type):
-        client = boto3.client("ec2", self.region)
-        ret = client.describe_instance_type_offerings(LocationType="availability-zone", Filters=[{"Name": "instance-type", "Values": [instance_type]}])
-        return [i["Location"] for i in ret["InstanceTypeOfferings"]]
+        return self.cache.get_or_fetch(
+            self.region,
+            f"ec2:describe_instance_type_offerings:{instance_type}",
+            INSTANCE_TYPE_OFFERINGS_TTL,
+            lambda: self.fetch_availability_zones_for_instance_type(instance_type),
+        )
+
+    def fetch_availability_zones_for_instance_type(self, instance_type):
+        paginator = self.get_ec2_client().get_paginator("describe_instance_type_offerings")
+        pages = paginator.paginate(
+            LocationType="availability-zone",
+            Filters=[{"Name": "instance-type", "Values": [instance_type]}],
+        )
+        return [i["Location"] for page in pages for i in page["InstanceTypeOfferings"]]
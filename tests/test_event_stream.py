@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+
+from eb_create_environment.eb_setup import EVENT_CLOCK_SKEW, EnvironmentEventStream
+
+
+LAUNCH_TIME = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeEventsPaginator(object):
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, ApplicationName, EnvironmentName, StartTime):
+        self.client.start_times.append(StartTime)
+        # Newest first, like describe_events, and StartTime is inclusive
+        events = sorted(
+            (event for event in self.client.events if event["EventDate"] >= StartTime),
+            key=lambda event: event["EventDate"], reverse=True,
+        )
+        yield {"Events": events[:2]}
+        if events[2:]:
+            yield {"Events": events[2:]}
+
+
+class FakeEBClient(object):
+    def __init__(self):
+        self.events = []
+        self.start_times = []
+
+    def add_event(self, seconds, message):
+        self.events.append({"EventDate": LAUNCH_TIME + timedelta(seconds=seconds), "Message": message})
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "describe_events"
+        return FakeEventsPaginator(self)
+
+
+def get_messages(events):
+    return [event["Message"] for event in events]
+
+
+def test_first_poll_starts_before_launch_to_allow_for_clock_skew():
+    client = FakeEBClient()
+    client.add_event(-30, "createEnvironment is starting.")
+    stream = EnvironmentEventStream(client, "app", "env", LAUNCH_TIME)
+    assert get_messages(stream.poll()) == ["createEnvironment is starting."]
+    assert client.start_times == [LAUNCH_TIME - EVENT_CLOCK_SKEW]
+
+
+def test_events_are_returned_oldest_first_across_pages():
+    client = FakeEBClient()
+    for seconds in [3, 1, 2]:
+        client.add_event(seconds, f"event {seconds}")
+    stream = EnvironmentEventStream(client, "app", "env", LAUNCH_TIME)
+    assert get_messages(stream.poll()) == ["event 1", "event 2", "event 3"]
+
+
+def test_events_are_returned_once():
+    client = FakeEBClient()
+    client.add_event(1, "event 1")
+    stream = EnvironmentEventStream(client, "app", "env", LAUNCH_TIME)
+    stream.poll()
+    assert stream.poll() == []
+    client.add_event(5, "event 5")
+    assert get_messages(stream.poll()) == ["event 5"]
+
+
+def test_polls_start_at_newest_event_seen():
+    client = FakeEBClient()
+    client.add_event(1, "event 1")
+    client.add_event(4, "event 4")
+    stream = EnvironmentEventStream(client, "app", "env", LAUNCH_TIME)
+    stream.poll()
+    stream.poll()
+    assert client.start_times[-1] == LAUNCH_TIME + timedelta(seconds=4)
+
+
+def test_new_event_at_same_time_as_newest_seen_is_returned():
+    client = FakeEBClient()
+    client.add_event(4, "event A")
+    stream = EnvironmentEventStream(client, "app", "env", LAUNCH_TIME)
+    stream.poll()
+    client.add_event(4, "event B")
+    assert get_messages(stream.poll()) == ["event B"]
+    assert stream.poll() == []
+
+
+def test_no_events_keeps_cursor():
+    client = FakeEBClient()
+    stream = EnvironmentEventStream(client, "app", "env", LAUNCH_TIME)
+    assert stream.poll() == []
+    assert stream.poll() == []
+    assert client.start_times == [LAUNCH_TIME - EVENT_CLOCK_SKEW] * 2
@@ -0,0 +1,58 @@
+import pytest
+
+from eb_create_environment.parameter_groups import MAX_CONNECTIONS, MIN_WORK_MEM_KB, get_tuned_parameters
+
+
+DB_T3_SMALL = {"MemoryMiB": 2048, "VCpus": 2}
+DB_R6G_16XLARGE = {"MemoryMiB": 524288, "VCpus": 64}
+
+
+def test_max_connections_is_never_below_rds_default():
+    # RDS defaults to LEAST(DBInstanceClassMemory/9531392, 5000), 225 on 2 GiB
+    for profile_name in ["mixed", "analytics"]:
+        assert get_tuned_parameters(DB_T3_SMALL, profile_name, "gp3")["max_connections"] == "225"
+
+
+def test_oltp_raises_max_connections_above_rds_default():
+    assert int(get_tuned_parameters(DB_T3_SMALL, "oltp", "gp3")["max_connections"]) > 225
+
+
+def test_max_connections_is_capped():
+    for profile_name in ["oltp", "mixed", "analytics"]:
+        parameters = get_tuned_parameters(DB_R6G_16XLARGE, profile_name, "gp3")
+        assert parameters["max_connections"] == str(MAX_CONNECTIONS)
+
+
+def test_memory_parameters_are_in_rds_units():
+    parameters = get_tuned_parameters(DB_T3_SMALL, "mixed", "gp3")
+    # 8 kB pages: a quarter and three quarters of 2 GiB
+    assert parameters["shared_buffers"] == "65536"
+    assert parameters["effective_cache_size"] == "196608"
+
+
+def test_work_mem_has_a_floor():
+    parameters = get_tuned_parameters(DB_T3_SMALL, "oltp", "gp3")
+    assert parameters["work_mem"] == str(MIN_WORK_MEM_KB)
+
+
+def test_analytics_gives_queries_more_memory_and_workers():
+    mixed = get_tuned_parameters(DB_R6G_16XLARGE, "mixed", "gp3")
+    analytics = get_tuned_parameters(DB_R6G_16XLARGE, "analytics", "gp3")
+    assert int(analytics["work_mem"]) > int(mixed["work_mem"])
+    assert analytics["max_parallel_workers_per_gather"] == "64"
+    assert mixed["max_parallel_workers_per_gather"] == "32"
+
+
+def test_parallel_workers_has_a_floor():
+    parameters = get_tuned_parameters({"MemoryMiB": 1024, "VCpus": 1}, "oltp", "gp3")
+    assert parameters["max_parallel_workers_per_gather"] == "1"
+
+
+def test_random_page_cost_only_for_ssd_storage():
+    assert get_tuned_parameters(DB_T3_SMALL, "mixed", "gp2")["random_page_cost"] == "1.1"
+    assert "random_page_cost" not in get_tuned_parameters(DB_T3_SMALL, "mixed", "standard")
+
+
+def test_unknown_profile_raises():
+    with pytest.raises(Exception, match="Unknown parameter tuning profile `batch`"):
+        get_tuned_parameters(DB_T3_SMALL, "batch", "gp3")
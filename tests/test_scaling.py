@@ -0,0 +1,97 @@
+import pytest
+
+from eb_create_environment.scaling import (
+    ASG_NAMESPACE, LAUNCH_CONFIGURATION_NAMESPACE, ROLLING_UPDATE_NAMESPACE, TRIGGER_NAMESPACE, get_scaling_options,
+)
+
+
+NON_BURSTABLE = {"BurstablePerformance": False}
+
+
+def test_profile_values_become_option_settings():
+    options = get_scaling_options({"Profile": "throughput"}, "m5.large", NON_BURSTABLE, 2, 8)
+    assert options[(TRIGGER_NAMESPACE, "UpperThreshold")] == "70"
+    assert options[(ASG_NAMESPACE, "Cooldown")] == "300"
+    assert options[(ROLLING_UPDATE_NAMESPACE, "RollingUpdateEnabled")] == "true"
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MaxBatchSize")] == "2"
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MinInstancesInService")] == "2"
+    assert (LAUNCH_CONFIGURATION_NAMESPACE, "MonitoringInterval") not in options
+
+
+def test_latency_sensitive_turns_on_one_minute_metrics():
+    options = get_scaling_options({"Profile": "latency-sensitive"}, "m5.large", NON_BURSTABLE, 2, 8)
+    assert options[(LAUNCH_CONFIGURATION_NAMESPACE, "MonitoringInterval")] == "1 minute"
+    assert options[(TRIGGER_NAMESPACE, "Period")] == "1"
+
+
+def test_config_overrides_profile():
+    options = get_scaling_options(
+        {"Profile": "cost", "UpperThreshold": 60, "MaxBatchSize": 3}, "m5.large", NON_BURSTABLE, 1, 4,
+    )
+    assert options[(TRIGGER_NAMESPACE, "UpperThreshold")] == "60"
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MaxBatchSize")] == "3"
+
+
+def test_small_group_gets_batches_of_at_least_one():
+    options = get_scaling_options({"Profile": "throughput"}, "m5.large", NON_BURSTABLE, 1, 2)
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MaxBatchSize")] == "1"
+    # MinSize instances stay in service, but never the whole group
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MinInstancesInService")] == "1"
+
+
+def test_cost_profile_does_not_keep_instances_in_service():
+    options = get_scaling_options({"Profile": "cost"}, "m5.large", NON_BURSTABLE, 2, 4)
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MinInstancesInService")] == "0"
+
+
+def test_unknown_profile_raises():
+    with pytest.raises(Exception, match="Unknown scaling profile `fast`"):
+        get_scaling_options({"Profile": "fast"}, "m5.large", NON_BURSTABLE, 1, 4)
+
+
+def test_thresholds_must_be_ordered():
+    with pytest.raises(Exception, match="LowerThreshold \\(70\\) must be below UpperThreshold \\(70\\)"):
+        get_scaling_options({"Profile": "throughput", "LowerThreshold": 70}, "m5.large", NON_BURSTABLE, 1, 4)
+
+
+def test_breach_duration_must_cover_period():
+    with pytest.raises(Exception, match="BreachDuration \\(2\\) must be at least Period \\(5\\)"):
+        get_scaling_options({"Profile": "throughput", "BreachDuration": 2}, "m5.large", NON_BURSTABLE, 1, 4)
+
+
+def test_short_period_needs_one_minute_metrics():
+    with pytest.raises(Exception, match="shorter than the 5 minute instance metrics"):
+        get_scaling_options(
+            {"Profile": "throughput", "Period": 1, "BreachDuration": 1}, "m5.large", NON_BURSTABLE, 1, 4,
+        )
+
+
+def test_batch_size_cannot_exceed_max_size():
+    with pytest.raises(Exception, match="MaxBatchSize \\(5\\) cannot exceed MaxSize \\(4\\)"):
+        get_scaling_options({"Profile": "throughput", "MaxBatchSize": 5}, "m5.large", NON_BURSTABLE, 1, 4)
+
+
+def test_instances_in_service_must_leave_room_for_updates():
+    with pytest.raises(Exception, match="MinInstancesInService \\(4\\) must be below MaxSize \\(4\\)"):
+        get_scaling_options(
+            {"Profile": "throughput", "MinInstancesInService": 4}, "m5.large", NON_BURSTABLE, 1, 4,
+        )
+
+
+def test_single_instance_group_may_keep_its_instance_in_service():
+    options = get_scaling_options(
+        {"Profile": "throughput", "MinInstancesInService": 1}, "m5.large", NON_BURSTABLE, 1, 1,
+    )
+    assert options[(ROLLING_UPDATE_NAMESPACE, "MinInstancesInService")] == "1"
+
+
+def test_burstable_instance_with_high_cpu_threshold_warns(capsys):
+    get_scaling_options({"Profile": "throughput"}, "t3.small", {"BurstablePerformance": True}, 1, 4)
+    assert "Warning: t3.small is burstable" in capsys.readouterr().out
+
+
+def test_burstable_instance_with_low_cpu_threshold_does_not_warn(capsys):
+    get_scaling_options(
+        {"Profile": "throughput", "UpperThreshold": 40}, "t3.small", {"BurstablePerformance": True}, 1, 4,
+    )
+    assert "Warning" not in capsys.readouterr().out
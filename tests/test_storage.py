@@ -0,0 +1,125 @@
+import pytest
+
+from eb_create_environment.storage import resolve_storage
+
+
+ORDERABLE_OPTIONS = [
+    dict(StorageType="gp2", MinStorageSize=20, MaxStorageSize=65536),
+    dict(
+        StorageType="gp3", MinStorageSize=20, MaxStorageSize=65536,
+        MinIopsPerDbInstance=12000, MaxIopsPerDbInstance=64000, MinIopsPerGib=0.5, MaxIopsPerGib=1000,
+        MinStorageThroughputPerDbInstance=500, MaxStorageThroughputPerDbInstance=4000,
+        MinStorageThroughputPerIops=0.0, MaxStorageThroughputPerIops=0.25,
+    ),
+    dict(
+        StorageType="io1", MinStorageSize=100, MaxStorageSize=65536,
+        MinIopsPerDbInstance=1000, MaxIopsPerDbInstance=256000, MinIopsPerGib=1.0, MaxIopsPerGib=50.0,
+    ),
+]
+
+
+def get_params(**overrides):
+    params = dict(
+        StorageType="gp3", AllocatedStorage=20, DBInstanceClass="db.t3.small", Engine="postgres", EngineVersion="16.4",
+    )
+    params.update(overrides)
+    return params
+
+
+def test_gp2_small_volume_bursts():
+    storage = resolve_storage(get_params(StorageType="gp2", AllocatedStorage=20), "mixed", ORDERABLE_OPTIONS)
+    assert (storage.baseline_iops, storage.burst_iops) == (100, 3000)
+
+
+def test_gp2_large_volume_does_not_burst():
+    storage = resolve_storage(get_params(StorageType="gp2", AllocatedStorage=2000), "mixed", ORDERABLE_OPTIONS)
+    assert (storage.baseline_iops, storage.burst_iops) == (6000, None)
+
+
+def test_gp2_rejects_iops():
+    with pytest.raises(Exception, match="only apply to gp3, io1 and io2"):
+        resolve_storage(get_params(StorageType="gp2", Iops=3000), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_gp3_below_striping_threshold_has_fixed_baseline():
+    storage = resolve_storage(get_params(AllocatedStorage=399, Iops="auto"), "oltp", ORDERABLE_OPTIONS)
+    assert (storage.iops, storage.baseline_iops, storage.baseline_throughput) == (None, 3000, 125)
+
+
+def test_gp3_below_striping_threshold_rejects_explicit_iops():
+    with pytest.raises(Exception, match="raise AllocatedStorage to 400"):
+        resolve_storage(get_params(AllocatedStorage=100, Iops=6000), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_gp3_striping_threshold_depends_on_engine():
+    storage = resolve_storage(
+        get_params(Engine="oracle-se2", AllocatedStorage=200, Iops="auto"), "mixed", ORDERABLE_OPTIONS,
+    )
+    assert (storage.iops, storage.storage_throughput) == (12000, 500)
+
+
+def test_gp3_at_striping_threshold_gets_striped_baseline():
+    storage = resolve_storage(get_params(AllocatedStorage=400), "mixed", ORDERABLE_OPTIONS)
+    assert (storage.iops, storage.baseline_iops, storage.baseline_throughput) == (None, 12000, 500)
+
+
+def test_gp3_auto_sizes_iops_and_throughput_for_workload():
+    storage = resolve_storage(
+        get_params(AllocatedStorage=1000, Iops="auto", StorageThroughput="auto"), "oltp", ORDERABLE_OPTIONS,
+    )
+    assert (storage.iops, storage.storage_throughput) == (30000, 1875)
+
+
+def test_gp3_auto_iops_is_clamped_to_instance_limit():
+    storage = resolve_storage(get_params(AllocatedStorage=10000, Iops="auto"), "oltp", ORDERABLE_OPTIONS)
+    assert storage.iops == 64000
+
+
+def test_gp3_throughput_alone_keeps_baseline_iops():
+    storage = resolve_storage(get_params(AllocatedStorage=400, StorageThroughput=1000), "mixed", ORDERABLE_OPTIONS)
+    assert (storage.iops, storage.storage_throughput) == (12000, 1000)
+
+
+def test_gp3_explicit_throughput_outside_limits_raises():
+    with pytest.raises(Exception, match="StorageThroughput 5000 is outside the allowed 500-3000"):
+        resolve_storage(get_params(AllocatedStorage=400, StorageThroughput=5000), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_io1_requires_iops():
+    with pytest.raises(Exception, match="io1 storage requires Iops"):
+        resolve_storage(get_params(StorageType="io1", AllocatedStorage=100), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_io1_rejects_throughput():
+    with pytest.raises(Exception, match="StorageThroughput only applies to gp3"):
+        resolve_storage(
+            get_params(StorageType="io1", AllocatedStorage=100, Iops=3000, StorageThroughput=500), "mixed",
+            ORDERABLE_OPTIONS,
+        )
+
+
+def test_io1_auto_iops_is_raised_to_instance_minimum():
+    storage = resolve_storage(
+        get_params(StorageType="io1", AllocatedStorage=100, Iops="auto"), "analytics", ORDERABLE_OPTIONS,
+    )
+    assert (storage.iops, storage.baseline_iops) == (1000, 1000)
+
+
+def test_io1_explicit_iops_above_per_gib_limit_raises():
+    with pytest.raises(Exception, match="Iops 6000 is outside the allowed 1000-5000"):
+        resolve_storage(get_params(StorageType="io1", AllocatedStorage=100, Iops=6000), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_allocated_storage_below_minimum_raises():
+    with pytest.raises(Exception, match="AllocatedStorage 50 is outside the allowed 100-65536"):
+        resolve_storage(get_params(StorageType="io1", AllocatedStorage=50, Iops=1000), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_storage_type_not_offered_lists_offered_types():
+    with pytest.raises(Exception, match="io2 storage is not offered .* expected one of gp2, gp3, io1"):
+        resolve_storage(get_params(StorageType="io2", Iops=1000), "mixed", ORDERABLE_OPTIONS)
+
+
+def test_unknown_workload_raises():
+    with pytest.raises(Exception, match="Unknown storage workload `batch`"):
+        resolve_storage(get_params(), "batch", ORDERABLE_OPTIONS)
@@ -0,0 +1,23 @@
+from eb_create_environment.utils import version_sort_key
+
+
+def test_numeric_components_sort_numerically():
+    assert version_sort_key("17.10") > version_sort_key("17.9")
+    assert version_sort_key("10.1") > version_sort_key("9.6.24")
+
+
+def test_shorter_version_sorts_first():
+    assert version_sort_key("16") < version_sort_key("16.1")
+
+
+def test_separators_are_equivalent():
+    assert version_sort_key("8.0-32") == version_sort_key("8.0.32") == version_sort_key("8_0_32")
+
+
+def test_numbers_sort_before_names():
+    versions = ["5.7.mysql_aurora.2.11.2", "5.7.44", "5.7.9"]
+    assert sorted(versions, key=version_sort_key) == ["5.7.9", "5.7.44", "5.7.mysql_aurora.2.11.2"]
+
+
+def test_named_components_sort_alphabetically():
+    assert version_sort_key("19.0.0.0.ru-2024-01.rur-2024-01.r1") < version_sort_key("19.0.0.0.ru-2024-04.rur-2024-04.r1")